@@ -6,14 +6,19 @@ from sse_starlette.sse import EventSourceResponse
 import shutil
 import os
 import uuid
-import json
+import orjson
 import asyncio
+import functools
+import gc
+import re
 import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from typing import List
 
 from core.epub_processor import EpubProcessor
 from core.tts_engine import MLXEngine
-from core.audio_merger import AudioMerger
+from core.audio_merger import AudioMerger, FFMPEG_BIN
 from core.voice_design import VoiceDesigner
 from core.translator_mlx import MLXTranslator
 
@@ -41,24 +46,91 @@ for d in [UPLOAD_DIR, OUTPUT_DIR, VOICE_DIR, TRANSLATION_DIR, CHUNK_DIR]:
 # State
 tasks = {} # task_id -> {status, progress, message, book_id}
 translation_tasks = {} # task_id -> {status, progress, message, filename}
+# Keys starting with "_" (the SSE "_event" and its "_loop") are internal and never sent to clients.
+
+MAX_TASK_LOGS = 500  # Only the most recent log lines are kept (bounds SSE payload size)
+SSE_KEEPALIVE_S = 15  # Re-send state at least this often even without a change
+
+def _notify(task):
+    """Wake SSE listeners of a task. Safe to call from background worker threads."""
+    event = task.get("_event")
+    if event is not None:
+        try:
+            task["_loop"].call_soon_threadsafe(event.set)
+        except RuntimeError:
+            pass  # Event loop already closed (server shutting down)
+
+def _snapshot(task):
+    """
+    Public (JSON-serializable) copy of a task dict.
+
+    Background threads keep appending to the logs deque and chapter_times dict,
+    so containers are copied here before orjson.dumps iterates them.
+    """
+    snapshot = {}
+    for k, v in list(task.items()):
+        if k.startswith("_"):
+            continue
+        if isinstance(v, deque):
+            v = list(v)
+        elif isinstance(v, dict):
+            v = dict(v)
+        snapshot[k] = v
+    return snapshot
+
+async def _task_events(store, task_id):
+    """Yield task state on every change until it reaches a terminal status."""
+    task = store.get(task_id)
+    if task is None:
+        yield orjson.dumps({"status": "not_found"}).decode()
+        return
+    event = task["_event"]
+    while True:
+        yield orjson.dumps(_snapshot(task)).decode()
+        if task["status"] in ["completed", "failed"]:
+            break
+        try:
+            await asyncio.wait_for(event.wait(), timeout=SSE_KEEPALIVE_S)
+        except asyncio.TimeoutError:
+            pass
+        event.clear()
 
 # Initialize Engine (Lazy load)
 # We instantiate the class but load weights only when needed or on startup
 tts_engine = MLXEngine()
 voice_designer = VoiceDesigner()
 
+# Chapter merges (pure ffmpeg CPU work) run here while TTS moves on to the next chapter.
+# At most MAX_INFLIGHT_MERGES merges are pending, which bounds how many chunk dirs stay on disk.
+MERGE_POOL = ProcessPoolExecutor(max_workers=2)
+MAX_INFLIGHT_MERGES = 2
+
+_gc_frozen = False
+
 @app.on_event("startup")
 async def startup_event():
     # Preload model if desired, or let it load on first request
-    pass
+    # Everything set up at import (modules, engine, app routes) lives for the
+    # whole server run; move it to the permanent GC generation once so the
+    # per-chunk collections in the TTS engine don't rescan it
+    global _gc_frozen
+    if not _gc_frozen:
+        gc.freeze()
+        _gc_frozen = True
+
+UPLOAD_COPY_BUFSIZE = 1 << 20
+
+def _save_upload(file: UploadFile, file_path: str):
+    """Copy an uploaded file to disk (blocking; run via asyncio.to_thread)."""
+    with open(file_path, "wb") as buffer:
+        shutil.copyfileobj(file.file, buffer, UPLOAD_COPY_BUFSIZE)
 
 @app.post("/api/upload_epub")
 async def upload_epub(file: UploadFile = File(...)):
     file_id = str(uuid.uuid4())
     file_path = os.path.join(UPLOAD_DIR, f"{file_id}.epub")
     
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+    await asyncio.to_thread(_save_upload, file, file_path)
         
     # Parse EPUB
     # We use EpubProcessor which is non-destructive
@@ -69,14 +141,23 @@ async def upload_epub(file: UploadFile = File(...)):
         
         # Save chapters metadata for later
         meta_path = os.path.join(UPLOAD_DIR, f"{file_id}.json")
-        with open(meta_path, "w") as f:
-            json.dump({"original_name": file.filename, "file_path": file_path, "chapters": chapters}, f)
+        with open(meta_path, "wb") as f:
+            f.write(orjson.dumps({"original_name": file.filename, "file_path": file_path, "chapters": chapters}))
             
         return {"book_id": file_id, "chapters": chapters, "filename": file.filename}
     except Exception as e:
         os.remove(file_path)
         raise HTTPException(status_code=400, detail=str(e))
 
+@functools.lru_cache(maxsize=16)
+def _load_meta(path, mtime_ns):
+    """
+    Parse a book's metadata JSON. Keyed by mtime so a rewritten file is re-read.
+    The result is shared between tasks and must not be mutated.
+    """
+    with open(path, 'rb') as f:
+        return orjson.loads(f.read())
+
 @app.post("/api/translate_epub")
 async def translate_epub(
     background_tasks: BackgroundTasks,
@@ -92,7 +173,9 @@ async def translate_epub(
         "status": "queued",
         "progress": 0,
         "message": "Queued for translation...",
-        "output_filename": ""
+        "output_filename": "",
+        "_event": asyncio.Event(),
+        "_loop": asyncio.get_running_loop()
     }
     
     print(f"DEBUG: Created task {task_id}, queuing background task...")
@@ -103,12 +186,12 @@ async def translate_epub(
 def process_translation_task(task_id, book_id, source_lang, target_lang, model_id):
     print(f"DEBUG: Processing translation task {task_id}...")
     translation_tasks[task_id]["status"] = "processing"
+    _notify(translation_tasks[task_id])
     
     try:
         # Load book metadata to get original name
         meta_path = os.path.join(UPLOAD_DIR, f"{book_id}.json")
-        with open(meta_path, 'r') as f:
-            book_meta = json.load(f)
+        book_meta = _load_meta(meta_path, os.stat(meta_path).st_mtime_ns)
             
         original_filename = book_meta.get("original_name", "book.epub")
         book_title = original_filename.replace(".epub", "")
@@ -137,9 +220,9 @@ def process_translation_task(task_id, book_id, source_lang, target_lang, model_i
         glossary_path = os.path.join(UPLOAD_DIR, "glossary.json")
         glossary = {}
         if os.path.exists(glossary_path):
-            with open(glossary_path, 'r', encoding='utf-8') as f:
+            with open(glossary_path, 'rb') as f:
                 try:
-                    glossary = json.load(f)
+                    glossary = orjson.loads(f.read())
                     print(f"DEBUG: Loaded glossary with {len(glossary)} items")
                 except:
                     print("DEBUG: Failed to load glossary.json")
@@ -147,9 +230,9 @@ def process_translation_task(task_id, book_id, source_lang, target_lang, model_i
             # Check project root default
             default_gloss = "glossary.json"
             if os.path.exists(default_gloss):
-                with open(default_gloss, 'r', encoding='utf-8') as f:
+                with open(default_gloss, 'rb') as f:
                     try:
-                        glossary = json.load(f)
+                        glossary = orjson.loads(f.read())
                         print(f"DEBUG: Loaded default glossary with {len(glossary)} items")
                     except:
                         pass
@@ -159,9 +242,11 @@ def process_translation_task(task_id, book_id, source_lang, target_lang, model_i
         def update_progress(p, msg):
             translation_tasks[task_id]["progress"] = p
             translation_tasks[task_id]["message"] = msg
+            _notify(translation_tasks[task_id])
             
         # Run Translation
         translation_tasks[task_id]["message"] = "Initializing MLX Engine..."
+        _notify(translation_tasks[task_id])
         translated_chapters, translated_title = translator.translate_book(
             chapters,
             book_title=book_title,
@@ -172,6 +257,7 @@ def process_translation_task(task_id, book_id, source_lang, target_lang, model_i
         
         # Apply translations back to EPUB structure
         translation_tasks[task_id]["message"] = "Reconstructing EPUB..."
+        _notify(translation_tasks[task_id])
         
         output_filename = f"{book_title}_{target_lang}.epub"
         output_path = os.path.join(TRANSLATION_DIR, output_filename)
@@ -186,36 +272,43 @@ def process_translation_task(task_id, book_id, source_lang, target_lang, model_i
         translation_tasks[task_id]["progress"] = 100
         translation_tasks[task_id]["message"] = "Translation completed!"
         translation_tasks[task_id]["output_filename"] = output_filename
+        _notify(translation_tasks[task_id])
         
     except Exception as e:
         import traceback
         traceback.print_exc()
         translation_tasks[task_id]["status"] = "failed"
         translation_tasks[task_id]["message"] = f"Error: {str(e)}"
+        _notify(translation_tasks[task_id])
 
 @app.get("/api/translation_progress/{task_id}")
 async def get_translation_progress(task_id: str):
-    async def event_generator():
-        while True:
-            if task_id not in translation_tasks:
-                yield json.dumps({"status": "not_found"})
-                break
-                
-            task = translation_tasks[task_id]
-            yield json.dumps(task)
-            
-            if task["status"] in ["completed", "failed"]:
-                break
-                
-            await asyncio.sleep(1)
-            
-    return EventSourceResponse(event_generator())
+    return EventSourceResponse(_task_events(translation_tasks, task_id))
+
+MEDIA_TYPES = {
+    ".mp3": "audio/mpeg",
+    ".opus": "audio/ogg",
+    ".wav": "audio/wav",
+    ".epub": "application/epub+zip",
+}
+
+def _file_response(file_path, filename=None):
+    """
+    FileResponse from a single os.stat (reused for headers) with an explicit media type,
+    or None if the file does not exist.
+    """
+    try:
+        st = os.stat(file_path)
+    except FileNotFoundError:
+        return None
+    media_type = MEDIA_TYPES.get(os.path.splitext(file_path)[1].lower())
+    return FileResponse(file_path, filename=filename, stat_result=st, media_type=media_type)
 
 @app.get("/api/download_translation/{filename}")
 async def download_translation(filename: str):
-    file_path = os.path.join(TRANSLATION_DIR, filename)
-    if os.path.exists(file_path):
-        return FileResponse(file_path, filename=filename)
+    response = _file_response(os.path.join(TRANSLATION_DIR, filename), filename=filename)
+    if response is not None:
+        return response
     raise HTTPException(status_code=404, detail="File not found")
 
 @app.post("/api/upload_voice")
@@ -224,8 +317,7 @@ async def upload_voice(file: UploadFile = File(...)):
     ext = file.filename.split('.')[-1]
     file_path = os.path.join(VOICE_DIR, f"{voice_id}.{ext}")
     
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+    await asyncio.to_thread(_save_upload, file, file_path)
         
     return {"voice_id": voice_id, "filename": file.filename, "path": file_path}
 
@@ -235,13 +327,17 @@ async def start_generation(
     book_id: str = Form(...),
     voice_id: str = Form(None),  # Optional - None means use default voice
     selected_chapters: str = Form(...), # JSON string or comma separated
-    model_type: str = Form("qwen3") # qwen3 or cosyvoice3
+    model_type: str = Form("qwen3"), # qwen3 or cosyvoice3
+    encoder: str = Form("mp3") # mp3 or opus
 ):
+    if encoder not in AudioMerger.API_ENCODERS:
+        raise HTTPException(status_code=400, detail=f"Unsupported encoder: {encoder}")
+
     task_id = str(uuid.uuid4())
     
     # Parse selected chapters
     try:
-        selected_ids = json.loads(selected_chapters)
+        selected_ids = orjson.loads(selected_chapters)
     except:
         selected_ids = selected_chapters.split(',')
         
@@ -252,20 +348,24 @@ async def start_generation(
         "current_chapter_index": 0,
         "total_chapters": 0,
         "remaining_chapters": 0,
-        "logs": [],
-        "remaining_chapters": 0,
-        "logs": [],
+        "logs": deque(maxlen=MAX_TASK_LOGS),
         "chapter_times": {},
         "current_words_total": 0,
-        "current_words_processed": 0
+        "current_words_processed": 0,
+        "_event": asyncio.Event(),
+        "_loop": asyncio.get_running_loop()
     }
     
-    background_tasks.add_task(process_book_task, task_id, book_id, voice_id, selected_ids, model_type)
+    background_tasks.add_task(process_book_task, task_id, book_id, voice_id, selected_ids, model_type, encoder)
     
     return {"task_id": task_id}
 
-def process_book_task(task_id, book_id, voice_id, selected_ids, model_type="qwen3"):
+# Characters not allowed in output filenames
+_SANITIZE = re.compile(r'[\\/*?:"<>|]')
+
+def process_book_task(task_id, book_id, voice_id, selected_ids, model_type="qwen3", encoder="mp3"):
     tasks[task_id]["status"] = "processing"
+    _notify(tasks[task_id])
     
     print(f"TRACE: Enter process_book_task task_id={task_id}", flush=True)
     print(f"TRACE: Args: book_id={book_id}, voice_id={voice_id}, model_type={model_type}", flush=True)
@@ -291,14 +391,13 @@ def process_book_task(task_id, book_id, voice_id, selected_ids, model_type="qwen
                 print("Warning: No voice selected and no default_ref.wav found.")
                 voice_path = None
         
-        with open(meta_path, 'r') as f:
-            book_meta = json.load(f)
+        book_meta = _load_meta(meta_path, os.stat(meta_path).st_mtime_ns)
             
         all_chapters = book_meta['chapters']
-        chapters_to_process = [c for c in all_chapters if str(c['id']) in selected_ids or str(all_chapters.index(c)) in selected_ids] 
-        
-        if not chapters_to_process:
-             chapters_to_process = [c for c in all_chapters if str(c['id']) in selected_ids]
+        # selected_ids may hold chapter IDs or positional indices; one pass matches both
+        selected_set = set(map(str, selected_ids))
+        chapters_to_process = [c for i, c in enumerate(all_chapters)
+                               if str(c['id']) in selected_set or str(i) in selected_set]
 
         print(f"TRACE: Total chapters to process: {len(chapters_to_process)}", flush=True)
 
@@ -319,9 +418,21 @@ def process_book_task(task_id, book_id, voice_id, selected_ids, model_type="qwen
         engine = tts_engine._subprocess_engine
         
         tasks[task_id]["total_chapters"] = total_chapters
+        _notify(tasks[task_id])
         
         print("TRACE: Starting chapter loop...", flush=True)
         
+        # (future, chunk_dir, chapter_title) of merges still running in MERGE_POOL
+        pending_merges = deque()
+        
+        def finish_oldest_merge():
+            future, merged_chunk_dir, merged_title = pending_merges.popleft()
+            future.result()  # re-raises merge errors in this task
+            # Clean up chunk directory after successful merge
+            AudioMerger.cleanup(merged_chunk_dir)
+            tasks[task_id]["logs"].append(f"Merged {merged_title}")
+            _notify(tasks[task_id])
+        
         for idx, chapter in enumerate(chapters_to_process):
             print(f"TRACE: Loop idx={idx}, title={chapter['title']}", flush=True)
             tasks[task_id]["current_chapter"] = chapter['title']
@@ -329,14 +440,15 @@ def process_book_task(task_id, book_id, voice_id, selected_ids, model_type="qwen
             tasks[task_id]["remaining_chapters"] = total_chapters - idx
             tasks[task_id]["progress"] = int((idx / total_chapters) * 100)
             
-            # Check if final MP3 already exists (chapter-level skip)
-            safe_title = re.sub(r'[\\/*?:"<>|]', "", chapter['title'])
-            out_filename = f"{idx+1:03d}_{safe_title}.mp3"
+            # Check if final audio file already exists (chapter-level skip)
+            safe_title = _SANITIZE.sub("", chapter['title'])
+            out_filename = f"{idx+1:03d}_{safe_title}{AudioMerger.ENCODERS[encoder]}"
             out_path = os.path.join(book_output_dir, out_filename)
             
             if os.path.exists(out_path) and os.path.getsize(out_path) > 1024:
                 tasks[task_id]["logs"].append(f"Skipping {chapter['title']} (Exists)")
                 print(f"TRACE: Skipping {chapter['title']} (Exists)", flush=True)
+                _notify(tasks[task_id])
                 continue
 
             tasks[task_id]["logs"].append(f"Generating {chapter['title']}...")
@@ -346,6 +458,7 @@ def process_book_task(task_id, book_id, voice_id, selected_ids, model_type="qwen
             print(f"TRACE: Chapter text len: {chapter_text_len}", flush=True)
             tasks[task_id]["current_words_total"] = chapter_text_len
             tasks[task_id]["current_words_processed"] = 0
+            _notify(tasks[task_id])
             
             start_time = time.time()
             
@@ -356,45 +469,82 @@ def process_book_task(task_id, book_id, voice_id, selected_ids, model_type="qwen
                 CHUNK_DIR, task_id, f"ch_{idx:03d}"
             )
             
+            tags = {
+                'title': chapter['title'],
+                'artist': 'CosyVoice AI',
+                'album': book_title
+            }
+            
             # Progress callback to update task state
             def on_chunk_progress(chunk_idx, total_chunks, chunk_text):
                 processed = int((chunk_idx + 1) / total_chunks * chapter_text_len)
                 tasks[task_id]["current_words_processed"] = processed
+                _notify(tasks[task_id])
+            
+            # A fresh chapter is encoded while it is generated: each finished chunk
+            # is fed to ffmpeg's stdin. A resumed chapter (chunks already on disk)
+            # is merged from its chunk files afterwards instead.
+            stream = None
+            if not os.path.isdir(chapter_chunk_dir):
+                stream = AudioMerger.merge_stream(out_path, 300, "192k", 24000, tags, encoder)
+            
+            def on_chunk_done(chunk_idx, chunk_path):
+                nonlocal stream
+                if stream is None:
+                    return
+                try:
+                    stream.feed_wav(chunk_path)
+                except Exception as e:
+                    # Fall back to merging the chunk files after generation
+                    print(f"TRACE: Streaming encode disabled: {e}", flush=True)
+                    stream.abort()
+                    stream = None
             
             # Generate all chunks (with crash-resume: skips existing valid chunks)
             print("TRACE: Calling engine.generate_chapter...", flush=True)
-            chunk_dir = engine.generate_chapter(
-                text=chapter['text'],
-                ref_audio_path=voice_path,
-                chunk_dir=chapter_chunk_dir,
-                progress_callback=on_chunk_progress
-            )
+            try:
+                chunk_dir = engine.generate_chapter(
+                    text=chapter['text'],
+                    ref_audio_path=voice_path,
+                    chunk_dir=chapter_chunk_dir,
+                    progress_callback=on_chunk_progress,
+                    chunk_callback=on_chunk_done
+                )
+            except BaseException:
+                if stream is not None:
+                    stream.abort()
+                raise
             print("TRACE: engine.generate_chapter returned.", flush=True)
             
-            # Merge chunks into final MP3 using ffmpeg
-            tags = {
-                'title': chapter['title'],
-                'artist': 'CosyVoice AI',
-                'album': book_title
-            }
-            AudioMerger.merge_chunks(
-                chunk_dir=chunk_dir,
-                output_path=out_path,
-                silence_ms=300,
-                bitrate="192k",
-                tags=tags
-            )
-            
-            # Clean up chunk directory after successful merge
-            AudioMerger.cleanup(chunk_dir)
+            if stream is not None:
+                # Everything is already encoded; only the tail is left
+                stream.close()
+                AudioMerger.cleanup(chunk_dir)
+                tasks[task_id]["logs"].append(f"Merged {chapter['title']}")
+            else:
+                # Merge chunks into final MP3/Opus using ffmpeg, overlapping with
+                # TTS of the next chapter
+                while len(pending_merges) >= MAX_INFLIGHT_MERGES:
+                    finish_oldest_merge()
+                future = MERGE_POOL.submit(
+                    AudioMerger.merge_chunks,
+                    chunk_dir, out_path, 300, "192k", 24000, tags, encoder
+                )
+                pending_merges.append((future, chunk_dir, chapter['title']))
             
             elapsed = time.time() - start_time
             tasks[task_id]["chapter_times"][str(chapter['id'])] = f"{elapsed:.1f}s"
             tasks[task_id]["logs"].append(f"Chapter completed in {elapsed:.1f}s")
+            _notify(tasks[task_id])
+            
+        # Wait for the remaining merges before reporting completion
+        while pending_merges:
+            finish_oldest_merge()
             
         tasks[task_id]["status"] = "completed"
         tasks[task_id]["progress"] = 100
         tasks[task_id]["logs"].append("All chapters completed.")
+        _notify(tasks[task_id])
         
         # Clean up task-level chunk directory
         task_chunk_dir = os.path.join(CHUNK_DIR, task_id)
@@ -406,6 +556,7 @@ def process_book_task(task_id, book_id, voice_id, selected_ids, model_type="qwen
         tasks[task_id]["status"] = "failed"
         tasks[task_id]["error"] = str(e)
         tasks[task_id]["logs"].append(f"Error: {str(e)}")
+        _notify(tasks[task_id])
         # NOTE: Chunk directory is preserved on failure for crash-resume
         print(f"\n!!!!!!!!!!!! TASK FAILED !!!!!!!!!!!!\nError details: {str(e)}\n!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!\n")
         print(error_msg)
@@ -468,46 +619,23 @@ async def save_voice_ref_api(
 
 @app.get("/api/audio/{filename}")
 async def get_audio_file(filename: str):
-    file_path = os.path.join(UPLOAD_DIR, filename)
-    if os.path.exists(file_path):
-        return FileResponse(file_path)
+    response = _file_response(os.path.join(UPLOAD_DIR, filename))
+    if response is not None:
+        return response
     # Check voices too?
-    voice_path = os.path.join(VOICE_DIR, filename)
-    if os.path.exists(voice_path):
-        return FileResponse(voice_path)
+    response = _file_response(os.path.join(VOICE_DIR, filename))
+    if response is not None:
+        return response
     raise HTTPException(status_code=404, detail="File not found")
 
 
 @app.get("/api/progress/{task_id}")
 async def get_progress(task_id: str):
-    async def event_generator():
-        while True:
-            if task_id not in tasks:
-                yield json.dumps({"status": "not_found"})
-                break
-                
-            task = tasks[task_id]
-            data = json.dumps(task)
-            yield data
-            
-            if task["status"] in ["completed", "failed"]:
-                break
-                
-            await asyncio.sleep(1)
-            
-    return EventSourceResponse(event_generator())
+    return EventSourceResponse(_task_events(tasks, task_id))
 
 # Mount static files last to allow API routes to take precedence
 app.mount("/", StaticFiles(directory="static", html=True), name="static")
 
-import re
-
-# Ensure ffmpeg is available (fail-fast)
-try:
-    subprocess_result = __import__('subprocess').run(
-        ['ffmpeg', '-version'], capture_output=True, text=True
-    )
-    if subprocess_result.returncode != 0:
-        print("WARNING: ffmpeg not found. Audio merging will fail. Install with: brew install ffmpeg")
-except FileNotFoundError:
+# Ensure ffmpeg is available (fail-fast); FFMPEG_BIN is only a bare name if which() found nothing
+if not os.path.isabs(FFMPEG_BIN):
     print("WARNING: ffmpeg not found. Audio merging will fail. Install with: brew install ffmpeg")
@@ -0,0 +1,5 @@
+"""pytest setup: make the repo root importable (core.*) once for all tests."""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
@@ -0,0 +1,27 @@
+"""
+Optional Numba kernels for hot per-sample audio loops.
+
+If numba is not installed, HAS_NUMBA is False and quantize_f32_to_i16 is None;
+callers fall back to their NumPy implementation.
+"""
+import numpy as np
+
+try:
+    from numba import njit, prange
+    HAS_NUMBA = True
+except ImportError:
+    HAS_NUMBA = False
+
+quantize_f32_to_i16 = None
+
+if HAS_NUMBA:
+    @njit(parallel=True, fastmath=True, cache=True)
+    def quantize_f32_to_i16(src, dst):
+        """Clip src to [-1, 1], scale to int16 and round, in a single pass into dst."""
+        for i in prange(src.shape[0]):
+            v = src[i]
+            if v > 1.0:
+                v = 1.0
+            elif v < -1.0:
+                v = -1.0
+            dst[i] = np.int16(np.rint(v * 32767.0))
@@ -0,0 +1,249 @@
+"""
+Plumbing shared by the TTS worker scripts (tts_qwen3.py, tts_cosyvoice3.py).
+
+Each script only implements synthesize(params, in_memory=False): generate
+one chunk with its model, then hand the file mlx-audio wrote to
+finish_output(). Padding, the --serve loop and its framing, and the
+single-shot entry point live here. The scripts run with core/ as their
+script directory, so they import this module as a top-level module.
+"""
+import sys
+import os
+import random
+import tempfile
+import traceback
+import numpy as np
+
+from _worker_json import dumps as _dumps, loads as _loads
+
+try:
+    import mlx.core as mx
+except ImportError:
+    mx = None
+
+
+# Marks the final result line in single-shot mode (see SubprocessTTSEngine)
+RESULT_PREFIX = "##RESULT##"
+
+
+def set_seed(seed):
+    """Set random seed for reproducible voice tone."""
+    random.seed(seed)
+    np.random.seed(seed)
+    if mx is not None:
+        mx.random.seed(seed)
+
+
+def add_silence_padding(audio_path, pad_ms=200):
+    """
+    Add silence padding before and after the audio file.
+    This prevents chunks from sounding too abrupt when concatenated.
+    The pad length follows the file's own sample rate.
+    The padded file replaces audio_path atomically (temp file + os.replace).
+    """
+    import soundfile as sf
+
+    if pad_ms <= 0:
+        return
+
+    # Stay in int16 end to end: no float round trip for a 16-bit file
+    audio, sr = sf.read(audio_path, dtype='int16')
+
+    # Generate silence samples
+    pad_samples = int(sr * pad_ms / 1000)
+
+    # silence + audio + silence, written into one preallocated buffer
+    padded = np.empty((len(audio) + 2 * pad_samples,) + audio.shape[1:], dtype=audio.dtype)
+    padded[:pad_samples] = 0
+    padded[pad_samples:pad_samples + len(audio)] = audio
+    padded[pad_samples + len(audio):] = 0
+
+    tmp_path = audio_path + ".tmp"
+    sf.write(tmp_path, padded, sr, subtype='PCM_16', format='WAV')
+    os.replace(tmp_path, audio_path)
+
+
+def copy_with_padding(src_path, dst_path, pad_ms=200):
+    """
+    Write src_path to dst_path with the same silence padding as
+    add_silence_padding, copying the PCM frames as raw bytes instead of
+    decoding and re-encoding them. Returns False (nothing written) unless
+    src_path is a 16-bit PCM WAV; the caller then pads the usual way.
+    dst_path is replaced atomically (temp file + os.replace).
+    """
+    import wave
+
+    try:
+        with wave.open(src_path, "rb") as src:
+            params = src.getparams()
+            if params.sampwidth != 2:
+                return False
+            frames = src.readframes(params.nframes)
+    except (wave.Error, EOFError):
+        return False
+
+    pad = bytes(int(params.framerate * pad_ms / 1000) * params.sampwidth * params.nchannels)
+    tmp_path = dst_path + ".tmp"
+    try:
+        with wave.open(tmp_path, "wb") as dst:
+            dst.setparams(params)
+            dst.writeframes(pad)
+            dst.writeframes(frames)
+            dst.writeframes(pad)
+        os.replace(tmp_path, dst_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return True
+
+
+def pad_silence(audio, pad_ms=200, sample_rate=24000):
+    """In-memory variant of add_silence_padding: silence + audio + silence."""
+    pad_samples = int(sample_rate * pad_ms / 1000)
+    padded = np.zeros((len(audio) + 2 * pad_samples,) + audio.shape[1:], dtype=audio.dtype)
+    padded[pad_samples:pad_samples + len(audio)] = audio
+    return padded
+
+
+def find_generated_file(base):
+    """
+    Locate the file mlx-audio wrote for file_prefix=base: {base}_000.wav
+    (or _001), checked directly; the directory is scanned only as a fallback.
+    """
+    for i in range(2):
+        path = f"{base}_{i:03d}.wav"
+        if os.path.exists(path):
+            return path
+    prefix = os.path.basename(base) + "_"
+    with os.scandir(os.path.dirname(base) or ".") as it:
+        for entry in it:
+            if entry.name.startswith(prefix) and entry.name.endswith(".wav"):
+                return entry.path
+    return None
+
+
+_models = {}
+
+
+def get_model(model_id, label, fallback_to_id=False):
+    """
+    Load a model once per process (reused across --serve requests).
+    With fallback_to_id, a failed preload caches the model id instead, which
+    generate_audio then loads per call.
+    """
+    if model_id not in _models:
+        print(_dumps({"status": "loading", "message": f"Loading {label} model..."}), flush=True)
+        try:
+            from mlx_audio.tts.utils import load_model
+            _models[model_id] = load_model(model_id)
+        except Exception as e:
+            if not fallback_to_id:
+                raise
+            print(_dumps({"status": "warning", "message": f"Model preload failed ({e}), loading per chunk"}), flush=True)
+            _models[model_id] = model_id
+    return _models[model_id]
+
+
+def finish_output(output_path, in_memory=False):
+    """
+    Turn the file mlx-audio wrote for output_path into the padded result:
+    output_path, or (int16 samples, sample_rate) with in_memory=True (no
+    file is kept).
+    """
+    # Find the generated file (mlx-audio uses _000 suffix)
+    generated = find_generated_file(output_path.replace(".wav", ""))
+    if in_memory:
+        if not generated:
+            raise Exception("Output file was not created by the model")
+        import soundfile as sf
+
+        audio, sr = sf.read(generated, dtype='int16')
+        os.remove(generated)
+        return pad_silence(audio, pad_ms=200, sample_rate=sr), sr
+
+    # Pad while moving the file into place: one read and one write, no decode
+    if generated and copy_with_padding(generated, output_path, pad_ms=200):
+        os.remove(generated)
+        return output_path
+
+    # Add silence padding for natural pacing when concatenated. The generated
+    # file is padded before it is moved into place, so output_path never
+    # holds a partial or unpadded chunk
+    if generated:
+        add_silence_padding(generated, pad_ms=200)
+        os.replace(generated, output_path)
+        return output_path
+
+    if not os.path.exists(output_path):
+        raise Exception("Output file was not created by the model")
+
+    add_silence_padding(output_path, pad_ms=200)
+    return output_path
+
+
+def serve(synthesize):
+    """
+    Persistent mode (--serve): one JSON request per stdin line, one
+    completed/error JSON line per request on stdout. Everything else the
+    worker or mlx-audio prints goes to stderr so stdout stays line-framed.
+
+    With "return_audio" in the request the samples are sent back instead of
+    a file: an {"status": "audio", "sr", "dtype", "shape", "nbytes"} line
+    followed by nbytes of raw int16 PCM.
+
+    An {"init": {...}} line sets defaults (ref audio/text, model, seed) that
+    later requests inherit, so per-chunk lines only carry what changes.
+    It gets no reply.
+
+    synthesize(params, in_memory=False) is the script's chunk generator.
+    """
+    out = sys.stdout.buffer
+    sys.stdout = sys.stderr
+    scratch = os.path.join(tempfile.gettempdir(), f"ebt_tts_{os.getpid()}.wav")
+    defaults = {}
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        payload = b""
+        try:
+            params = _loads(line)
+            if "init" in params:
+                defaults = params["init"]
+                continue
+            params = {**defaults, **params}
+            if params.get("return_audio"):
+                params["output_path"] = scratch
+                audio, sr = synthesize(params, in_memory=True)
+                payload = audio.tobytes()
+                reply = {"status": "audio", "sr": sr, "dtype": str(audio.dtype),
+                         "shape": list(audio.shape), "nbytes": len(payload)}
+            else:
+                output_path = synthesize(params)
+                reply = {"status": "completed", "output": output_path}
+        except Exception as e:
+            reply = {"status": "error", "error": str(e), "traceback": traceback.format_exc()}
+        out.write(_dumps(reply).encode() + b"\n" + payload)
+        out.flush()
+
+
+def run(synthesize, script_name, serve_synthesize=None):
+    """
+    Worker entry point: --serve (persistent, using serve_synthesize if given)
+    or a single JSON request in argv[1], answered with one RESULT_PREFIX line.
+    """
+    if len(sys.argv) < 2:
+        print(_dumps({"error": f"Usage: {script_name} <json_params> | --serve"}))
+        sys.exit(1)
+
+    if sys.argv[1] == "--serve":
+        serve(serve_synthesize or synthesize)
+        return
+
+    try:
+        output_path = synthesize(_loads(sys.argv[1]))
+        print(RESULT_PREFIX + _dumps({"status": "completed", "output": output_path}), flush=True)
+
+    except Exception as e:
+        print(RESULT_PREFIX + _dumps({"status": "error", "error": str(e), "traceback": traceback.format_exc()}), flush=True)
+        sys.exit(1)
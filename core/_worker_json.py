@@ -0,0 +1,23 @@
+"""
+JSON helpers shared by the app and the worker scripts.
+
+orjson is optional in the worker venvs; stdlib json is the fallback.
+dumps returns str, dumpb returns UTF-8 bytes (for binary framing).
+"""
+import json
+
+try:
+    import orjson
+
+    def dumps(obj) -> str:
+        return orjson.dumps(obj).decode()
+
+    dumpb = orjson.dumps
+    loads = orjson.loads
+except ImportError:
+    dumps = json.dumps
+
+    def dumpb(obj) -> bytes:
+        return json.dumps(obj, ensure_ascii=False).encode('utf-8')
+
+    loads = json.loads
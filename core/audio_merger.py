@@ -1,162 +1,524 @@
 """
 AudioMerger — ffmpeg-based audio chunk concatenation for audiobook generation.
 
-Merges per-chunk WAV files into a final MP3, inserting silence between chunks
-for natural pacing. Uses ffmpeg-python for reliable audio processing.
+Merges per-chunk WAV files into a final MP3 (or Opus), inserting silence between chunks
+for natural pacing. When all chunks share one PCM format they are joined with
+the concat demuxer (-c copy) and encoded once; otherwise every chunk is decoded
+through a single ffmpeg filter graph (aformat + apad + concat).
+In-memory audio arrays can be encoded directly with merge_arrays(), and a
+chapter can be encoded while it is generated with merge_stream(); both feed
+raw s16le PCM to ffmpeg's stdin.
 """
 import os
-import glob
+import json
+import logging
+import mmap
+import wave
 import shutil
 import tempfile
 import subprocess
 
+import numpy as np
+
+from core._audio_kernels import quantize_f32_to_i16
+
+# Resolved once at import (no subprocess). Falls back to a PATH lookup at
+# exec time so a missing ffmpeg still fails with a clear FileNotFoundError.
+FFMPEG_BIN = shutil.which("ffmpeg") or "ffmpeg"
+
+logger = logging.getLogger(__name__)
+
 
 class AudioMerger:
     """Merge WAV chunks into a single MP3 using ffmpeg."""
 
+    # ffmpeg keeps every -i input open at once (macOS defaults to 256 fds), so
+    # chapters with more chunks are merged in groups, then concatenated losslessly.
+    MAX_INPUTS = 128
+    GROUP_SIZE = 64
+
+    # ffmpeg timeout: a fixed allowance plus a conservative rate for the WAV
+    # input (256 KiB/s is ~5x realtime for 24 kHz mono s16), so long
+    # chapters are not killed mid-encode
+    FFMPEG_TIMEOUT = 120
+    MIN_MERGE_BYTES_PER_SEC = 256 * 1024
+
+    # Crash-resume index of completed chunks, kept inside each chunk dir
+    MANIFEST_NAME = "manifest.jsonl"
+
+    # Supported output encoders -> file extension
+    ENCODERS = {
+        "mp3": ".mp3",
+        "opus": ".opus",
+        "wav": ".wav",  # uncompressed PCM; no encode cost (tests, further editing)
+    }
+    # Encoders offered to API clients; "wav" stays internal, since
+    # chapter-length uncompressed files don't belong in the output folder
+    API_ENCODERS = ("mp3", "opus")
+
+    # Where generated silence WAVs are cached (shared across merges and processes)
+    SILENCE_CACHE_DIR = os.path.join(tempfile.gettempdir(), "ebooktools_silence")
+
+    @staticmethod
+    def read_manifest(chunk_dir: str) -> dict:
+        """
+        Read chunk_dir/manifest.jsonl into {idx: entry}.
+
+        Each line is {"idx": N, "path": "chunk_NNNN.wav", "bytes": size} and is
+        appended only after that chunk was fully written, so the manifest is
+        the crash-resume index. A truncated last line (crash mid-append) or
+        any other malformed record is ignored; later lines for the same idx
+        win. Returns {} if there is no manifest.
+        """
+        manifest_path = os.path.join(chunk_dir, AudioMerger.MANIFEST_NAME)
+        entries = {}
+        try:
+            with open(manifest_path, 'r') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    if AudioMerger._valid_manifest_entry(entry):
+                        entries[entry["idx"]] = entry
+        except FileNotFoundError:
+            pass
+        return entries
+
+    @staticmethod
+    def _valid_manifest_entry(entry) -> bool:
+        """True for a well-formed record: int idx and bytes, a bare file name."""
+        if not isinstance(entry, dict):
+            return False
+        idx, path, size = entry.get("idx"), entry.get("path"), entry.get("bytes")
+        return (type(idx) is int and type(size) is int
+                and isinstance(path, str) and path == os.path.basename(path) != "")
+
+    @staticmethod
+    def append_manifest(chunk_dir: str, idx: int, chunk_path: str):
+        """Record a completed chunk in chunk_dir/manifest.jsonl."""
+        entry = {
+            "idx": idx,
+            "path": os.path.basename(chunk_path),
+            "bytes": os.path.getsize(chunk_path),
+        }
+        with open(os.path.join(chunk_dir, AudioMerger.MANIFEST_NAME), 'a') as f:
+            f.write(json.dumps(entry) + "\n")
+
     @staticmethod
     def _get_sorted_chunks(chunk_dir: str) -> list[str]:
-        """Get chunk WAV files sorted by index (chunk_0001.wav, chunk_0002.wav, ...)."""
-        pattern = os.path.join(chunk_dir, "chunk_*.wav")
-        chunks = sorted(glob.glob(pattern))
-        return chunks
-
-    @staticmethod
-    def _generate_silence(duration_ms: int, sample_rate: int = 24000,
-                          output_path: str = None) -> str:
-        """Generate a silent WAV file of specified duration using ffmpeg."""
-        if output_path is None:
-            output_path = tempfile.mktemp(suffix="_silence.wav")
-
-        duration_s = duration_ms / 1000.0
-        cmd = [
-            "ffmpeg", "-y",
-            "-f", "lavfi",
-            "-i", f"anullsrc=r={sample_rate}:cl=mono",
-            "-t", str(duration_s),
-            "-ar", str(sample_rate),
-            "-ac", "1",
-            "-sample_fmt", "s16",
-            output_path
-        ]
-        print(f"DEBUG: Generating silence: {' '.join(cmd)}", flush=True)
+        """
+        Get chunk WAV files sorted by index (chunk_0001.wav, chunk_0002.wav, ...).
+        Returns absolute paths, built from a single abspath of chunk_dir.
+
+        If the chunk dir has a manifest.jsonl it defines the chunks; entries
+        whose file is gone or no longer has the recorded size are dropped.
+        Otherwise the chunk files found in the directory are used.
+        """
+        if not os.path.isdir(chunk_dir):
+            return []
+        abs_dir = os.path.abspath(chunk_dir)
+        manifest = AudioMerger.read_manifest(abs_dir)
+        # One directory read gives every chunk file's size
+        with os.scandir(abs_dir) as it:
+            sizes = {e.name: e.stat().st_size for e in it
+                     if e.name.startswith("chunk_") and e.name.endswith(".wav") and e.is_file()}
+        if manifest:
+            chunks = []
+            for idx in sorted(manifest):
+                entry = manifest[idx]
+                if sizes.get(entry["path"]) != entry.get("bytes"):
+                    print(f"WARNING: skipping manifest entry {idx} ({entry['path']}): "
+                          f"file missing or size changed")
+                    continue
+                chunks.append(os.path.join(abs_dir, entry["path"]))
+            return chunks
+        return [os.path.join(abs_dir, name) for name in sorted(sizes)]
+
+    @staticmethod
+    def _probe_uniform_format(chunks: list[str]):
+        """
+        Return (channels, sample_width, sample_rate) if every chunk is plain PCM
+        WAV in the same format as the first chunk, otherwise None.
+        Only the RIFF headers are read.
+        """
+        fmt = None
+        for chunk_path in chunks:
+            try:
+                with wave.open(chunk_path, 'rb') as w:
+                    params = (w.getnchannels(), w.getsampwidth(), w.getframerate())
+            except (wave.Error, EOFError, OSError):
+                return None
+            if fmt is None:
+                fmt = params
+            elif params != fmt:
+                return None
+        return fmt
+
+    @staticmethod
+    def _generate_silence(duration_ms: int, fmt: tuple) -> str:
+        """
+        Return a silent WAV file of the given duration in the given PCM format.
+
+        The file is written in pure Python (no ffmpeg) once per format/duration
+        and cached in SILENCE_CACHE_DIR for reuse by later merges.
+        """
+        channels, sample_width, sample_rate = fmt
+        silence_path = os.path.join(
+            AudioMerger.SILENCE_CACHE_DIR,
+            f"_silence_{sample_rate}_{channels}ch_{sample_width * 8}bit_{duration_ms}.wav"
+        )
+        if os.path.exists(silence_path):
+            return silence_path
+
+        num_frames = sample_rate * duration_ms // 1000
+        # 8-bit WAV is unsigned (silence = 0x80); wider formats are signed
+        fill = b"\x80" if sample_width == 1 else b"\x00"
+        os.makedirs(AudioMerger.SILENCE_CACHE_DIR, exist_ok=True)
+        tmp_path = f"{silence_path}.{os.getpid()}.tmp"
+        with wave.open(tmp_path, 'wb') as w:
+            w.setnchannels(channels)
+            w.setsampwidth(sample_width)
+            w.setframerate(sample_rate)
+            w.writeframes(fill * (num_frames * channels * sample_width))
+        # Atomic publish: concurrent merges never see a partial file
+        os.replace(tmp_path, silence_path)
+        return silence_path
+
+    @staticmethod
+    def _write_concat_list(paths: list[str], list_path: str):
+        """Write an ffmpeg concat-demuxer list of (absolute) paths, quote-escaped."""
+        with open(list_path, 'w') as f:
+            for path in paths:
+                escaped = path.replace("'", "'\\''")
+                f.write(f"file '{escaped}'\n")
+
+    @staticmethod
+    def _codec_args(encoder: str, bitrate: str) -> list[str]:
+        """
+        ffmpeg codec arguments for the final encode.
+        mp3 uses lame's faster -compression_level 7 preset (speech does not
+        benefit from the slow psychoacoustic search); opus is tuned for voice;
+        wav just writes 16-bit PCM.
+        """
+        if encoder == "opus":
+            return ["-c:a", "libopus", "-b:a", "48k", "-vbr", "on",
+                    "-application", "voip", "-frame_duration", "60"]
+        if encoder == "wav":
+            return ["-c:a", "pcm_s16le"]
+        return ["-c:a", "libmp3lame", "-compression_level", "7", "-b:a", bitrate]
+
+    @staticmethod
+    def _merge_timeout(chunks: list[str]) -> int:
+        """ffmpeg timeout in seconds for merging chunks, scaled to their size."""
+        total = sum(os.path.getsize(chunk_path) for chunk_path in chunks)
+        return AudioMerger.FFMPEG_TIMEOUT + total // AudioMerger.MIN_MERGE_BYTES_PER_SEC
+
+    @staticmethod
+    def _run_ffmpeg(cmd: list[str], timeout: int = FFMPEG_TIMEOUT):
+        """Run an ffmpeg command, raising CalledProcessError with its output on failure."""
+        logger.debug("Executing ffmpeg: %s ... (%d args)", " ".join(cmd[:8]), len(cmd))
         try:
             # stdin=subprocess.DEVNULL is critical to prevent ffmpeg from reading TTY and getting SIGTTIN
-            subprocess.run(cmd, capture_output=True, check=True, timeout=30, stdin=subprocess.DEVNULL)
+            result = subprocess.run(
+                cmd,
+                capture_output=True,
+                text=True,
+                timeout=timeout,
+                check=False,
+                stdin=subprocess.DEVNULL
+            )
         except subprocess.TimeoutExpired:
-            print(f"ERROR: Silence generation timed out", flush=True)
-            raise
-        except subprocess.CalledProcessError as e:
-            print(f"ERROR: Silence generation failed: {e.stderr}", flush=True)
+            print(f"ERROR: ffmpeg timed out after {timeout}s", flush=True)
             raise
-        return output_path
+
+        if result.returncode != 0:
+            print(f"ERROR: ffmpeg failed.\nStdout: {result.stdout}\nStderr: {result.stderr}", flush=True)
+            raise subprocess.CalledProcessError(
+                result.returncode, cmd, result.stdout, result.stderr
+            )
+
+    @staticmethod
+    def _encode_group(chunks: list[str], output_path: str, silence_ms: int,
+                      bitrate: str, sample_rate: int, tags: dict = None,
+                      pad_last: bool = False, encoder: str = "mp3",
+                      timeout: int = FFMPEG_TIMEOUT):
+        """
+        Decode chunks through one filter graph and encode them to output_path.
+
+        Every chunk is normalized to mono s16 at sample_rate and followed by
+        silence_ms of silence (apad), except the last one unless pad_last is set.
+        """
+        cmd = [FFMPEG_BIN, "-y"]
+        for chunk_path in chunks:
+            cmd.extend(["-i", chunk_path])
+
+        pad_dur = silence_ms / 1000.0
+        filters = []
+        labels = []
+        for i in range(len(chunks)):
+            chain = f"[{i}:a]aformat=sample_fmts=s16:sample_rates={sample_rate}:channel_layouts=mono"
+            if silence_ms > 0 and (pad_last or i < len(chunks) - 1):
+                chain += f",apad=pad_dur={pad_dur}"
+            filters.append(f"{chain}[a{i}]")
+            labels.append(f"[a{i}]")
+        filters.append(f"{''.join(labels)}concat=n={len(chunks)}:v=0:a=1[out]")
+
+        cmd.extend([
+            "-filter_complex", ";".join(filters),
+            "-map", "[out]",
+            "-ar", str(sample_rate),
+            "-ac", "1",
+        ])
+        cmd.extend(AudioMerger._codec_args(encoder, bitrate))
+
+        # Add metadata tags
+        if tags:
+            for key, value in tags.items():
+                cmd.extend(["-metadata", f"{key}={value}"])
+
+        cmd.append(output_path)
+        AudioMerger._run_ffmpeg(cmd, timeout)
+
+    @staticmethod
+    def _encode_output(input_args: list[str], output_path: str, bitrate: str,
+                       sample_rate: int, tags: dict = None, encoder: str = "mp3",
+                       timeout: int = FFMPEG_TIMEOUT):
+        """Encode a single (already joined) input to the final output file."""
+        cmd = [FFMPEG_BIN, "-y"] + input_args + [
+            "-ar", str(sample_rate),
+            "-ac", "1",
+        ] + AudioMerger._codec_args(encoder, bitrate)
+        if tags:
+            for key, value in tags.items():
+                cmd.extend(["-metadata", f"{key}={value}"])
+        cmd.append(output_path)
+        AudioMerger._run_ffmpeg(cmd, timeout)
+
+    @staticmethod
+    def _merge_copy(chunks: list[str], fmt: tuple, chunk_dir: str, output_path: str,
+                    silence_ms: int, bitrate: str, sample_rate: int, tags: dict = None,
+                    encoder: str = "mp3", timeout: int = FFMPEG_TIMEOUT):
+        """
+        Join identically formatted chunks losslessly (-c copy), then encode once.
+        The concat demuxer opens inputs one at a time, so no grouping is needed.
+        For wav output in the chunks' own format (mono s16 at sample_rate) the
+        joined file is the result, so the encode pass is skipped.
+        """
+        silence_path = None
+        concat_list_path = os.path.join(chunk_dir, "_concat_list.txt")
+        copy_only = encoder == "wav" and fmt == (1, 2, sample_rate)
+        merged_path = output_path if copy_only else os.path.join(chunk_dir, "_merged.wav")
+        try:
+            entries = []
+            if silence_ms > 0 and len(chunks) > 1:
+                silence_path = AudioMerger._generate_silence(silence_ms, fmt)
+            for i, chunk_path in enumerate(chunks):
+                entries.append(chunk_path)
+                # Add silence between chunks (not after the last one)
+                if silence_ms > 0 and i < len(chunks) - 1:
+                    entries.append(silence_path)
+            AudioMerger._write_concat_list(entries, concat_list_path)
+
+            cmd = [
+                FFMPEG_BIN, "-y",
+                "-f", "concat",
+                "-safe", "0",
+                "-i", concat_list_path,
+                "-c", "copy",
+            ]
+            if copy_only and tags:
+                for key, value in tags.items():
+                    cmd.extend(["-metadata", f"{key}={value}"])
+            cmd.append(merged_path)
+            AudioMerger._run_ffmpeg(cmd, timeout)
+            if not copy_only:
+                AudioMerger._encode_output(["-i", merged_path], output_path,
+                                           bitrate, sample_rate, tags, encoder, timeout)
+        finally:
+            # Clean up temp files (concat list, joined WAV), but NOT the chunks
+            # or the cached silence file
+            for tmp in [concat_list_path] + ([] if copy_only else [merged_path]):
+                if os.path.exists(tmp):
+                    try:
+                        os.remove(tmp)
+                    except OSError:
+                        pass
+
+    @staticmethod
+    def _merge_filter(chunks: list[str], chunk_dir: str, output_path: str,
+                      silence_ms: int, bitrate: str, sample_rate: int, tags: dict = None,
+                      encoder: str = "mp3", timeout: int = FFMPEG_TIMEOUT):
+        """Decode and re-encode chunks of differing formats through a filter graph."""
+        if len(chunks) <= AudioMerger.MAX_INPUTS:
+            AudioMerger._encode_group(chunks, output_path, silence_ms,
+                                      bitrate, sample_rate, tags, encoder=encoder,
+                                      timeout=timeout)
+            return
+
+        # Tree reduction: encode groups of chunks, then stream-copy the groups
+        # together. Each group except the last ends in silence, so the codec
+        # frame boundaries between groups fall inside the pause.
+        group_paths = []
+        concat_list_path = os.path.join(chunk_dir, "_concat_list.txt")
+        try:
+            for start in range(0, len(chunks), AudioMerger.GROUP_SIZE):
+                group = chunks[start:start + AudioMerger.GROUP_SIZE]
+                is_last = start + AudioMerger.GROUP_SIZE >= len(chunks)
+                group_path = os.path.join(chunk_dir, f"_group_{len(group_paths):04d}{AudioMerger.ENCODERS[encoder]}")
+                group_paths.append(group_path)
+                AudioMerger._encode_group(group, group_path, silence_ms, bitrate,
+                                          sample_rate, pad_last=not is_last,
+                                          encoder=encoder, timeout=timeout)
+
+            AudioMerger._write_concat_list(group_paths, concat_list_path)
+            cmd = [
+                FFMPEG_BIN, "-y",
+                "-f", "concat",
+                "-safe", "0",
+                "-i", concat_list_path,
+                "-c", "copy",
+            ]
+            if tags:
+                for key, value in tags.items():
+                    cmd.extend(["-metadata", f"{key}={value}"])
+            cmd.append(output_path)
+            AudioMerger._run_ffmpeg(cmd, timeout)
+        finally:
+            # Clean up intermediate files, but NOT the chunks
+            for tmp in group_paths + [concat_list_path]:
+                if os.path.exists(tmp):
+                    try:
+                        os.remove(tmp)
+                    except OSError:
+                        pass
 
     @staticmethod
     def merge_chunks(chunk_dir: str, output_path: str,
                      silence_ms: int = 300, bitrate: str = "192k",
                      sample_rate: int = 24000,
-                     tags: dict = None) -> str:
+                     tags: dict = None, encoder: str = "mp3") -> str:
         """
-        Merge all chunk_*.wav files in chunk_dir into a single MP3.
+        Merge all chunk_*.wav files in chunk_dir into a single MP3 (or Opus) file.
 
         Args:
             chunk_dir: Directory containing chunk_XXXX.wav files
-            output_path: Path for the output MP3 file
+            output_path: Path for the output file (extension is adjusted to the encoder)
             silence_ms: Milliseconds of silence between chunks (default 300ms)
-            bitrate: MP3 bitrate (default "192k")
+            bitrate: MP3 bitrate (default "192k", ignored for opus and wav)
             sample_rate: Audio sample rate (default 24000 Hz)
-            tags: Optional dict of MP3 metadata tags (title, artist, album)
+            tags: Optional dict of metadata tags (title, artist, album)
+            encoder: "mp3" (libmp3lame), "opus" (libopus, 48k voice preset)
+                     or "wav" (16-bit PCM, no compression)
 
         Returns:
-            Path to the output MP3 file
+            Path to the output file
 
         Raises:
+            ValueError: If encoder is not supported
             FileNotFoundError: If no chunks found in chunk_dir
             subprocess.CalledProcessError: If ffmpeg fails
         """
+        if encoder not in AudioMerger.ENCODERS:
+            raise ValueError(f"Unsupported encoder: {encoder}")
+        output_path = os.path.splitext(output_path)[0] + AudioMerger.ENCODERS[encoder]
+
         chunks = AudioMerger._get_sorted_chunks(chunk_dir)
         if not chunks:
             raise FileNotFoundError(f"No chunk_*.wav files found in {chunk_dir}")
 
         print(f"Merging {len(chunks)} chunks from {chunk_dir} -> {output_path}")
 
+        # Chunk paths are already absolute; keep temp files next to them
+        abs_dir = os.path.dirname(chunks[0])
+
         # Ensure output directory exists
         os.makedirs(os.path.dirname(output_path), exist_ok=True)
 
-        # Generate silence file for padding
-        silence_path = None
-        concat_list_path = None
+        # ffmpeg writes to a ".part" file that is renamed into place on
+        # success, so a killed merge never looks like a finished chapter
+        # (the extension stays last so ffmpeg still picks the muxer)
+        base, ext = os.path.splitext(output_path)
+        part_path = f"{base}.part{ext}"
+        timeout = AudioMerger._merge_timeout(chunks)
 
+        fmt = AudioMerger._probe_uniform_format(chunks)
         try:
-            # Create silence WAV
-            silence_path = AudioMerger._generate_silence(
-                silence_ms, sample_rate,
-                os.path.join(chunk_dir, "_silence.wav")
-            )
+            if fmt is not None:
+                AudioMerger._merge_copy(chunks, fmt, abs_dir, part_path, silence_ms,
+                                        bitrate, sample_rate, tags, encoder, timeout)
+            else:
+                print("Chunk formats differ, re-encoding through filter graph")
+                AudioMerger._merge_filter(chunks, abs_dir, part_path, silence_ms,
+                                          bitrate, sample_rate, tags, encoder, timeout)
+            os.replace(part_path, output_path)
+        finally:
+            if os.path.exists(part_path):
+                try:
+                    os.remove(part_path)
+                except OSError:
+                    pass
 
-            # Build ffmpeg concat demuxer file list
-            concat_list_path = os.path.join(chunk_dir, "_concat_list.txt")
-            with open(concat_list_path, 'w') as f:
-                for i, chunk_path in enumerate(chunks):
-                    # Use absolute paths and escape single quotes
-                    abs_path = os.path.abspath(chunk_path)
-                    f.write(f"file '{abs_path}'\n")
-                    # Add silence after each chunk (including last for consistent ending)
-                    if silence_path and i < len(chunks) - 1:
-                        abs_silence = os.path.abspath(silence_path)
-                        f.write(f"file '{abs_silence}'\n")
-
-            # Run ffmpeg concat + encode to MP3
-            cmd = [
-                "ffmpeg", "-y",
-                "-f", "concat",
-                "-safe", "0",
-                "-i", concat_list_path,
-                "-ar", str(sample_rate),
-                "-ac", "1",
-                "-b:a", bitrate,
-            ]
+        print(f"Merge complete: {output_path} ({os.path.getsize(output_path)} bytes)")
+        return output_path
 
-            # Add metadata tags
-            if tags:
-                for key, value in tags.items():
-                    cmd.extend(["-metadata", f"{key}={value}"])
+    @staticmethod
+    def merge_stream(output_path: str,
+                     silence_ms: int = 300, bitrate: str = "192k",
+                     sample_rate: int = 24000,
+                     tags: dict = None, encoder: str = "mp3") -> "PCMStreamEncoder":
+        """
+        Start an incremental encode to output_path and return its PCMStreamEncoder.
 
-            cmd.append(output_path)
+        Audio is fed with feed()/feed_wav() as each TTS chunk finishes and
+        encoded while generation continues; close() finishes the file.
+        Arguments are as in merge_chunks().
+        """
+        return PCMStreamEncoder(output_path, silence_ms, bitrate, sample_rate, tags, encoder)
 
-            print(f"DEBUG: Executing ffmpeg merge: {' '.join(cmd)}")
-            
-            # Run with timeout to prevent hangs
-            try:
-                result = subprocess.run(
-                    cmd,
-                    capture_output=True,
-                    text=True,
-                    timeout=120, # 2 minute timeout for merge
-                    check=False,
-                    stdin=subprocess.DEVNULL
-                )
-            except subprocess.TimeoutExpired:
-                 print(f"ERROR: ffmpeg merge timed out after 120s", flush=True)
-                 raise
-
-            if result.returncode != 0:
-                print(f"ERROR: ffmpeg failed.\nStdout: {result.stdout}\nStderr: {result.stderr}", flush=True)
-                raise subprocess.CalledProcessError(
-                    result.returncode, cmd, result.stdout, result.stderr
-                )
-
-            print(f"Merge complete: {output_path} ({os.path.getsize(output_path)} bytes)")
-            return output_path
+    @staticmethod
+    def merge_arrays(arrays, output_path: str,
+                     silence_ms: int = 300, bitrate: str = "192k",
+                     sample_rate: int = 24000,
+                     tags: dict = None, encoder: str = "mp3") -> str:
+        """
+        Encode an iterable of in-memory audio arrays into a single MP3 (or Opus) file.
 
-        finally:
-            # Clean up temp files (silence + concat list), but NOT the chunks
-            for tmp in [silence_path, concat_list_path]:
-                if tmp and os.path.exists(tmp):
-                    try:
-                        os.remove(tmp)
-                    except OSError:
-                        pass
+        Each array is converted to s16le and written straight to one ffmpeg
+        process via stdin, with silence_ms of zero bytes between arrays, so no
+        chunk files or intermediate copies of the whole chapter are made.
+        Arrays are consumed lazily (e.g. from SubprocessTTSEngine.generate_stream).
+
+        Args:
+            arrays: Iterable of numpy arrays (float in [-1, 1] or int16) at sample_rate;
+                    multi-channel arrays are downmixed to mono
+            output_path: Path for the output file (extension is adjusted to the encoder)
+            silence_ms, bitrate, sample_rate, tags, encoder: as in merge_chunks()
+
+        Returns:
+            Path to the output file
+
+        Raises:
+            ValueError: If encoder is not supported, arrays is empty or an
+                        array is neither float nor int16
+            subprocess.CalledProcessError: If ffmpeg fails
+        """
+        arrays = iter(arrays)
+        first = next(arrays, None)
+        if first is None:
+            raise ValueError("No audio arrays to merge")
+
+        stream = AudioMerger.merge_stream(output_path, silence_ms, bitrate,
+                                          sample_rate, tags, encoder)
+        try:
+            audio = first
+            while audio is not None:
+                stream.feed(audio)
+                audio = next(arrays, None)
+        except BaseException:
+            stream.abort()
+            raise
+        return stream.close()
 
     @staticmethod
     def cleanup(chunk_dir: str):
@@ -164,3 +526,180 @@ class AudioMerger:
         if os.path.isdir(chunk_dir):
             print(f"Cleaning up chunk directory: {chunk_dir}")
             shutil.rmtree(chunk_dir, ignore_errors=True)
+
+
+class PCMStreamEncoder:
+    """
+    One ffmpeg process encoding mono s16le PCM from its stdin.
+
+    Created by AudioMerger.merge_stream(). Each feed() is one segment;
+    silence_ms of zero samples is written between segments, matching
+    merge_chunks(). ffmpeg writes to a ".part" file that close() renames
+    into place, so an interrupted stream never looks like a finished chapter.
+    Call abort() to kill ffmpeg and remove the partial output.
+    """
+
+    def __init__(self, output_path: str, silence_ms: int = 300, bitrate: str = "192k",
+                 sample_rate: int = 24000, tags: dict = None, encoder: str = "mp3"):
+        if encoder not in AudioMerger.ENCODERS:
+            raise ValueError(f"Unsupported encoder: {encoder}")
+        self.output_path = os.path.splitext(output_path)[0] + AudioMerger.ENCODERS[encoder]
+        self.sample_rate = sample_rate
+        self.silence = b"\x00" * (int(sample_rate * silence_ms / 1000) * 2)
+        self.count = 0
+        base, ext = os.path.splitext(self.output_path)
+        self.part_path = f"{base}.part{ext}"
+
+        os.makedirs(os.path.dirname(self.output_path) or ".", exist_ok=True)
+
+        self.cmd = [
+            FFMPEG_BIN, "-y", "-loglevel", "error",
+            "-f", "s16le",
+            "-ar", str(sample_rate),
+            "-ac", "1",
+            "-i", "pipe:0",
+        ] + AudioMerger._codec_args(encoder, bitrate)
+        if tags:
+            for key, value in tags.items():
+                self.cmd.extend(["-metadata", f"{key}={value}"])
+        self.cmd.append(self.part_path)
+
+        print(f"Streaming encode -> {self.output_path}")
+        self.proc = subprocess.Popen(self.cmd, stdin=subprocess.PIPE,
+                                     stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        self._broken = False
+        # Reusable float32/int16 buffers for _to_pcm16 (grown on demand).
+        # Per stream: concurrent chapters must not share them.
+        self._scratch_f32 = None
+        self._scratch_i16 = None
+
+    def _write(self, data):
+        if self._broken:
+            return
+        try:
+            self.proc.stdin.write(data)
+        except BrokenPipeError:
+            # ffmpeg exited early; its stderr is reported by close()
+            self._broken = True
+
+    def _to_pcm16(self, audio) -> np.ndarray:
+        """
+        Convert a float ([-1, 1]) or int16 array to mono int16 samples.
+        Multi-channel input (samples x channels) is averaged down to mono.
+
+        Float input is clipped, scaled and rounded into this stream's scratch
+        buffers, in one fused pass when numba is available (see _audio_kernels)
+        and in place with NumPy otherwise, so no per-call temporaries are
+        allocated. The returned array may be a view into the scratch buffer
+        and is only valid until the next call.
+
+        Raises:
+            ValueError: For any other sample type (int32, uint8, ...), whose
+                scale is ambiguous
+        """
+        audio = np.asarray(audio)
+        # Decide on the dtype before downmixing: mean() turns int16 into float64
+        if audio.dtype == np.int16:
+            if audio.ndim > 1:
+                return np.rint(audio.mean(axis=1)).astype(np.int16)
+            return audio
+        if audio.dtype.kind != 'f':
+            raise ValueError(f"Unsupported sample dtype {audio.dtype}: expected float or int16")
+        if audio.ndim > 1:
+            audio = audio.mean(axis=1)
+
+        n = audio.shape[0]
+        if self._scratch_f32 is None or self._scratch_f32.shape[0] < n:
+            self._scratch_f32 = np.empty(n, dtype=np.float32)
+            self._scratch_i16 = np.empty(n, dtype=np.int16)
+        out = self._scratch_i16[:n]
+        if quantize_f32_to_i16 is not None:
+            quantize_f32_to_i16(np.ascontiguousarray(audio), out)
+            return out
+
+        scratch = self._scratch_f32[:n]
+        np.multiply(audio, 32767.0, out=scratch)
+        np.clip(scratch, -32767.0, 32767.0, out=scratch)
+        np.rint(scratch, out=scratch)
+        np.copyto(out, scratch, casting='unsafe')
+        return out
+
+    def feed(self, audio):
+        """Append one segment: raw s16le bytes, or a float/int16 numpy array (see _to_pcm16)."""
+        # Convert first so a rejected array leaves the stream untouched
+        if not isinstance(audio, (bytes, bytearray, memoryview)):
+            audio = self._to_pcm16(audio)
+        if self.count and self.silence:
+            self._write(self.silence)
+        self._write(audio)
+        self.count += 1
+
+    def feed_wav(self, path: str):
+        """
+        Append one segment from a WAV file (e.g. a freshly written TTS chunk).
+
+        Raises:
+            ValueError: If the WAV is not mono 16-bit PCM at this stream's sample rate
+        """
+        with open(path, 'rb') as f:
+            with wave.open(f) as w:
+                params = (w.getnchannels(), w.getsampwidth(), w.getframerate())
+                if params != (1, 2, self.sample_rate):
+                    raise ValueError(
+                        f"{path}: expected mono 16-bit {self.sample_rate} Hz, "
+                        f"got {params[0]}ch {params[1] * 8}-bit {params[2]} Hz"
+                    )
+                # The header parse leaves f at the start of the data chunk
+                offset = f.tell()
+                nbytes = w.getnframes() * 2
+            if nbytes == 0:
+                self.feed(b"")
+                return
+            # Map the file and hand the PCM region to ffmpeg without copying it
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                with memoryview(mm)[offset:offset + nbytes] as pcm:
+                    self.feed(pcm)
+
+    def close(self, timeout: int = 120) -> str:
+        """
+        Finish encoding and return the output path.
+
+        Raises:
+            subprocess.CalledProcessError: If ffmpeg fails
+        """
+        try:
+            self.proc.stdin.close()
+        except BrokenPipeError:
+            pass
+        try:
+            stderr = self.proc.stderr.read().decode(errors="replace")
+            self.proc.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            self.abort()
+            print(f"ERROR: ffmpeg timed out encoding {self.output_path}")
+            raise
+        if self.proc.returncode != 0:
+            print(f"ERROR: ffmpeg failed (exit {self.proc.returncode})")
+            print(f"stderr: {stderr}")
+            raise subprocess.CalledProcessError(self.proc.returncode, self.cmd, stderr=stderr)
+
+        os.replace(self.part_path, self.output_path)
+        print(f"Merge complete: {self.output_path} ({self.count} segments, "
+              f"{os.path.getsize(self.output_path)} bytes)")
+        return self.output_path
+
+    def abort(self):
+        """Kill ffmpeg and remove the partial output file."""
+        if self.proc.poll() is None:
+            self.proc.kill()
+        self.proc.wait()
+        for f in (self.proc.stdin, self.proc.stderr):
+            try:
+                f.close()
+            except (OSError, ValueError):
+                pass
+        if os.path.exists(self.part_path):
+            try:
+                os.remove(self.part_path)
+            except OSError:
+                pass
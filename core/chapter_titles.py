@@ -0,0 +1,67 @@
+"""
+Chapter title fast path for the translator: boilerplate headings
+("Chapter 3", "Part IV", "第3章", "12") are rewritten per target language
+without calling the model. Pure regex, no MLX imports, so it can be
+tested anywhere.
+"""
+import re
+
+# "Chapter 3", "Ch. 12", "Part IV", "第3章", or a bare arabic number.
+# Keywords are case-insensitive; a roman numeral must be uppercase so words
+# like "Mix" or "Liv" are not mistaken for one. A bare roman numeral is left
+# to the model: all-caps words such as "MIX" or "DIV" are valid numerals too.
+_ROMAN = r"(?=[IVXLCDM])M{0,3}(?:CM|CD|D?C{0,3})(?:XC|XL|L?X{0,3})(?:IX|IV|V?I{0,3})"
+TRIVIAL_TITLE = re.compile(
+    rf"^(?:(?i:(?P<kw>chapter|ch\.?|part)\s+)(?P<n>\d+|{_ROMAN})"
+    r"|第\s*(?P<cjk_n>\d+)\s*(?P<cjk_kw>[章部])"
+    r"|(?P<num>\d+))$"
+)
+_ROMAN_VALUES = {"I": 1, "V": 5, "X": 10, "L": 50, "C": 100, "D": 500, "M": 1000}
+
+# Canonical (chapter, part) heading per target_lang code
+TITLE_FORMATS = {
+    "zh": ("第{n}章", "第{n}部"),
+    "zh-TW": ("第{n}章", "第{n}部"),
+    "zh-CN": ("第{n}章", "第{n}部"),
+    "ja": ("第{n}章", "第{n}部"),
+    "ko": ("제{n}장", "제{n}부"),
+    "en": ("Chapter {n}", "Part {n}"),
+    "fr": ("Chapitre {n}", "Partie {n}"),
+    "es": ("Capítulo {n}", "Parte {n}"),
+    "ru": ("Глава {n}", "Часть {n}"),
+    "de": ("Kapitel {n}", "Teil {n}"),
+}
+
+def roman_to_int(numeral: str) -> int:
+    """Value of a well-formed uppercase roman numeral (as matched by _ROMAN)."""
+    total = 0
+    for ch, nxt in zip(numeral, numeral[1:] + " "):
+        value = _ROMAN_VALUES[ch]
+        total += -value if value < _ROMAN_VALUES.get(nxt, 0) else value
+    return total
+
+def fast_translate_title(title: str, target_lang: str):
+    """
+    Translate a trivially formatted title without the model.
+    Returns None when the title needs a real translation.
+    """
+    stripped = title.strip()
+    if not stripped:
+        return title
+    m = TRIVIAL_TITLE.match(stripped)
+    if not m:
+        return None
+    if m.group("num"):
+        # Bare number: nothing to translate
+        return stripped
+    formats = TITLE_FORMATS.get(target_lang)
+    if formats is None:
+        return None
+    if m.group("kw"):
+        is_part = m.group("kw").lower() == "part"
+        n = m.group("n")
+        n = int(n) if n.isdigit() else roman_to_int(n)
+    else:
+        is_part = m.group("cjk_kw") == "部"
+        n = int(m.group("cjk_n"))
+    return formats[1 if is_part else 0].format(n=n)
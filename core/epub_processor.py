@@ -5,14 +5,63 @@ Instead of using ebooklib (which rewrites the entire EPUB structure),
 this module treats EPUB as a ZIP archive and modifies HTML files in-place.
 All CSS, images, TOC, fonts, and metadata are preserved byte-for-byte.
 """
+import logging
 import os
 import re
 import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 import shutil
-import tempfile
 from pathlib import Path
 from xml.etree import ElementTree as ET
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
+
+logger = logging.getLogger(__name__)
+
+# Compiled once; used for every OPF / spine HTML file
+_OPF_NS = re.compile(r'\{(.+)\}')
+_XML_DECL_HEAD = re.compile(r'(<\?xml[^?]*\?>)\s*')
+_XML_DECL_STRIP = re.compile(r'^<\?xml[^?]*\?>\s*')
+# Byte-level quick reject: a file without any <title> or translatable start
+# tag (cover / image-only / section-break pages) has nothing to extract
+_HAS_TEXT_TAG = re.compile(rb'<(?:title|p|h[1-6]|a)[\s/>]', re.IGNORECASE)
+
+# Tags whose text content we extract and translate
+# Added 'a' to translate link text individually without destroying hrefs
+_TRANSLATABLE = frozenset(['p', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'a'])
+# A translatable tag is skipped if it contains images or other complex elements
+_SKIP_IN_LINK = frozenset(['img', 'image', 'svg', 'table', 'pre', 'code'])
+# ALSO SKIP blocks containing 'a' (links) if the tag itself is not 'a'.
+# This prevents <p><a>...</a></p> from being wiped; the <a> is processed separately.
+_SKIP_DESCENDANTS = _SKIP_IN_LINK | {'a'}
+
+
+def _is_translatable(tag):
+    """find_all predicate: translatable tag with no skip-indicator descendant (one walk)."""
+    if tag.name not in _TRANSLATABLE:
+        return False
+    skip = _SKIP_IN_LINK if tag.name == 'a' else _SKIP_DESCENDANTS
+    for d in tag.descendants:
+        if d.name in skip:
+            return False
+    return True
+
+
+def _xml_texts(f, names):
+    """
+    Stream an XML file and collect the stripped, non-empty text of every element
+    whose local name (namespace ignored) is in names.
+    Returns {name: [text, ...]} in document order.
+    """
+    found = {name: [] for name in names}
+    for _, el in ET.iterparse(f, events=("end",)):
+        texts = found.get(el.tag.rpartition('}')[2])
+        if texts is not None:
+            text = "".join(el.itertext()).strip()
+            if text:
+                texts.append(text)
+            el.clear()
+    return found
 
 
 class EpubProcessor:
@@ -21,11 +70,18 @@ class EpubProcessor:
     using direct ZIP manipulation for perfect structure preservation.
     """
 
-    # Tags whose text content we extract and translate
-    # Tags whose text content we extract and translate
-    # Added 'a' to translate link text individually without destroying hrefs
+    # Tags whose text content we extract and translate (see _is_translatable)
     TRANSLATABLE_TAGS = ['p', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'a']
 
+    # Chunk size for streaming untouched ZIP entries in apply_translations
+    COPY_BUFSIZE = 64 * 1024
+
+    # Extraction only needs <title>, the translatable tags and the tags that make
+    # a block skippable; everything else is dropped while parsing.
+    # (_apply_to_html needs the full tree for re-serialization.)
+    STRAINER = SoupStrainer(['title'] + TRANSLATABLE_TAGS +
+                            ['img', 'image', 'svg', 'table', 'pre', 'code'])
+
     def __init__(self, filepath):
         self.filepath = filepath
         # Maps: item_href -> list of paragraph texts (original)
@@ -34,48 +90,55 @@ class EpubProcessor:
         self.opf_path = None
         self.opf_dir = ""  # Directory containing OPF (for resolving relative hrefs)
         self.spine_hrefs = []  # Ordered list of HTML file paths in ZIP
+        self._info_by_href = {}  # spine href -> ZipInfo (None if not in the ZIP)
 
     def _parse_container(self, zf):
         """Parse META-INF/container.xml to find the OPF file path."""
+        rootfile_tag = "{urn:oasis:names:tc:opendocument:xmlns:container}rootfile"
+        self.opf_path = None
         with zf.open("META-INF/container.xml") as f:
-            tree = ET.parse(f)
-        
-        ns = {"c": "urn:oasis:names:tc:opendocument:xmlns:container"}
-        rootfile = tree.find(".//c:rootfile", ns)
-        if rootfile is None:
-            # Try without namespace (some EPUBs)
-            rootfile = tree.find(".//{urn:oasis:names:tc:opendocument:xmlns:container}rootfile")
-        if rootfile is None:
+            # Stream the XML and stop at the first <rootfile>
+            for _, el in ET.iterparse(f, events=("end",)):
+                if el.tag == rootfile_tag:
+                    self.opf_path = el.get("full-path")
+                    break
+        if self.opf_path is None:
             raise RuntimeError("Cannot find rootfile in container.xml")
         
-        self.opf_path = rootfile.get("full-path")
         self.opf_dir = os.path.dirname(self.opf_path)
 
     def _parse_opf(self, zf):
         """Parse the OPF file to get spine reading order and manifest items."""
+        manifest = {}  # id -> {href, media_type}
+        spine = []     # (idref, linear) in document order
+        item_tag = itemref_tag = None
+        
         with zf.open(self.opf_path) as f:
-            tree = ET.parse(f)
-        
-        root = tree.getroot()
-        # Handle OPF namespace
-        ns_match = re.match(r'\{(.+)\}', root.tag)
-        ns = ns_match.group(1) if ns_match else ""
-        nsmap = {"opf": ns} if ns else {}
-        
-        # Build manifest: id -> href
-        manifest = {}
-        for item in root.iter(f"{{{ns}}}item" if ns else "item"):
-            item_id = item.get("id")
-            href = item.get("href")
-            media_type = item.get("media-type", "")
-            if item_id and href:
-                manifest[item_id] = {"href": href, "media_type": media_type}
+            for event, el in ET.iterparse(f, events=("start", "end")):
+                if item_tag is None:
+                    # First start event is the root: handle OPF namespace once
+                    ns_match = _OPF_NS.match(el.tag)
+                    prefix = f"{{{ns_match.group(1)}}}" if ns_match else ""
+                    item_tag, itemref_tag = f"{prefix}item", f"{prefix}itemref"
+                    continue
+                if event != "end":
+                    continue
+                
+                if el.tag == item_tag:
+                    # Build manifest: id -> href
+                    item_id = el.get("id")
+                    href = el.get("href")
+                    if item_id and href:
+                        manifest[item_id] = {"href": href, "media_type": el.get("media-type", "")}
+                    el.clear()
+                elif el.tag == itemref_tag:
+                    spine.append((el.get("idref"), el.get("linear", "yes")))
+                    el.clear()
         
         # Get spine order
         self.spine_hrefs = []
-        for itemref in root.iter(f"{{{ns}}}itemref" if ns else "itemref"):
-            idref = itemref.get("idref")
-            linear = itemref.get("linear", "yes")
+        self._info_by_href = {}
+        for idref, linear in spine:
             if idref in manifest and linear != "no":
                 href = manifest[idref]["href"]
                 # Resolve relative to OPF directory
@@ -83,6 +146,18 @@ class EpubProcessor:
                 # Normalize path separators
                 full_path = full_path.replace("\\", "/")
                 self.spine_hrefs.append(full_path)
+                self._info_by_href[full_path] = self._get_info(zf, full_path)
+
+    @staticmethod
+    def _get_info(zf, href):
+        """Look up the ZipInfo for href, retrying without a leading '/'."""
+        try:
+            return zf.getinfo(href)
+        except KeyError:
+            try:
+                return zf.getinfo(href.lstrip("/"))
+            except KeyError:
+                return None
 
     def extract_text_segments(self):
         """
@@ -99,43 +174,23 @@ class EpubProcessor:
         
         chapters = []
         
+        # ZIP reads share one file handle, so read the spine serially...
+        spine_files = []
         for href in self.spine_hrefs:
-            try:
-                html_bytes = zf.read(href)
-            except KeyError:
-                # Try without leading directory
-                alt = href.lstrip("/")
-                try:
-                    html_bytes = zf.read(alt)
-                    href = alt
-                except KeyError:
-                    continue
-            
-            soup = BeautifulSoup(html_bytes, 'html.parser')
-            
-            # Extract translatable paragraphs
-            paragraphs = []
-            
-            # 1. Extract <title> content
-            title_tag = soup.find('title')
-            if title_tag and title_tag.get_text().strip():
-                paragraphs.append(title_tag.get_text().strip())
-
-            # 2. Extract block-level text tags (simple, reliable)
-            for tag in soup.find_all(self.TRANSLATABLE_TAGS):
-                # Skip tags containing images or other complex elements
-                # ALSO SKIP tags containing 'a' (links) if the tag itself is not 'a'
-                # This prevents <p><a>...</a></p> from being wiped. We will process <a> separately.
-                if tag.name != 'a' and tag.find('a'):
-                    continue
-                
-                if tag.find(['img', 'image', 'svg', 'table', 'pre', 'code']):
-                    continue
-                
-                text = tag.get_text().strip()
-                if text:
-                    paragraphs.append(text)
-            
+            # Resolved once in _parse_opf (incl. the no-leading-'/' fallback)
+            info = self._info_by_href.get(href)
+            if info is None:
+                continue
+            with zf.open(info) as f:
+                spine_files.append((info.filename, f.read()))
+        
+        # ...then parse in threads (lxml does the heavy lifting in C).
+        # map() yields results in spine order.
+        workers = max(1, min(len(spine_files), os.cpu_count() or 1))
+        with ThreadPoolExecutor(max_workers=workers) as ex:
+            parsed = list(ex.map(lambda hf: self._extract_html(*hf), spine_files))
+        
+        for href, item_title, paragraphs in parsed:
             if not paragraphs:
                 continue
             
@@ -143,14 +198,6 @@ class EpubProcessor:
             self.item_segments[href] = paragraphs
             
             full_text = "\n\n".join(paragraphs)
-            
-            # Extract internal title for list display
-            item_title = "Untitled"
-            h_tag = soup.find(['h1', 'h2'])
-            if h_tag:
-                item_title = h_tag.get_text().strip()
-            elif title_tag:
-                item_title = title_tag.get_text().strip()
 
             chapters.append({
                 "id": href,
@@ -162,22 +209,17 @@ class EpubProcessor:
             })
             
         # 3. Process TOC (NCX) if exists
-        ncx_href = None
-        for name in zf.namelist():
-            if name.endswith('.ncx'):
-                ncx_href = name
+        ncx_info = None
+        for info in zf.infolist():
+            if info.filename.endswith('.ncx'):
+                ncx_info = info
                 break
         
-        if ncx_href:
+        if ncx_info:
+            ncx_href = ncx_info.filename
             try:
-                ncx_bytes = zf.read(ncx_href)
-                soup = BeautifulSoup(ncx_bytes, 'xml') 
-                paragraphs = []
-                
-                for text_tag in soup.find_all('text'):
-                    text = text_tag.get_text().strip()
-                    if text:
-                        paragraphs.append(text)
+                with zf.open(ncx_info) as f:
+                    paragraphs = _xml_texts(f, ('text',))['text']
                 
                 if paragraphs:
                     self.item_segments[ncx_href] = paragraphs
@@ -191,20 +233,16 @@ class EpubProcessor:
                         "skippable": False
                     })
             except Exception as e:
-                print(f"Error processing NCX {ncx_href}: {e}")
+                logger.warning("Error processing NCX %s: %s", ncx_href, e)
 
         # 4. Process OPF Metadata
         if self.opf_path:
             try:
-                opf_bytes = zf.read(self.opf_path)
-                soup = BeautifulSoup(opf_bytes, 'xml')
-                paragraphs = []
-                
-                for tag_name in ['title', 'creator', 'description', 'subject']:
-                    for tag in soup.find_all(tag_name):
-                        text = tag.get_text().strip()
-                        if text:
-                            paragraphs.append(text)
+                tag_names = ('title', 'creator', 'description', 'subject')
+                with zf.open(self.opf_path) as f:
+                    found = _xml_texts(f, tag_names)
+                # Grouped by tag name (all titles first, then creators, ...)
+                paragraphs = [text for name in tag_names for text in found[name]]
                 
                 if paragraphs:
                     self.item_segments[self.opf_path] = paragraphs
@@ -218,27 +256,65 @@ class EpubProcessor:
                         "skippable": False
                     })
             except Exception as e:
-                print(f"Error processing OPF {self.opf_path}: {e}")
+                logger.warning("Error processing OPF %s: %s", self.opf_path, e)
 
         zf.close()
         return chapters
 
+    def _extract_html(self, href, html_bytes):
+        """
+        Parse one spine HTML file.
+        Returns (href, item_title, paragraphs); paragraphs is empty if the
+        file has nothing to translate.
+        """
+        if not _HAS_TEXT_TAG.search(html_bytes):
+            return href, None, []
+        
+        soup = BeautifulSoup(html_bytes, 'lxml', from_encoding='utf-8',
+                             parse_only=self.STRAINER)
+        
+        # Extract translatable paragraphs
+        paragraphs = []
+        
+        # 1. Extract <title> content
+        title_tag = soup.find('title')
+        if title_tag and title_tag.get_text().strip():
+            paragraphs.append(title_tag.get_text().strip())
+
+        # 2. Extract block-level text tags (simple, reliable)
+        for tag in soup.find_all(_is_translatable):
+            text = tag.get_text().strip()
+            if text:
+                paragraphs.append(text)
+        
+        if not paragraphs:
+            return href, None, paragraphs
+        
+        # Extract internal title for list display
+        item_title = "Untitled"
+        h_tag = soup.find(['h1', 'h2'])
+        if h_tag:
+            item_title = h_tag.get_text().strip()
+        elif title_tag:
+            item_title = title_tag.get_text().strip()
+        return href, item_title, paragraphs
+
     def apply_translations(self, translated_chapters, output_path):
         """
         Apply translations back to the EPUB by modifying HTML files in the ZIP.
         
         Strategy:
-        - Copy the entire original ZIP to output_path
+        - Read the original ZIP and write output_path in a single pass
         - For each translated chapter, parse the corresponding HTML,
           find matching <p>/<h> tags, and replace text content
-        - Write modified HTML back into the ZIP
+        - Copy every other entry through unchanged (same ZipInfo/compression)
         
         This preserves ALL non-HTML files (CSS, images, fonts, NCX, OPF) exactly.
         """
-        # Step 1: Copy original EPUB to output
-        shutil.copy2(self.filepath, output_path)
+        if os.path.abspath(output_path) == os.path.abspath(self.filepath):
+            raise ValueError("output_path must differ from the source EPUB")
         
-        # Build translation map: href -> translated paragraphs
+        # Step 1: Build translation map: href -> translated paragraphs
         trans_map = {}
         for i, chapter in enumerate(translated_chapters):
             href_keys = list(self.item_segments.keys())
@@ -248,30 +324,33 @@ class EpubProcessor:
                 trans_paragraphs = [p.strip() for p in trans_text.split("\n\n") if p.strip()]
                 trans_map[href] = trans_paragraphs
         
-        # Step 2: Rebuild the ZIP with modified files
-        temp_dir = tempfile.mkdtemp()
-        temp_epub = os.path.join(temp_dir, "output.epub")
-        
+        # Step 2: Write the new ZIP straight from the original
         try:
-            with zipfile.ZipFile(output_path, 'r') as zf_in:
-                with zipfile.ZipFile(temp_epub, 'w') as zf_out:
+            with zipfile.ZipFile(self.filepath, 'r') as zf_in:
+                with zipfile.ZipFile(output_path, 'w') as zf_out:
                     for item in zf_in.infolist():
-                        data = zf_in.read(item.filename)
+                        if item.filename not in trans_map:
+                            # Untouched entry (images, fonts, CSS...): stream it through
+                            # without holding the whole file in memory
+                            with zf_in.open(item, 'r') as src, zf_out.open(item, 'w') as dst:
+                                shutil.copyfileobj(src, dst, self.COPY_BUFSIZE)
+                            continue
                         
-                        if item.filename in trans_map:
-                            orig_segs = self.item_segments.get(item.filename, [])
-                            trans_segs = trans_map[item.filename]
-                            
-                            if item.filename.endswith('.ncx') or item.filename.endswith('.opf'):
-                                data = self._apply_to_xml(data, orig_segs, trans_segs)
-                            else:
-                                data = self._apply_to_html(data, orig_segs, trans_segs)
+                        data = zf_in.read(item)
+                        orig_segs = self.item_segments.get(item.filename, [])
+                        trans_segs = trans_map[item.filename]
+                        
+                        if item.filename.endswith('.ncx') or item.filename.endswith('.opf'):
+                            data = self._apply_to_xml(data, orig_segs, trans_segs)
+                        else:
+                            data = self._apply_to_html(data, orig_segs, trans_segs)
                         
                         zf_out.writestr(item, data)
-            
-            shutil.move(temp_epub, output_path)
-        finally:
-            shutil.rmtree(temp_dir, ignore_errors=True)
+        except BaseException:
+            # Don't leave a half-written EPUB behind
+            if os.path.exists(output_path):
+                os.remove(output_path)
+            raise
         
         return output_path
 
@@ -296,58 +375,65 @@ class EpubProcessor:
         CRITICAL: Preserves the XML declaration and original document structure.
         Uses sequential index-based matching to handle duplicate text correctly.
         """
+        # Nothing to apply: keep the file byte-for-byte and skip the parse
+        if not orig_paragraphs or not trans_paragraphs:
+            return html_bytes
+        
         raw = html_bytes.decode('utf-8')
         
-        # 1. Save the XML declaration if present (BeautifulSoup strips it)
+        # 1. Save the XML declaration if present and parse without it
+        #    (lxml's HTML parser would turn it into a <!--?xml ...?--> comment)
         xml_decl = ""
-        xml_match = re.match(r'(<\?xml[^?]*\?>)\s*', raw)
+        xml_match = _XML_DECL_HEAD.match(raw)
         if xml_match:
             xml_decl = xml_match.group(1) + "\n"
+            raw = raw[xml_match.end():]
         
-        # 2. Parse with html.parser
-        soup = BeautifulSoup(raw, 'html.parser')
+        # 2. Parse with lxml (C parser)
+        soup = BeautifulSoup(raw, 'lxml')
         
-        # 3. Build text->translation map (with queue for duplicates)
+        # 3. Build text->translation map (FIFO queue per text for duplicates)
         text_map = {}
         count = min(len(orig_paragraphs), len(trans_paragraphs))
-        print(f"DEBUG: Applying translation (orig={len(orig_paragraphs)}, trans={len(trans_paragraphs)})")
+        logger.debug("Applying translation (orig=%d, trans=%d)",
+                     len(orig_paragraphs), len(trans_paragraphs))
         
         for i in range(count):
             orig = orig_paragraphs[i].strip()
             trans = trans_paragraphs[i].strip()
             if orig and trans:
-                if orig not in text_map:
-                    text_map[orig] = []
-                text_map[orig].append(trans)
+                queue = text_map.get(orig)
+                if queue is None:
+                    queue = text_map[orig] = deque()
+                queue.append(trans)
         
         # 4. Replace <title> tag first (index 0 in orig_paragraphs is title if extracted)
+        matched_count = 0
         title_tag = soup.find('title')
         if title_tag:
-            title_text = title_tag.get_text().strip()
-            if title_text in text_map and text_map[title_text]:
-                title_tag.string = text_map[title_text].pop(0)
+            queue = text_map.get(title_tag.get_text().strip())
+            if queue:
+                title_tag.string = queue.popleft()
+                matched_count += 1
         
         # 5. Replace block-level tags sequentially
-        matched_count = 0
-        for tag in soup.find_all(self.TRANSLATABLE_TAGS):
-            # Same logic as extraction: skip parent blocks that contain links
-            if tag.name != 'a' and tag.find('a'):
-                continue
-
-            if tag.find(['img', 'image', 'svg', 'table', 'pre', 'code']):
-                continue
-            
-            tag_text = tag.get_text().strip()
-            if tag_text in text_map and text_map[tag_text]:
-                trans = text_map[tag_text].pop(0)
+        for tag in soup.find_all(_is_translatable):
+            # Same selection as extraction (see _is_translatable)
+            queue = text_map.get(tag.get_text().strip())
+            if queue:
+                trans = queue.popleft()
                 tag.clear()
                 tag.string = trans
                 matched_count += 1
         
-        print(f"DEBUG: Successfully replaced {matched_count} tags")
+        logger.debug("Successfully replaced %d tags", matched_count)
+        
+        # Nothing matched: return the original rather than a re-serialized copy
+        if matched_count == 0:
+            return html_bytes
         
         # 6. Serialize and restore XML declaration
         result = str(soup)
         # Strip any XML declaration BeautifulSoup may have kept
-        result = re.sub(r'^<\?xml[^?]*\?>\s*', '', result)
+        result = _XML_DECL_STRIP.sub('', result)
         return (xml_decl + result).encode('utf-8')
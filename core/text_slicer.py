@@ -13,9 +13,14 @@ import re
 
 class TextSlicer:
     # Characters that cause TTS noise / artifacts
-    NOISE_PATTERN = re.compile(r'[*#~`|]|^-{3,}$|^={3,}$|^\s*>\s*', re.MULTILINE)
+    NOISE_CHARS = re.compile(r'[*#~`|]')
+    # Line-level noise: horizontal rules and blockquote markers. None of these
+    # can overlap a noise char, so the two passes match the old combined regex
+    NOISE_LINES = re.compile(r'^(?:-{3,}$|={3,}$|\s*>\s*)', re.MULTILINE)
     # Sentence-ending punctuation for secondary splitting
-    SENTENCE_END = re.compile(r'([。！？.!?])')
+    SENTENCE_END = re.compile(r'[。！？.!?]')
+    # Runs of 3+ newlines, collapsed to one blank line
+    BLANK_LINES = re.compile(r'\n{3,}')
     # Minimum chars — segments shorter than this get merged into previous
     MIN_CHARS = 10
 
@@ -35,15 +40,17 @@ class TextSlicer:
         if not text:
             return ""
 
-        # Remove markdown-style noise
-        cleaned = self.NOISE_PATTERN.sub('', text)
+        # Remove markdown-style noise. The line patterns are only tried when
+        # their marker is present; anchored multiline regexes are the slow part
+        cleaned = text
+        if '>' in cleaned or '---' in cleaned or '===' in cleaned:
+            cleaned = self.NOISE_LINES.sub('', cleaned)
+        cleaned = self.NOISE_CHARS.sub('', cleaned)
 
-        # Collapse multiple blank lines into double newline
-        cleaned = re.sub(r'\n{3,}', '\n\n', cleaned)
-
-        # Remove leading/trailing whitespace per line but keep structure
-        lines = [line.strip() for line in cleaned.split('\n')]
-        cleaned = '\n'.join(lines)
+        # Collapse multiple blank lines into double newline and remove
+        # leading/trailing whitespace per line, keeping structure
+        cleaned = self.BLANK_LINES.sub('\n\n', cleaned)
+        cleaned = '\n'.join(line.strip() for line in cleaned.split('\n'))
 
         # Final trim
         return cleaned.strip()
@@ -56,25 +63,31 @@ class TextSlicer:
         if len(segment) <= self.max_chars:
             return [segment]
 
-        # Split at sentence-ending punctuation, keeping the delimiter
-        parts = self.SENTENCE_END.split(segment)
-
+        # Walk the segment with two cursors instead of materialising
+        # SENTENCE_END.split(): segment[start:end] is the pending chunk, and it
+        # grows one piece at a time (the text before a delimiter, then the
+        # delimiter itself). Slices are only taken when a chunk is emitted.
         chunks = []
-        current = ""
-
-        for part in parts:
-            if not part:
-                continue
-
-            # If adding this part would exceed max, flush current
-            if len(current) + len(part) > self.max_chars and current:
-                chunks.append(current)
-                current = part
-            else:
-                current += part
-
-        if current:
-            chunks.append(current)
+        start = end = 0
+        max_chars = self.max_chars
+
+        def add(piece_end):
+            nonlocal start, end
+            # If adding this piece would exceed max, flush current
+            if piece_end - start > max_chars and end > start:
+                chunks.append(segment[start:end])
+                start = end
+            end = piece_end
+
+        for match in self.SENTENCE_END.finditer(segment):
+            if match.start() > end:
+                add(match.start())
+            add(match.end())
+
+        if len(segment) > end:
+            add(len(segment))
+        if end > start:
+            chunks.append(segment[start:end])
 
         # Safety: if any chunk is still too long (no punctuation found),
         # force-split at max_chars boundary
@@ -116,13 +129,19 @@ class TextSlicer:
             return []
 
         # --- Tier 2: Merge short segments ---
+        # Collect each run of short continuations and join it once, instead of
+        # re-concatenating the previous segment for every short paragraph.
+        lengths = list(map(len, paragraphs))
         merged = []
-        for para in paragraphs:
-            if merged and len(para) < self.MIN_CHARS:
+        current_parts = [paragraphs[0]]
+        for i in range(1, len(paragraphs)):
+            if lengths[i] < self.MIN_CHARS:
                 # Merge into previous segment
-                merged[-1] = merged[-1] + '，' + para
+                current_parts.append(paragraphs[i])
             else:
-                merged.append(para)
+                merged.append('，'.join(current_parts))
+                current_parts = [paragraphs[i]]
+        merged.append('，'.join(current_parts))
 
         # Edge case: if the first (and only) segment is still very short, keep it
         if not merged:
@@ -136,5 +155,7 @@ class TextSlicer:
             else:
                 final_chunks.append(segment)
 
-        # Final cleanup: strip each chunk, remove empties
-        return [c.strip() for c in final_chunks if c.strip()]
+        # Final cleanup: strip each chunk, remove empties. Chunks never
+        # contain '\n' (Tier 1 split on it), so callers need no further
+        # normalization.
+        return [c for c in map(str.strip, final_chunks) if c]
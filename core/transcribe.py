@@ -8,6 +8,9 @@ import sys
 import json
 import os
 
+# Marks the final result line (see SubprocessTTSEngine.transcribe_audio)
+RESULT_PREFIX = "##RESULT##"
+
 def main():
     # Force unbuffered stderr for debugging
     sys.stderr.reconfigure(encoding='utf-8')
@@ -38,10 +41,10 @@ def main():
         
         text = result.get("text", "").strip()
         
-        print(json.dumps({"status": "completed", "text": text}), flush=True)
+        print(RESULT_PREFIX + json.dumps({"status": "completed", "text": text}), flush=True)
         
     except Exception as e:
-        print(json.dumps({"status": "error", "error": str(e)}), flush=True)
+        print(RESULT_PREFIX + json.dumps({"status": "error", "error": str(e)}), flush=True)
         sys.exit(1)
 
 if __name__ == "__main__":
@@ -1,32 +1,230 @@
+import asyncio
+import atexit
 import subprocess
-import json
 import os
+import orjson
+import secrets
+import struct
 import sys
 import tempfile
+import threading
 from pathlib import Path
 
+try:
+    from multiprocessing import shared_memory
+except ImportError:  # No POSIX/Win32 shared memory: fall back to temp files
+    shared_memory = None
+
 class MLXTranslator:
+    # Env var telling the worker which inherited fd to write status frames to
+    STATUS_FD_ENV = "EBOOKTOOLS_STATUS_FD"
+    # Set to 1 to spawn a fresh worker per book (old behaviour, for debugging)
+    ONESHOT_ENV = "EBOOKTOOLS_MLX_ONESHOT"
+    # Buffer size for the worker's stdin/stdout/stderr pipes
+    PIPE_BUFSIZE = 64 * 1024
+
+    # The persistent worker (process, status_stream), shared by all instances:
+    # the app creates a new MLXTranslator per job, the model stays loaded
+    _server = None
+    _server_lock = threading.Lock()
+
     def __init__(self, model_id="m-i/HY-MT1.5-7B-mlx-8Bit"):
         self.model_id = model_id
-        
+
         # Path to the specific venv for MLX translation (venv_mt15)
         # Project root is assumed to be two levels up from this file (core/translator_mlx.py -> core -> root)
         self.project_root = Path(__file__).resolve().parent.parent
         self.venv_python = self.project_root / "venv_mt15" / "bin" / "python"
         self.worker_script = self.project_root / "core" / "translator_worker_mlx.py"
 
+    @staticmethod
+    def _write_frame(stream, msg):
+        """Write one <4-byte little-endian length><JSON> frame."""
+        buf = orjson.dumps(msg)
+        stream.write(struct.pack("<I", len(buf)) + buf)
+        stream.flush()
+
+    @staticmethod
+    def _read_frames(stream):
+        """Yield status dicts from <4-byte little-endian length><JSON> frames until EOF."""
+        while True:
+            header = stream.read(4)
+            if len(header) < 4:
+                return
+            (size,) = struct.unpack("<I", header)
+            yield orjson.loads(stream.read(size))
+
+    @classmethod
+    def _forward_logs(cls, stdout):
+        """
+        Forward the worker's stdout (like mlx logs) to console/logs.
+        Reads whatever is available and writes each batch of complete lines
+        with one call, without decoding them.
+        """
+        out = getattr(sys.stdout, "buffer", None)
+        pending = b""
+        while True:
+            chunk = stdout.read1(cls.PIPE_BUFSIZE)
+            if chunk:
+                lines = (pending + chunk).split(b"\n")
+                pending = lines.pop()
+            else:
+                lines, pending = [pending], b""
+            batch = b"".join(b"[MLX Worker Log] " + line.strip() + b"\n" for line in lines if line.strip())
+            if batch:
+                if out is not None:
+                    sys.stdout.flush()  # keep ordering with text written via print()
+                    out.write(batch)
+                    out.flush()
+                else:
+                    print(batch.decode('utf-8', 'replace'), end="", flush=True)
+            if not chunk:
+                return
+
+    def _spawn(self, worker_args, stdin=None, stderr=subprocess.PIPE):
+        """Start the worker. Returns (process, status_stream)."""
+        # We set PYTHONPATH to project root so worker can import novel_translate
+        env = os.environ.copy()
+        env["PYTHONPATH"] = str(self.project_root) + os.pathsep + env.get("PYTHONPATH", "")
+
+        # Status messages arrive as length-prefixed frames on a dedicated
+        # pipe; stdout is left to the worker's (MLX) log output
+        status_r, status_w = os.pipe()
+        env[self.STATUS_FD_ENV] = str(status_w)
+        try:
+            process = subprocess.Popen(
+                [str(self.venv_python), str(self.worker_script), *worker_args],
+                stdin=stdin,
+                stdout=subprocess.PIPE,
+                stderr=stderr,
+                env=env,
+                bufsize=self.PIPE_BUFSIZE,  # Raw bytes; logs are forwarded in chunks
+                pass_fds=(status_w,)
+            )
+        except BaseException:
+            os.close(status_r)
+            raise
+        finally:
+            os.close(status_w)
+
+        # Forward worker logs on a side thread so a chatty stdout can't
+        # fill its pipe and stall the worker
+        threading.Thread(target=self._forward_logs, args=(process.stdout,), daemon=True).start()
+        return process, os.fdopen(status_r, 'rb')
+
+    @classmethod
+    def _pump_status(cls, status_stream, progress_callback):
+        """
+        Dispatch status frames to progress_callback until the job ends.
+        Returns the final "completed" / "error" frame, or None if the worker
+        went away first.
+        """
+        for data in cls._read_frames(status_stream):
+            status = data.get("status")
+            if status == "progress":
+                if progress_callback:
+                    progress_callback(data.get("progress", 0), data.get("message", ""))
+            elif status in ("completed", "error"):
+                return data
+            elif status == "loading":
+                if progress_callback:
+                    progress_callback(0, data.get("message"))
+            elif status == "translating":
+                if progress_callback:
+                    progress_callback(0, data.get("message"))
+        return None
+
+    @staticmethod
+    def _new_shm_name():
+        """
+        Name for the worker's result segment. Chosen here so the segment can be
+        removed even if we never see the worker's "completed" frame.
+        (Short: macOS limits shm names to 31 chars.)
+        """
+        return f"ebt_{secrets.token_hex(8)}"
+
+    @staticmethod
+    def _unlink_shm(name):
+        """Remove a result segment if the worker created it."""
+        try:
+            leftover = shared_memory.SharedMemory(name=name)
+        except FileNotFoundError:
+            return
+        leftover.close()
+        leftover.unlink()
+
+    @staticmethod
+    def _read_shm_result(name, size):
+        """Read the result the worker left in shared memory, then free the segment."""
+        output_shm = shared_memory.SharedMemory(name=name)
+        try:
+            return orjson.loads(bytes(output_shm.buf[:size]))
+        finally:
+            output_shm.close()
+            output_shm.unlink()
+
+    def _ensure_worker(self):
+        """Return the persistent (process, status_stream), starting the worker if needed."""
+        server = MLXTranslator._server
+        if server is not None and server[0].poll() is None:
+            return server
+        MLXTranslator._discard_worker()
+
+        # stderr goes straight to our console: nobody would drain a pipe for
+        # a worker that lives as long as the app
+        process, status_stream = self._spawn(["--serve"], stdin=subprocess.PIPE, stderr=None)
+        ready = next(self._read_frames(status_stream), None)
+        if not ready or ready.get("status") != "ready":
+            try:
+                process.wait(timeout=5)  # usually already exiting (e.g. import error)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+            status_stream.close()
+            raise RuntimeError(f"MLX worker failed to start (exit code {process.returncode})")
+        MLXTranslator._server = (process, status_stream)
+        return MLXTranslator._server
+
+    @classmethod
+    def _discard_worker(cls):
+        """Kill the persistent worker (its state is unknown, e.g. mid-job)."""
+        server, cls._server = cls._server, None
+        if server is None:
+            return
+        process, status_stream = server
+        if process.poll() is None:
+            process.kill()
+        process.wait()
+        status_stream.close()
+
+    @classmethod
+    def shutdown(cls):
+        """Ask the persistent worker to quit (registered with atexit)."""
+        server, cls._server = cls._server, None
+        if server is None:
+            return
+        process, status_stream = server
+        try:
+            cls._write_frame(process.stdin, {"cmd": "quit"})
+            process.stdin.close()
+            process.wait(timeout=10)
+        except (OSError, ValueError, subprocess.TimeoutExpired):
+            process.kill()
+            process.wait()
+        status_stream.close()
+
     def translate_book(self, chapters, book_title="", glossary=None, target_lang="zh", progress_callback=None):
         """
         Translate a list of chapters using the MLX worker script.
-        
+
         Args:
             chapters: list of dict {'title': str, 'text': str}
             book_title: str
             glossary: dict or None
             target_lang: str (e.g. 'zh', 'en', 'ja')
             progress_callback: function(progress_int, message_str)
-            
-        Returns: 
+
+        Returns:
             (translated_chapters, translated_book_title)
         """
         if not os.path.exists(self.venv_python):
@@ -38,85 +236,115 @@ class MLXTranslator:
             "book_title": book_title,
             "glossary": glossary or {},
             "model_id": self.model_id,
-            "target_lang": target_lang,
-            "output_path": ""  # Will set temp path below
+            "target_lang": target_lang
         }
 
-        # Create temp files
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.json', delete=False, encoding='utf-8') as f_in:
-            json.dump(input_data, f_in, ensure_ascii=False)
-            input_tmp_path = f_in.name
-            
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.json', delete=False, encoding='utf-8') as f_out:
-            output_tmp_path = f_out.name
-            
-        # Update output path in input file
-        input_data["output_path"] = output_tmp_path
-        with open(input_tmp_path, 'w', encoding='utf-8') as f:
-            json.dump(input_data, f, ensure_ascii=False)
+        if shared_memory is None or os.environ.get(self.ONESHOT_ENV):
+            result = self._translate_oneshot(input_data, progress_callback)
+        else:
+            result = self._translate_persistent(input_data, progress_callback)
+        return result.get("chapters", []), result.get("trans_book_title", book_title)
+
+    async def translate_book_async(self, chapters, book_title="", glossary=None, target_lang="zh", progress_callback=None):
+        """
+        translate_book for asyncio callers: the blocking worker I/O runs in a
+        thread, so the event loop stays free. progress_callback is called from
+        that thread.
+        """
+        return await asyncio.to_thread(self.translate_book, chapters, book_title, glossary,
+                                       target_lang, progress_callback)
+
+    def _translate_persistent(self, input_data, progress_callback):
+        """Run one job on the long-lived worker (model loaded once per session)."""
+        # Hand the payload over in shared memory: one copy, no filesystem.
+        # orjson writes UTF-8 bytes directly (same as json.dump with ensure_ascii=False)
+        payload = orjson.dumps(input_data)
+        with MLXTranslator._server_lock:
+            process, status_stream = self._ensure_worker()
+            input_shm = shared_memory.SharedMemory(create=True, size=max(1, len(payload)))
+            output_shm_name = self._new_shm_name()
+            job_finished = False
+            try:
+                input_shm.buf[:len(payload)] = payload
+                self._write_frame(process.stdin,
+                                  {"cmd": "translate", "shm": input_shm.name, "size": len(payload),
+                                   "output_shm": output_shm_name})
+
+                data = self._pump_status(status_stream, progress_callback)
+                if data is None:
+                    raise RuntimeError(f"MLX worker exited unexpectedly (exit code {process.poll()})")
+                job_finished = True
+                if data["status"] == "error":
+                    raise RuntimeError(f"MLX Worker Error: {data.get('error')}\n{data.get('traceback')}")
+                return self._read_shm_result(output_shm_name, data.get("size", 0))
+            finally:
+                input_shm.close()
+                input_shm.unlink()
+                if not job_finished:
+                    # Died, or we bailed out mid-job: don't reuse it
+                    MLXTranslator._discard_worker()
+                # No-op if the result was read (or never written)
+                self._unlink_shm(output_shm_name)
+
+    def _translate_oneshot(self, input_data, progress_callback):
+        """Spawn a worker for this book only."""
+        input_shm = output_shm_name = process = None
+        input_tmp_path = output_tmp_path = None
+        if shared_memory is not None:
+            # The worker returns its result the same way, in output_shm_name
+            payload = orjson.dumps(input_data)
+            input_shm = shared_memory.SharedMemory(create=True, size=max(1, len(payload)))
+            input_shm.buf[:len(payload)] = payload
+            output_shm_name = self._new_shm_name()
+            worker_args = ["--shm", input_shm.name, str(len(payload)), output_shm_name]
+        else:
+            # Reserve the output file first so the input payload is written only once
+            with tempfile.NamedTemporaryFile(suffix='.json', delete=False) as f_out:
+                output_tmp_path = f_out.name
+            input_data = dict(input_data, output_path=output_tmp_path)
+            with tempfile.NamedTemporaryFile(suffix='.json', delete=False) as f_in:
+                f_in.write(orjson.dumps(input_data))
+                input_tmp_path = f_in.name
+            worker_args = [input_tmp_path]
 
         try:
             # Run worker in subprocess
-            # We set PYTHONPATH to project root so worker can import novel_translate
-            env = os.environ.copy()
-            env["PYTHONPATH"] = str(self.project_root) + os.pathsep + env.get("PYTHONPATH", "")
-            
-            process = subprocess.Popen(
-                [str(self.venv_python), str(self.worker_script), input_tmp_path],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True,
-                env=env,
-                bufsize=1  # Line buffered
-            )
+            process, status_stream = self._spawn(worker_args)
 
-            # Monitor stdout for progress
-            while True:
-                line = process.stdout.readline()
-                if not line and process.poll() is not None:
-                    break
-                
-                if line:
-                    line = line.strip()
-                    try:
-                        # Try to parse JSON from stdout
-                        if line.startswith('{') and line.endswith('}'):
-                            data = json.loads(line)
-                            status = data.get("status")
-                            
-                            if status == "progress":
-                                if progress_callback:
-                                    progress_callback(data.get("progress", 0), data.get("message", ""))
-                            elif status == "error":
-                                raise RuntimeError(f"MLX Worker Error: {data.get('error')}\n{data.get('traceback')}")
-                            elif status == "loading":
-                                if progress_callback:
-                                    progress_callback(0, data.get("message"))
-                            elif status == "translating":
-                                if progress_callback:
-                                    progress_callback(0, data.get("message"))
-                        else:
-                            # Forward non-JSON output (like mlx logs) to console/logs if needed
-                            print(f"[MLX Worker Log] {line}")
-                            
-                    except json.JSONDecodeError:
-                        print(f"[MLX Worker raw] {line}")
+            # Monitor status frames for progress (blocks on each frame; ends at EOF)
+            with status_stream:
+                data = self._pump_status(status_stream, progress_callback)
 
+            process.wait()
+            if data is not None and data["status"] == "error":
+                raise RuntimeError(f"MLX Worker Error: {data.get('error')}\n{data.get('traceback')}")
             if process.returncode != 0:
-                stderr = process.stderr.read()
+                stderr = process.stderr.read().decode('utf-8', 'replace')
                 raise RuntimeError(f"Translation failed with exit code {process.returncode}\nStderr: {stderr}")
 
             # Read Output
-            if os.path.exists(output_tmp_path):
-                with open(output_tmp_path, 'r', encoding='utf-8') as f:
-                    result = json.load(f)
-                    return result.get("chapters", []), result.get("trans_book_title", book_title)
+            if output_shm_name:
+                return self._read_shm_result(output_shm_name, data.get("size", 0))
+            elif output_tmp_path and os.path.exists(output_tmp_path):
+                with open(output_tmp_path, 'rb') as f:
+                    return orjson.loads(f.read())
             else:
                 raise RuntimeError("Output file was not created by the worker.")
 
         finally:
-            # Cleanup temp files
-            if os.path.exists(input_tmp_path):
-                os.remove(input_tmp_path)
-            if os.path.exists(output_tmp_path):
-                os.remove(output_tmp_path)
+            if process is not None and process.poll() is None:
+                # We bailed out mid-job: stop the worker before cleaning up
+                process.kill()
+                process.wait()
+            # Cleanup shared memory / temp files
+            if input_shm is not None:
+                input_shm.close()
+                input_shm.unlink()
+            if output_shm_name:
+                # No-op if the result was read (or never written)
+                self._unlink_shm(output_shm_name)
+            for tmp_path in (input_tmp_path, output_tmp_path):
+                if tmp_path and os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+
+atexit.register(MLXTranslator.shutdown)
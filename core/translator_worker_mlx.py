@@ -1,31 +1,89 @@
+import os
 import sys
-import json
+import queue
+import re
+import struct
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
 
+# The project root goes on sys.path for the core helpers here and for
+# novel_translate (core logic reused directly) below
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from core._worker_json import dumps as _dumps, dumpb as _dumpb, loads as _loads
+from core.chapter_titles import fast_translate_title
+
+# Status messages go to the fd MLXTranslator passes in, as
+# <4-byte little-endian length><JSON> frames; stdout stays free for logs.
+# Without it (standalone runs) they are printed as JSON lines.
+_STATUS_FD = os.environ.get("EBOOKTOOLS_STATUS_FD")
+_status_out = os.fdopen(int(_STATUS_FD), 'wb') if _STATUS_FD else None
+
+def _write_status(msg: dict):
+    if _status_out is None:
+        print(_dumps(msg), flush=True)
+        return
+    buf = _dumpb(msg)
+    _status_out.write(struct.pack("<I", len(buf)) + buf)
+    _status_out.flush()
+
+# Progress updates are written by a daemon thread so the generation loop
+# never waits on the pipe; when the parent falls behind, updates are dropped
+PROGRESS_QUEUE_SIZE = 256
+_progress_q = queue.Queue(maxsize=PROGRESS_QUEUE_SIZE)
+
+def _progress_writer():
+    while True:
+        msg = _progress_q.get()
+        try:
+            _write_status(msg)
+        except Exception:
+            pass
+        finally:
+            _progress_q.task_done()
+
+threading.Thread(target=_progress_writer, name="progress-writer", daemon=True).start()
+
+def _emit_progress(msg: dict):
+    """Queue a progress update without blocking; dropped if the queue is full."""
+    try:
+        _progress_q.put_nowait(msg)
+    except queue.Full:
+        pass
+
+def _emit(msg: dict):
+    """Send one status message to the parent, after any queued progress."""
+    _progress_q.join()
+    _write_status(msg)
+
+try:
+    from multiprocessing import shared_memory, resource_tracker
+except ImportError:
+    shared_memory = None
+
 # Import MLX dependencies
 try:
+    import mlx.core as mx
     from mlx_lm import load, generate
+    from mlx_lm.models.cache import make_prompt_cache, can_trim_prompt_cache, trim_prompt_cache
     from mlx_lm.sample_utils import make_sampler
 except ImportError:
-    print(json.dumps({"error": "mlx_lm library not found. Ensure you are running in venv_mt15."}))
+    print(_dumps({"error": "mlx_lm library not found. Ensure you are running in venv_mt15."}))
     sys.exit(1)
 
-# Import core logic from novel_translate.py directly to reuse code
-# We need to add the project root to sys.path to find novel_translate
-PROJECT_ROOT = Path(__file__).resolve().parent.parent
-if str(PROJECT_ROOT) not in sys.path:
-    sys.path.insert(0, str(PROJECT_ROOT))
-
 try:
     from novel_translate import (
-        smart_chunk, 
         build_prompt,
+        build_glossary_string,
         MAX_CHUNK_CHARS,
-        PREV_CONTEXT_CHARS
     )
 except ImportError:
-    print(json.dumps({"error": "Could not import novel_translate module. Ensure it is in the python path."}))
+    print(_dumps({"error": "Could not import novel_translate module. Ensure it is in the python path."}))
     sys.exit(1)
 
 DEFAULT_MLX_MODEL = "m-i/HY-MT1.5-7B-mlx-8Bit"
@@ -36,166 +94,442 @@ GEN_CONFIG = {
     "temp": 0.7,
     "top_p": 0.6,
     "max_tokens": 2048,
+    # Prompt tokens processed per forward pass during prefill. Smaller steps
+    # lower peak memory on long prompts (avoids swapping on 16-32 GB Macs).
+    "prefill_step_size": 1024,
     "verbose": False
 }
 
-def translate_chunk_mlx(model, tokenizer, source_chunk: str, glossary: dict, prev_translation: str = "", target_language: str = "繁體中文") -> str:
+def _prefill_step_size(prompt_chars: int) -> int:
+    """Adapt the prefill step to the prompt: smaller for long prompts, larger for short ones."""
+    step = GEN_CONFIG["prefill_step_size"]
+    if prompt_chars > 8000:
+        return min(step, 512)
+    if prompt_chars < 1500:
+        return max(step, 2048)
+    return step
+
+PREFETCH_BUFSIZE = 8 * 1024 * 1024
+
+def _warm_file(path: Path) -> int:
+    """Read a file once so its pages land in the OS buffer cache."""
+    buf = bytearray(PREFETCH_BUFSIZE)
+    total = 0
+    with open(path, 'rb', buffering=0) as f:
+        while True:
+            n = f.readinto(buf)
+            if not n:
+                return total
+            total += n
+
+def prefetch_weights(model_id: str):
+    """
+    Warm the page cache with the model's safetensors shards, one thread per
+    shard, so load() (which mmaps them) doesn't fault pages in one by one.
+    Only looks at local files: a model that isn't downloaded yet is left to load().
+    """
+    model_dir = Path(model_id)
+    if not model_dir.is_dir():
+        try:
+            from huggingface_hub import snapshot_download
+            model_dir = Path(snapshot_download(model_id, allow_patterns=["*.safetensors"], local_files_only=True))
+        except Exception:
+            return
+    shards = sorted(model_dir.glob("*.safetensors"))
+    if not shards:
+        return
+    # Plain reads release the GIL, so the shards really are read in parallel
+    with ThreadPoolExecutor(max_workers=len(shards)) as ex:
+        list(ex.map(_warm_file, shards))
+
+def _encode(tokenizer, text: str) -> list:
+    """Tokenize a formatted prompt exactly like mlx_lm.generate does for strings."""
+    bos = tokenizer.bos_token
+    add_special_tokens = bos is None or not text.startswith(bos)
+    return tokenizer.encode(text, add_special_tokens=add_special_tokens)
+
+# Previous-translation context is bounded in tokens, not characters, so each
+# call pays the same prefill cost whatever the script of the target language
+PREV_CONTEXT_TOKENS = 64
+
+def _tail_context(tokenizer, text: str) -> str:
+    """Keep the last PREV_CONTEXT_TOKENS tokens of text."""
+    ids = tokenizer.encode(text, add_special_tokens=False)
+    if len(ids) <= PREV_CONTEXT_TOKENS:
+        return text
+    # A cut inside a multi-byte character decodes to U+FFFD; drop it
+    return tokenizer.decode(ids[-PREV_CONTEXT_TOKENS:]).lstrip("\ufffd")
+
+def _apply_template(tokenizer, prompt: str) -> str:
+    """Render the model's chat template around a single user message."""
+    messages = [{"role": "user", "content": prompt}]
+    return tokenizer.apply_chat_template(
+        messages, tokenize=False, add_generation_prompt=True
+    )
+
+@lru_cache(maxsize=1)
+def _template_parts(tokenizer):
+    """
+    (prefix, suffix) the chat template puts around the user message, rendered
+    once with a placeholder. None if the model has no template, or if the
+    template transforms the content (then it must be rendered per prompt).
+    """
+    if not hasattr(tokenizer, "apply_chat_template") or tokenizer.chat_template is None:
+        return None
+    sentinel = "\x00"
+    rendered = _apply_template(tokenizer, sentinel)
+    if rendered.count(sentinel) != 1:
+        return None
+    prefix, suffix = rendered.split(sentinel)
+    probe = " probe\n<P1>x</P1> "
+    if _apply_template(tokenizer, probe) != prefix + probe + suffix:
+        return None
+    return prefix, suffix
+
+def _format_prompt(tokenizer, prompt: str) -> str:
+    """Wrap a prompt in the model's chat template (if it has one)."""
+    parts = _template_parts(tokenizer)
+    if parts is not None:
+        return parts[0] + prompt + parts[1]
+    if hasattr(tokenizer, "apply_chat_template") and tokenizer.chat_template is not None:
+        return _apply_template(tokenizer, prompt)
+    return prompt
+
+class PrefixCache:
+    """
+    KV cache pre-filled with the prompt prefix every chunk shares:
+    the chat-template head plus the glossary block (build_prompt always
+    starts with it). The prefix is tokenized once; each chunk only tokenizes
+    and prefills its own suffix. Afterwards the cache is trimmed back to the
+    prefix so chunks don't see each other.
+    """
+
+    def __init__(self, model, tokenizer, glossary_str: str):
+        sentinel = "\x00"
+        head = _format_prompt(tokenizer, sentinel).split(sentinel)[0]
+        # Stop before the glossary's trailing newline: the prompt continues
+        # with another one and tokenizers merge "\n\n", so cutting after the
+        # term keeps the split on a natural token boundary
+        self.text = head + glossary_str.rstrip("\n")
+        self.tokenizer = tokenizer
+        self.tokens = _encode(tokenizer, self.text)
+        self.cache = make_prompt_cache(model)
+        step = GEN_CONFIG["prefill_step_size"]
+        for i in range(0, len(self.tokens), step):
+            model(mx.array(self.tokens[i:i + step])[None], cache=self.cache)
+            mx.eval([c.state for c in self.cache])
+
+    @classmethod
+    def create(cls, model, tokenizer, glossary_str: str):
+        """Build the cache, or return None if this model's cache can't be trimmed."""
+        prefix_cache = cls(model, tokenizer, glossary_str)
+        return prefix_cache if can_trim_prompt_cache(prefix_cache.cache) else None
+
+    def suffix(self, prompt_formatted: str):
+        """Token ids of the prompt after the cached prefix, or None if it doesn't start with it."""
+        if len(prompt_formatted) > len(self.text) and prompt_formatted.startswith(self.text):
+            return self.tokenizer.encode(prompt_formatted[len(self.text):], add_special_tokens=False)
+        return None
+
+    def reset(self):
+        """Drop everything after the prefix."""
+        extra = self.cache[0].offset - len(self.tokens)
+        if extra > 0:
+            trim_prompt_cache(self.cache, extra)
+
+def translate_chunk_mlx(model, tokenizer, source_chunk: str, glossary_str: str, prev_translation: str = "", target_language: str = "繁體中文", prefix_cache: PrefixCache = None, keep_tags: bool = False, sampler=None) -> str:
     """Translate a single chunk using MLX model and HY-MT1.5 prompt logic."""
     
-    # 1. Build prompt
-    prompt = build_prompt(source_chunk, glossary, prev_translation, target_language=target_language)
+    # 1. Build prompt (prev_translation is already a _tail_context tail; keep all of it)
+    prompt = build_prompt(source_chunk, glossary_str, prev_translation, target_language=target_language, keep_tags=keep_tags, trim_context=False)
     
     # 2. Add 'user' role wrapper
-    if hasattr(tokenizer, "apply_chat_template") and tokenizer.chat_template is not None:
-        messages = [{"role": "user", "content": prompt}]
-        prompt_formatted = tokenizer.apply_chat_template(
-            messages, tokenize=False, add_generation_prompt=True
-        )
-    else:
-        prompt_formatted = prompt
+    prompt_formatted = _format_prompt(tokenizer, prompt)
 
-    # 3. Create Sampler
-    # We must explicitly create sampler for this version of mlx_lm
-    sampler = make_sampler(temp=GEN_CONFIG["temp"], top_p=GEN_CONFIG["top_p"])
+    # Reuse the pre-filled glossary prefix when the prompt starts with it
+    gen_prompt, gen_cache = prompt_formatted, None
+    if prefix_cache is not None:
+        suffix = prefix_cache.suffix(prompt_formatted)
+        if suffix is not None:
+            gen_prompt, gen_cache = suffix, prefix_cache.cache
+
+    # 3. Sampler (normally built once in main() and passed in)
+    if sampler is None:
+        sampler = make_sampler(temp=GEN_CONFIG["temp"], top_p=GEN_CONFIG["top_p"])
 
     # 4. Generate
-    response = generate(
-        model, 
-        tokenizer, 
-        prompt=prompt_formatted, 
-        sampler=sampler,
-        max_tokens=GEN_CONFIG["max_tokens"],
-        verbose=GEN_CONFIG["verbose"]
-    )
+    try:
+        response = generate(
+            model, 
+            tokenizer, 
+            prompt=gen_prompt, 
+            sampler=sampler,
+            max_tokens=GEN_CONFIG["max_tokens"],
+            verbose=GEN_CONFIG["verbose"],
+            prefill_step_size=_prefill_step_size(len(prompt_formatted)),
+            prompt_cache=gen_cache
+        )
+    finally:
+        if gen_cache is not None:
+            prefix_cache.reset()
     
     return response.strip()
 
-def main():
-    if len(sys.argv) < 2:
-        print(json.dumps({"error": "Usage: python translator_worker_mlx.py <input_json_path>"}))
-        sys.exit(1)
+# Source tokens per packed generate() call (see pack_paragraphs)
+PACK_TOKEN_BUDGET = 1024
+PACKED_PARA = re.compile(r"<P(\d+)>(.*?)</P\1>", re.DOTALL)
 
-    try:
-        input_path = sys.argv[1]
-        with open(input_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-
-        # 1. Parse Input
-        chapters = data.get("chapters", [])
-        book_title = data.get("book_title", "Untitled")
-        glossary = data.get("glossary", {})
-        model_id = data.get("model_id", DEFAULT_MLX_MODEL)
-        output_path = data.get("output_path", "translation_result.json")
-        target_lang_code = data.get("target_lang", "zh")
-        
-        # Map code to prompt language name (Official HY-MT1.5 uses Simplified Chinese names)
-        # Ref: Supported languages table in docs
-        lang_map = {
-            "zh": "繁体中文", # or 中文 if unspecified? Docs say 'Traditional Chinese' -> '繁体中文'
-            "zh-TW": "繁体中文",
-            "zh-CN": "中文",
-            "en": "英语",
-            "ja": "日语",
-            "ko": "韩语",
-            "fr": "法语",
-            "es": "西班牙语",
-            "ru": "俄语",
-            "de": "德语"
-        }
-        target_lang_name = lang_map.get(target_lang_code, "繁体中文")
-        
-        # 2. Load Model (MLX)
-        print(json.dumps({"status": "loading", "message": f"Loading MLX model {model_id}..."}), flush=True)
-        model, tokenizer = load(model_id)
+def _is_passthrough(para: str) -> bool:
+    """Very short content without letters (numbers/symbols) is kept as-is."""
+    return len(para) < 5 and not any(c.isalpha() for c in para)
 
-        # 3. Translate Title
-        print(json.dumps({"status": "translating", "message": f"Translating title: {book_title}..."}), flush=True)
-        trans_book_title = translate_chunk_mlx(model, tokenizer, book_title, glossary, prev_translation="", target_language=target_lang_name)
+def pack_paragraphs(paragraphs: list, tokenizer, budget: int = PACK_TOKEN_BUDGET) -> list:
+    """
+    Group consecutive paragraphs (as index lists) so each group's source
+    stays within budget tokens. A paragraph over budget gets its own group.
+    """
+    groups, current, used = [], [], 0
+    for idx, para in enumerate(paragraphs):
+        n = len(tokenizer.encode(para, add_special_tokens=False))
+        if current and used + n > budget:
+            groups.append(current)
+            current, used = [], 0
+        current.append(idx)
+        used += n
+    if current:
+        groups.append(current)
+    return groups
 
-        # 4. Translate Chapters with Sliding Window
-        translated_chapters = []
-        total_chapters = len(chapters)
-        
-        global_prev_translation = "" 
-
-        for i, chapter in enumerate(chapters):
-            title = chapter.get("title", "")
-            text = chapter.get("text", "")
-            
-            # Update Progress
-            print(json.dumps({
+def translate_packed_mlx(model, tokenizer, paragraphs: list, glossary_str: str, prev_translation: str = "", target_language: str = "繁體中文", prefix_cache: PrefixCache = None, sampler=None):
+    """
+    Translate several paragraphs in one generate() call, wrapped in numbered
+    <P#> tags. Returns one translation per paragraph, or None if the output
+    doesn't carry every tag back in order (caller falls back to 1:1).
+    """
+    source = "\n".join(f"<P{k}>{para}</P{k}>" for k, para in enumerate(paragraphs, 1))
+    response = translate_chunk_mlx(model, tokenizer, source, glossary_str, prev_translation=prev_translation, target_language=target_language, prefix_cache=prefix_cache, keep_tags=True, sampler=sampler)
+    found = PACKED_PARA.findall(response)
+    if [int(k) for k, _ in found] != list(range(1, len(paragraphs) + 1)):
+        return None
+    return [text.strip() for _, text in found]
+
+def _untrack(shm):
+    """
+    The parent owns every segment: stop this process' resource tracker from
+    unlinking it when the worker exits.
+    """
+    try:
+        resource_tracker.unregister(shm._name, "shared_memory")
+    except Exception:
+        pass
+
+def translate_job(data: dict, models: dict) -> dict:
+    """
+    Translate one book payload and return the result dict.
+    models caches the loaded (model, tokenizer) by model_id across jobs.
+    """
+    # 1. Parse Input
+    chapters = data.get("chapters", [])
+    book_title = data.get("book_title", "Untitled")
+    # The glossary block is the same in every prompt; format it once
+    glossary_str = build_glossary_string(data.get("glossary", {}))
+    model_id = data.get("model_id", DEFAULT_MLX_MODEL)
+    target_lang_code = data.get("target_lang", "zh")
+    
+    # Map code to prompt language name (Official HY-MT1.5 uses Simplified Chinese names)
+    # Ref: Supported languages table in docs
+    lang_map = {
+        "zh": "繁体中文", # or 中文 if unspecified? Docs say 'Traditional Chinese' -> '繁体中文'
+        "zh-TW": "繁体中文",
+        "zh-CN": "中文",
+        "en": "英语",
+        "ja": "日语",
+        "ko": "韩语",
+        "fr": "法语",
+        "es": "西班牙语",
+        "ru": "俄语",
+        "de": "德语"
+    }
+    target_lang_name = lang_map.get(target_lang_code, "繁体中文")
+    
+    # 2. Load Model (MLX) -- kept across jobs in serve mode
+    _emit({"status": "loading", "message": f"Loading MLX model {model_id}..."})
+    if model_id not in models:
+        models.clear()
+        prefetch_weights(model_id)
+        models[model_id] = load(model_id)
+    model, tokenizer = models[model_id]
+    # Encode the chat-template head + glossary once for the whole book
+    prefix_cache = PrefixCache.create(model, tokenizer, glossary_str)
+    # We must explicitly create sampler for this version of mlx_lm
+    sampler = make_sampler(temp=GEN_CONFIG["temp"], top_p=GEN_CONFIG["top_p"])
+    
+    # 3. Translate Title
+    _emit({"status": "translating", "message": f"Translating title: {book_title}..."})
+    trans_book_title = translate_chunk_mlx(model, tokenizer, book_title, glossary_str, prev_translation="", target_language=target_lang_name, prefix_cache=prefix_cache, sampler=sampler)
+    
+    # 4. Translate Chapters with Sliding Window
+    translated_chapters = []
+    total_chapters = len(chapters)
+    
+    global_prev_translation = "" 
+    
+    for i, chapter in enumerate(chapters):
+        title = chapter.get("title", "")
+        text = chapter.get("text", "")
+    
+        # Update Progress
+        _emit_progress({
+            "status": "progress", 
+            "message": f"Translating chapter {i+1}/{total_chapters}: {title}", 
+            "progress": int((i / total_chapters) * 100)
+        })
+    
+        # Translate Chapter Title (boilerplate headings skip the model)
+        trans_title = fast_translate_title(title, target_lang_code)
+        if trans_title is None:
+            trans_title = translate_chunk_mlx(model, tokenizer, title, glossary_str, prev_translation=global_prev_translation, target_language=target_lang_name, prefix_cache=prefix_cache, sampler=sampler)
+    
+        # Paragraph translation with BATCHING for speed
+        # Split by double newline (matches how EpubProcessor joined them)
+        paragraphs = [p.strip() for p in text.split("\n\n") if p.strip()]
+        translated_paragraphs = list(paragraphs)
+    
+        # Strict 1:1 paragraph mapping (required for EPUB replacement):
+        # consecutive paragraphs are packed into one <P#>-tagged prompt and
+        # split back; a group that doesn't come back intact is redone 1:1
+        chapter_char_count = len(text)
+        processed_chars = 0
+    
+        for group in pack_paragraphs(paragraphs, tokenizer):
+            # Skip very short content (likely numbers/whitespace) to save time,
+            # but MUST keep 1:1 mapping, so those keep their original text
+            todo = [idx for idx in group if not _is_passthrough(paragraphs[idx])]
+    
+            results = None
+            if len(todo) > 1:
+                results = translate_packed_mlx(model, tokenizer, [paragraphs[idx] for idx in todo], glossary_str, prev_translation=global_prev_translation, target_language=target_lang_name, prefix_cache=prefix_cache, sampler=sampler)
+                if results:
+                    global_prev_translation = _tail_context(tokenizer, results[-1])
+            if results is None:
+                results = []
+                for idx in todo:
+                    # Use global context from previous paragraph
+                    trans_para = translate_chunk_mlx(model, tokenizer, paragraphs[idx], glossary_str, prev_translation=global_prev_translation, target_language=target_lang_name, prefix_cache=prefix_cache, sampler=sampler)
+                    results.append(trans_para)
+    
+                    # Update context (keep the last PREV_CONTEXT_TOKENS tokens)
+                    global_prev_translation = _tail_context(tokenizer, trans_para)
+    
+            for idx, trans_para in zip(todo, results):
+                translated_paragraphs[idx] = trans_para
+    
+            processed_chars += sum(len(paragraphs[idx]) for idx in group)
+    
+            # Update Progress once per group (one or a few generate() calls)
+            current_chapter_percent = int((processed_chars / max(1, chapter_char_count)) * 100)
+            total_progress = int(((i + (processed_chars / max(1, chapter_char_count))) / total_chapters) * 100)
+    
+            _emit_progress({
                 "status": "progress", 
-                "message": f"Translating chapter {i+1}/{total_chapters}: {title}", 
-                "progress": int((i / total_chapters) * 100)
-            }), flush=True)
-
-            # Translate Chapter Title
-            trans_title = translate_chunk_mlx(model, tokenizer, title, glossary, prev_translation=global_prev_translation, target_language=target_lang_name)
-            
-            # Per-paragraph translation with BATCHING for speed
-            # Split by double newline (matches how EpubProcessor joined them)
-            paragraphs = [p.strip() for p in text.split("\n\n") if p.strip()]
-            translated_paragraphs = []
-            
-            # Strict 1:1 Paragraph Translation (No Batching)
-            # This ensures structure preservation for EPUB replacement
-            chapter_char_count = len(text)
-            processed_chars = 0
-            
-            for p_idx, para in enumerate(paragraphs):
-                para_len = len(para)
-                
-                # Skip very short content (likely numbers/whitespace) to save time,
-                # but MUST keep 1:1 mapping, so append original or translation
-                if para_len < 5 and not any(c.isalpha() for c in para):
-                     # Just numbers/symbols -> keep original
-                     translated_paragraphs.append(para)
-                else:
-                     # Translate
-                     # Use global context from previous paragraph
-                     trans_para = translate_chunk_mlx(model, tokenizer, para, glossary, prev_translation=global_prev_translation, target_language=target_lang_name)
-                     translated_paragraphs.append(trans_para)
-                     
-                     # Update context (keep last 200 chars)
-                     global_prev_translation = trans_para[-200:] if len(trans_para) > 200 else trans_para
-
-                processed_chars += para_len
-                
-                # Update Progress every ~5% or every 10 paragraphs to avoid log spam
-                if p_idx % 10 == 0 or p_idx == len(paragraphs) - 1:
-                    current_chapter_percent = int((processed_chars / max(1, chapter_char_count)) * 100)
-                    total_progress = int(((i + (processed_chars / max(1, chapter_char_count))) / total_chapters) * 100)
-                    
-                    print(json.dumps({
-                        "status": "progress", 
-                        "message": f"Translating chapter {i+1}/{total_chapters}: {title} ({current_chapter_percent}%)", 
-                        "progress": total_progress
-                    }), flush=True)
-
-            full_chapter_text = "\n\n".join(translated_paragraphs)
-            
-            translated_chapters.append({
-                "title": trans_title,
-                "text": full_chapter_text
+                "message": f"Translating chapter {i+1}/{total_chapters}: {title} ({current_chapter_percent}%)", 
+                "progress": total_progress
             })
+    
+        full_chapter_text = "\n\n".join(translated_paragraphs)
+    
+        translated_chapters.append({
+            "title": trans_title,
+            "text": full_chapter_text
+        })
+    
+    # 5. Save Result
+    result = {
+        "book_title": book_title,
+        "trans_book_title": trans_book_title,
+        "chapters": translated_chapters
+    }
+    return result
 
-        # 5. Save Result
-        result = {
-            "book_title": book_title,
-            "trans_book_title": trans_book_title,
-            "chapters": translated_chapters
-        }
+def _read_shm(name: str, size: int) -> dict:
+    """Load a JSON payload handed over in shared memory by MLXTranslator."""
+    input_shm = shared_memory.SharedMemory(name=name)
+    _untrack(input_shm)
+    try:
+        return _loads(bytes(input_shm.buf[:size]))
+    finally:
+        input_shm.close()
+
+def _write_shm(result: dict, name: str = None) -> dict:
+    """Put the result in a new segment (named by the parent); the parent reads and unlinks it."""
+    payload = _dumpb(result)
+    output_shm = shared_memory.SharedMemory(name=name, create=True, size=max(1, len(payload)))
+    output_shm.buf[:len(payload)] = payload
+    _untrack(output_shm)
+    output_shm.close()
+    return {"status": "completed", "output_shm": output_shm.name, "size": len(payload)}
+
+def serve():
+    """
+    Persistent mode (--serve): handle jobs until stdin closes or a quit command.
+    Requests arrive on stdin as <4-byte little-endian length><JSON> frames,
+    {"cmd": "translate", "shm": name, "size": n, "output_shm": name} or
+    {"cmd": "quit"}; each job
+    ends with a "completed" or "error" status frame. The model stays loaded.
+    """
+    import traceback
+    models = {}
+    stdin = sys.stdin.buffer
+    _emit({"status": "ready"})
+    while True:
+        header = stdin.read(4)
+        if len(header) < 4:
+            break
+        (size,) = struct.unpack("<I", header)
+        request = _loads(stdin.read(size))
+        if request.get("cmd") == "quit":
+            break
+        try:
+            result = translate_job(_read_shm(request["shm"], request["size"]), models)
+            _emit(_write_shm(result, request.get("output_shm")))
+        except Exception as e:
+            _emit({"status": "error", "error": str(e), "traceback": traceback.format_exc()})
+
+def main():
+    if len(sys.argv) >= 2 and sys.argv[1] == "--serve":
+        serve()
+        return
+
+    use_shm = len(sys.argv) >= 4 and sys.argv[1] == "--shm"
+    if len(sys.argv) < 2 or (sys.argv[1] == "--shm" and not use_shm):
+        print(_dumps({"error": "Usage: python translator_worker_mlx.py <input_json_path> | --shm <name> <size> [<output_name>] | --serve"}))
+        sys.exit(1)
+
+    try:
+        if use_shm:
+            # Payload handed over in shared memory by MLXTranslator
+            data = _read_shm(sys.argv[2], int(sys.argv[3]))
+        else:
+            input_path = sys.argv[1]
+            with open(input_path, 'rb') as f:
+                data = _loads(f.read())
+
+        output_path = data.get("output_path", "translation_result.json")
+        result = translate_job(data, {})
         
-        with open(output_path, 'w', encoding='utf-8') as f:
-            json.dump(result, f, ensure_ascii=False, indent=2)
+        if use_shm:
+            _emit(_write_shm(result, sys.argv[4] if len(sys.argv) >= 5 else None))
+        else:
+            with open(output_path, 'wb') as f:
+                f.write(_dumpb(result))
 
-        print(json.dumps({"status": "completed", "output_path": output_path}), flush=True)
+            _emit({"status": "completed", "output_path": output_path})
 
     except Exception as e:
         import traceback
         error_msg = str(e)
         tb = traceback.format_exc()
-        print(json.dumps({"status": "error", "error": error_msg, "traceback": tb}), flush=True)
+        _emit({"status": "error", "error": error_msg, "traceback": tb})
         sys.exit(1)
 
 if __name__ == "__main__":
@@ -14,18 +14,51 @@ Key v0.3.0 improvements:
 - Fixed seed for consistent voice tone
 - ffmpeg-based audio merging (AudioMerger)
 """
+import atexit
 import os
 import subprocess
 import gc
+import hashlib
+import logging
 import json
 import tempfile
+import time
 import numpy as np
 import soundfile as sf
 import re
+import shutil
 import sys
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
 from core.text_slicer import TextSlicer
-from core.audio_merger import AudioMerger
+from core.audio_merger import AudioMerger, FFMPEG_BIN
+
+logger = logging.getLogger(__name__)
+# Worker command lines and per-line worker output are debug logs; set
+# EBOOKTOOLS_DEBUG=1 to print them (errors always include the output tail)
+if os.environ.get("EBOOKTOOLS_DEBUG"):
+    logger.setLevel(logging.DEBUG)
+    logger.addHandler(logging.StreamHandler())
+
+# torch is optional in the main venv; looked up once (False = not installed)
+_torch = None
+
+
+def _get_torch():
+    global _torch
+    if _torch is None:
+        try:
+            import torch
+            _torch = torch
+        except ImportError:
+            _torch = False  # torch not available in main venv, that's fine
+    return _torch or None
+
+
+# Worker scripts are addressed relative to the repo root (e.g. core/tts_qwen3.py)
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
 
 class SubprocessTTSEngine:
@@ -38,7 +71,12 @@ class SubprocessTTSEngine:
         "qwen3": {
             "python": "./venv_qwen3/bin/python",
             "script": "core/tts_qwen3.py",
-            "model_id": "mlx-community/Qwen3-TTS-12Hz-1.7B-Base-bf16",
+            # 4-bit weights (~1 GB vs 3.4 GB bf16): decode is memory-bandwidth
+            # bound, so this roughly doubles speed. Set EBOOKTOOLS_QWEN3_MODEL
+            # to e.g. mlx-community/Qwen3-TTS-12Hz-1.7B-Base-bf16 (or -6bit)
+            # if the quantized voice quality isn't good enough
+            "model_id": os.environ.get("EBOOKTOOLS_QWEN3_MODEL",
+                                       "mlx-community/Qwen3-TTS-12Hz-1.7B-Base-4bit"),
             "max_chars": 500,  # Qwen3 handles longer sequences
         },
         "cosyvoice3": {
@@ -55,27 +93,84 @@ class SubprocessTTSEngine:
     # GC interval: run garbage collection every N chunks
     GC_INTERVAL = 10
 
+    # Chunk subprocesses run concurrently in generate_chapter; each one loads
+    # its own model, so the cap is min(tts_concurrency, cpu_count // 2, 3)
+    TTS_CONCURRENCY = 2
+    MAX_TTS_CONCURRENCY = 3
+
+    # Chunks go to long-lived `--serve` workers (model loaded once);
+    # set this env var to spawn one process per chunk instead
+    ONESHOT_ENV = "EBOOKTOOLS_TTS_ONESHOT"
+    # Per-chunk timeout adapts to recent chunk wall times: 4x their EMA, at
+    # least MIN_CHUNK_TIMEOUT. CHUNK_TIMEOUT applies before any chunk has
+    # finished and when a new worker has to load the model first.
+    CHUNK_TIMEOUT = 300  # seconds
+    MIN_CHUNK_TIMEOUT = 30
+    LOG_TAIL_LINES = 200  # worker output lines kept for error reports
+    # One-shot workers print their final JSON result after this marker, so
+    # the parent parses one line instead of every line of log output
+    RESULT_PREFIX = "##RESULT##"
+    # Params shared by every chunk of a chapter. A persistent worker gets them
+    # once in an {"init": ...} line; chunk requests then carry only the rest
+    WORKER_INIT_KEYS = ("ref_audio", "ref_text", "model_id", "seed")
+
+    # Content-addressed cache of generated chunk WAVs and reference-audio
+    # transcripts, shared across chapters, chunk dirs and runs. Set
+    # EBOOKTOOLS_TTS_CACHE to move it, or to an empty string to disable it.
+    CACHE_DIR = os.environ.get(
+        "EBOOKTOOLS_TTS_CACHE",
+        os.path.join(os.path.expanduser("~"), ".cache", "ebooktools", "tts"))
+
+    # Reference audio is converted once per chapter to mono 16-bit PCM at
+    # the models' output rate, so chunk workers don't each decode/resample it
+    REF_SAMPLE_RATE = 24000
+
+    # Fade-in/out at chunk edges in generate_stream (2 ms @ 24 kHz) to avoid clicks
+    FADE_SAMPLES = 48
+
+    # Resolved interpreter per configured venv path (venvs don't move at runtime)
+    _python_executables = {}
+
     def _get_python_executable(self, config_python):
         """
         Resolve python executable.
         If the configured path exists, use it.
         Otherwise, fallback to the current sys.executable (for portable/single-venv mode).
+        The result is cached, so this stats the venv once per process.
         """
-        if os.path.exists(config_python):
-            return config_python
-
-        # Fallback to current python (assuming running in a venv that has dependencies)
-        return sys.executable
+        python_exec = self._python_executables.get(config_python)
+        if python_exec is None:
+            if os.path.exists(config_python):
+                python_exec = config_python
+            else:
+                # Fallback to current python (assuming running in a venv that has dependencies)
+                python_exec = sys.executable
+            self._python_executables[config_python] = python_exec
+        return python_exec
 
     def __init__(self, model_type="qwen3"):
         self.model_type = model_type
+        self.tts_concurrency = self.TTS_CONCURRENCY
         self._transcription_cache = {}
+        self._transcribe_env = None  # env whose transcribe.py last succeeded
+        self._file_digests = {}     # (path, mtime_ns, size) -> blake2b hex digest
+        self._cache_verified = set()  # cache keys already checked this session
+        self._ref_audio = {}        # reference audio path -> canonical WAV path
+        # Idle persistent workers keyed by (python, script)
+        self._workers = {}
+        self._workers_lock = threading.Lock()
+        self._worker_init = {}      # worker Popen -> init params it holds
+        self._chunk_time_ema = None  # seconds, see _chunk_timeout
+        atexit.register(self.close)
 
     def set_model_type(self, model_type):
         """Switch model type. Memory is automatically released since we use subprocess."""
         print(f"TRACE: set_model_type called with {model_type}", flush=True)
         if model_type not in self.MODELS:
             raise ValueError(f"Unknown model type: {model_type}. Available: {list(self.MODELS.keys())}")
+        if model_type != self.model_type:
+            self.close()  # release the previous model's workers
+            self._chunk_time_ema = None  # chunk times differ per model
         self.model_type = model_type
         print(f"Model type set to: {model_type}", flush=True)
 
@@ -90,22 +185,38 @@ class SubprocessTTSEngine:
         if not audio_path or not os.path.exists(audio_path):
             return ""
 
-        # Check cache
-        if audio_path in self._transcription_cache:
+        # Check cache (keyed on the audio content, so renamed copies hit too)
+        digest = self._file_digest(audio_path)
+        if digest in self._transcription_cache:
             print(f"Using cached transcription for: {audio_path}")
-            return self._transcription_cache[audio_path]
+            return self._transcription_cache[digest]
+        transcript_path = self._cache_path(digest, ".txt")
+        if transcript_path and os.path.exists(transcript_path):
+            with open(transcript_path, encoding="utf-8") as f:
+                text = f.read()
+            if text:
+                print(f"Using cached transcription for: {audio_path}")
+                self._transcription_cache[digest] = text
+                return text
 
         print(f"Transcribing reference audio: {audio_path}")
 
-        # Try each environment in order (cosyvoice3 first, then qwen3)
+        # Try each environment in order (cosyvoice3 first, then qwen3), starting
+        # with the one that last succeeded; envs that resolve to the same
+        # interpreter (single-venv installs) are only tried once
         envs_to_try = ["cosyvoice3", "qwen3"]
+        if self._transcribe_env in envs_to_try:
+            envs_to_try.remove(self._transcribe_env)
+            envs_to_try.insert(0, self._transcribe_env)
+        tried = set()
         
         for env_name in envs_to_try:
             config = self.MODELS[env_name]
             python_exec = self._get_python_executable(config["python"])
             
-            if not os.path.exists(python_exec):
+            if python_exec in tried:
                 continue
+            tried.add(python_exec)
                 
             cmd = [python_exec, "core/transcribe.py", json.dumps({"audio_path": audio_path})]
 
@@ -114,14 +225,14 @@ class SubprocessTTSEngine:
                 env = os.environ.copy()
                 env["PYTHONUNBUFFERED"] = "1"
                 
-                print(f"DEBUG: Transcribing with command: {' '.join(cmd)}")
+                logger.debug("Transcribing with command: %s", " ".join(cmd))
                 
                 result = subprocess.run(
                     cmd,
                     capture_output=True,
                     text=True,
                     timeout=120,  # 2 minute timeout for transcription
-                    cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                    cwd=REPO_ROOT,
                     env=env
                 )
                 
@@ -134,20 +245,19 @@ class SubprocessTTSEngine:
                     print(f"  Transcription failed with {env_name}: {result.stderr[:200]}", file=sys.stderr)
                     continue
 
-                for line in result.stdout.strip().split('\n'):
-                    if line:
-                        try:
-                            data = json.loads(line)
-                            if data.get("status") == "completed":
-                                text = data.get("text", "")
-                                if text:
-                                    self._transcription_cache[audio_path] = text
-                                    print(f"  Transcription successful via {env_name}: {text[:50]}...")
-                                    return text
-                            elif data.get("status") == "error":
-                                print(f"  Transcription error in {env_name}: {data.get('error', '')[:200]}", file=sys.stderr)
-                        except json.JSONDecodeError:
-                            pass
+                data = self._parse_result(result.stdout)
+                if data is None:
+                    continue
+                if data.get("status") == "completed":
+                    text = data.get("text", "")
+                    if text:
+                        self._transcription_cache[digest] = text
+                        self._transcribe_env = env_name
+                        self._cache_store_bytes(transcript_path, text.encode("utf-8"))
+                        print(f"  Transcription successful via {env_name}: {text[:50]}...")
+                        return text
+                elif data.get("status") == "error":
+                    print(f"  Transcription error in {env_name}: {data.get('error', '')[:200]}", file=sys.stderr)
                             
             except subprocess.TimeoutExpired:
                 print(f"  Transcription timed out with {env_name}", file=sys.stderr)
@@ -157,6 +267,44 @@ class SubprocessTTSEngine:
         print("WARNING: All transcription attempts failed. Voice cloning may not work.", file=sys.stderr)
         return ""
 
+    def prepare_ref_audio(self, audio_path):
+        """
+        Return a mono 16-bit REF_SAMPLE_RATE WAV of audio_path, converting it
+        with ffmpeg once (cached by content). Already-canonical files and
+        failed conversions return audio_path unchanged.
+        """
+        if not audio_path or not os.path.exists(audio_path):
+            return audio_path
+        digest = self._file_digest(audio_path)
+        if digest in self._ref_audio:
+            return self._ref_audio[digest]
+
+        canonical = audio_path
+        try:
+            info = sf.info(audio_path)
+            if (info.samplerate, info.channels, info.subtype) != (self.REF_SAMPLE_RATE, 1, "PCM_16"):
+                out_dir = self.CACHE_DIR or tempfile.gettempdir()
+                os.makedirs(out_dir, exist_ok=True)
+                out_path = os.path.join(out_dir, f"ref_{digest}_{self.REF_SAMPLE_RATE}.wav")
+                if not os.path.exists(out_path):
+                    tmp_path = f"{out_path}.{os.getpid()}.tmp.wav"
+                    subprocess.run(
+                        [FFMPEG_BIN, "-y", "-loglevel", "error", "-i", audio_path,
+                         "-ac", "1", "-ar", str(self.REF_SAMPLE_RATE),
+                         "-c:a", "pcm_s16le", tmp_path],
+                        check=True, capture_output=True, stdin=subprocess.DEVNULL,
+                        timeout=120
+                    )
+                    os.replace(tmp_path, out_path)
+                print(f"Reference audio converted: {info.samplerate} Hz/"
+                      f"{info.channels}ch/{info.subtype} -> {out_path}")
+                canonical = out_path
+        except Exception as e:
+            print(f"WARNING: could not convert reference audio, using it as is: {e}",
+                  file=sys.stderr)
+        self._ref_audio[digest] = canonical
+        return canonical
+
     def _run_gc(self, chunk_index: int):
         """
         M4 optimization: Run garbage collection and clear MPS cache
@@ -164,101 +312,397 @@ class SubprocessTTSEngine:
         """
         if chunk_index > 0 and chunk_index % self.GC_INTERVAL == 0:
             print(f"Running GC at chunk {chunk_index} (M4 memory optimization)...")
-            gc.collect()
-            try:
-                import torch
-                if hasattr(torch, 'mps') and hasattr(torch.mps, 'empty_cache'):
-                    torch.mps.empty_cache()
-                    print("Cleared MPS cache.")
-            except ImportError:
-                pass  # torch not available in main venv, that's fine
+            # Young generations only: per-chunk churn dies young, and a full
+            # collection would rescan every long-lived object each time
+            gc.collect(1)
+            torch = _get_torch()
+            if torch is not None and hasattr(torch, 'mps') and hasattr(torch.mps, 'empty_cache'):
+                torch.mps.empty_cache()
+                print("Cleared MPS cache.")
 
     def generate_audio_chunk(self, text, ref_audio_path=None, output_path=None,
                              ref_text=None, seed=None):
         """
-        Generate audio for a single chunk of text using subprocess.
+        Generate audio for a single chunk of text using subprocess
+        (a persistent worker unless ONESHOT_ENV is set).
         Returns the path to the generated audio file.
         """
         config = self.MODELS[self.model_type]
 
         if output_path is None:
-            output_path = tempfile.mktemp(suffix=".wav")
+            with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as f:
+                output_path = f.name
 
-        params = {
-            "text": text,
-            "ref_audio": ref_audio_path,
-            "ref_text": ref_text,
-            "output_path": output_path,
-            "model_id": config["model_id"],
-            "seed": seed if seed is not None else self.DEFAULT_SEED,
-        }
+        params = self._chunk_params(text, ref_audio_path, ref_text, seed)
+        params["output_path"] = output_path
+
+        cached = self._cached_chunk(params)
+        if cached:
+            shutil.copyfile(cached, output_path)
+            print(f"  Chunk cache hit: {os.path.basename(cached)}")
+            return output_path
 
         python_exec = self._get_python_executable(config["python"])
+        if not os.environ.get(self.ONESHOT_ENV):
+            self._generate_persistent(python_exec, config["script"], params)
+            self._cache_chunk(params, output_path)
+            return output_path
+
         cmd = [python_exec, config["script"], json.dumps(params)]
 
         # Force unbuffered IO for subprocess to avoid hangs
         env = os.environ.copy()
         env["PYTHONUNBUFFERED"] = "1"
 
+        logger.debug("Executing subprocess: %s", " ".join(cmd))
+        proc = subprocess.Popen(
+            cmd,
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+            text=True, bufsize=1,
+            cwd=REPO_ROOT,
+            env=env
+        )
+
+        # Only the tail of the worker's output is kept for error reports
+        stdout_tail = deque(maxlen=self.LOG_TAIL_LINES)
+        stderr_tail = deque(maxlen=self.LOG_TAIL_LINES)
+        stderr_reader = threading.Thread(target=stderr_tail.extend, args=(proc.stderr,), daemon=True)
+        stderr_reader.start()
+
+        timed_out = threading.Event()
+
+        def on_timeout():
+            timed_out.set()
+            proc.kill()
+
+        timer = threading.Timer(self._chunk_timeout(), on_timeout)
+        t0 = time.monotonic()
+        timer.start()
+        error = None
         try:
-            print(f"DEBUG: Executing subprocess: {' '.join(cmd)}")
-            result = subprocess.run(
-                cmd,
-                capture_output=True,
-                text=True,
-                timeout=300,  # 5 minute timeout per chunk
-                cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
-                env=env
-            )
-
-            # DEBUG: Print stderr/stdout to server log
-            print(f"--- Subprocess Output ({config['script']}) ---")
-            print(result.stdout)
-            print("--- Subprocess Stderr ---")
-            print(result.stderr)
-            print("---------------------------------------------")
-
-            # Parse output lines for status updates
-            for line in result.stdout.strip().split('\n'):
-                if line:
-                    try:
-                        status = json.loads(line)
-                        if isinstance(status, dict):
-                            if status.get("status") == "error":
-                                raise Exception(status.get("error", "Unknown error"))
-                    except json.JSONDecodeError:
-                        pass  # Non-JSON output, ignore
-
-            if result.returncode != 0:
-                raise Exception(f"Subprocess failed: {result.stderr}")
-
-            if os.path.exists(output_path):
-                # Verify file integrity
+            # Everything but the RESULT_PREFIX line is opaque log text; an
+            # error result stops the worker instead of waiting for it to exit
+            for line in proc.stdout:
+                stdout_tail.append(line)
+                logger.debug("  [%s] %s", config["script"], line.rstrip())
+                if self.RESULT_PREFIX not in line:
+                    continue
+                status = self._parse_result(line)
+                if status is not None and status.get("status") == "error":
+                    error = status.get("error", "Unknown error")
+                    proc.kill()
+                    break
+            proc.wait()
+        finally:
+            timer.cancel()
+            if proc.poll() is None:
+                proc.kill()
+                proc.wait()
+            stderr_reader.join(timeout=5)
+
+        logs = f"Stdout: {''.join(stdout_tail)}\nStderr: {''.join(stderr_tail)}"
+        if error is not None:
+            print(logs, file=sys.stderr)
+            raise Exception(error)
+        if timed_out.is_set():
+            raise Exception("Audio generation timed out")
+        if proc.returncode != 0:
+            raise Exception(f"Subprocess failed: {''.join(stderr_tail)}")
+
+        self._verify_output(output_path, logs)
+        self._record_chunk_time(time.monotonic() - t0)
+        self._cache_chunk(params, output_path)
+        return output_path
+
+    def generate_audio_array(self, text, ref_audio_path=None, ref_text=None, seed=None):
+        """
+        Generate audio for a single chunk and return (samples, sample_rate)
+        as int16 PCM. A persistent worker sends the samples over its stdout
+        pipe, so no WAV file is written or read back.
+        """
+        config = self.MODELS[self.model_type]
+        python_exec = self._get_python_executable(config["python"])
+
+        cached = self._cached_chunk(self._chunk_params(text, ref_audio_path, ref_text, seed))
+        if cached:
+            return sf.read(cached, dtype='int16')
+
+        if os.environ.get(self.ONESHOT_ENV):
+            with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as f:
+                temp_path = f.name
+            try:
+                self.generate_audio_chunk(text, ref_audio_path, temp_path,
+                                          ref_text=ref_text, seed=seed)
+                return sf.read(temp_path, dtype='int16')
+            finally:
                 try:
-                    if os.path.getsize(output_path) < 100:
-                        raise Exception(f"Output file too small: {os.path.getsize(output_path)} bytes")
-                    # Try opening with soundfile
-                    sf.info(output_path)
-                    return output_path
-                except Exception as e:
-                    # Log subprocess output for debugging
-                    logs = f"Stdout: {result.stdout}\nStderr: {result.stderr}"
-                    print(logs, file=sys.stderr)
-                    raise Exception(f"Generated file corrupted: {e}\nWorker Logs:\n{logs}")
-            else:
-                raise Exception(f"Output file not created: {output_path}")
+                    os.remove(temp_path)
+                except OSError:
+                    pass
 
-        except subprocess.TimeoutExpired:
-            raise Exception("Audio generation timed out")
+        params = self._chunk_params(text, ref_audio_path, ref_text, seed)
+        params["return_audio"] = True
+        reply, payload = self._worker_request(python_exec, config["script"], params)
+        if reply["status"] == "error":
+            raise Exception(reply.get("error", "Unknown error"))
+        audio = np.frombuffer(payload, dtype=reply["dtype"]).reshape(reply["shape"])
+        # frombuffer views are read-only; callers may modify the samples
+        return audio.copy(), reply["sr"]
+
+    def _chunk_params(self, text, ref_audio_path, ref_text, seed):
+        return {
+            "text": text,
+            "ref_audio": ref_audio_path,
+            "ref_text": ref_text,
+            "model_id": self.MODELS[self.model_type]["model_id"],
+            "seed": seed if seed is not None else self.DEFAULT_SEED,
+        }
+
+    def _file_digest(self, path):
+        """
+        128-bit BLAKE2b of a file's content, memoized on (path, mtime, size).
+        BLAKE2b hashes faster than SHA-256 on 64-bit CPUs and 128 bits is
+        plenty for cache keys.
+        """
+        st = os.stat(path)
+        memo_key = (path, st.st_mtime_ns, st.st_size)
+        digest = self._file_digests.get(memo_key)
+        if digest is None:
+            h = hashlib.blake2b(digest_size=16)
+            with open(path, "rb") as f:
+                for block in iter(lambda: f.read(1 << 20), b""):
+                    h.update(block)
+            digest = self._file_digests[memo_key] = h.hexdigest()
+        return digest
+
+    def _cache_path(self, key, ext):
+        if not self.CACHE_DIR:
+            return None
+        return os.path.join(self.CACHE_DIR, key + ext)
+
+    def _chunk_cache_key(self, params):
+        """Everything that determines a chunk's audio: model, seed, voice, text."""
+        ref_audio = params.get("ref_audio")
+        ref_digest = self._file_digest(ref_audio) if ref_audio and os.path.exists(ref_audio) else ""
+        parts = [params["model_id"], str(params["seed"]), ref_digest,
+                 params.get("ref_text") or "", params["text"]]
+        return hashlib.blake2b("\x00".join(parts).encode("utf-8"), digest_size=16).hexdigest()
+
+    def _cached_chunk(self, params):
+        """Path of a valid cached WAV for this chunk, or None."""
+        if not self.CACHE_DIR:
+            return None
+        key = self._chunk_cache_key(params)
+        path = self._cache_path(key, ".wav")
+        if key in self._cache_verified:
+            return path if os.path.exists(path) else None
+        if not os.path.exists(path):
+            return None
+        try:
+            self._verify_output(path)
+        except Exception:
+            return None
+        self._cache_verified.add(key)
+        return path
+
+    def _cache_chunk(self, params, output_path):
+        """Publish a freshly generated chunk WAV to the cache."""
+        if not self.CACHE_DIR:
+            return
+        key = self._chunk_cache_key(params)
+        path = self._cache_path(key, ".wav")
+        try:
+            os.makedirs(self.CACHE_DIR, exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            shutil.copyfile(output_path, tmp_path)
+            # Atomic publish: concurrent runs never see a partial file
+            os.replace(tmp_path, path)
+            self._cache_verified.add(key)
+        except OSError as e:
+            print(f"WARNING: could not cache chunk: {e}", file=sys.stderr)
+
+    def _cache_store_bytes(self, path, data):
+        if not path:
+            return
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"WARNING: could not cache transcription: {e}", file=sys.stderr)
+
+    @classmethod
+    def _parse_result(cls, output):
+        """
+        Return the JSON result a one-shot worker printed after RESULT_PREFIX
+        (the last one in output), or None if there is none.
+        """
+        idx = output.rfind(cls.RESULT_PREFIX)
+        if idx < 0:
+            return None
+        try:
+            result = json.loads(output[idx + len(cls.RESULT_PREFIX):])
+        except json.JSONDecodeError:
+            return None
+        return result if isinstance(result, dict) else None
+
+    @staticmethod
+    def _is_wav(path):
+        """True if path starts with a RIFF/WAVE header."""
+        try:
+            with open(path, "rb") as f:
+                header = f.read(12)
+        except OSError:
+            return False
+        return header[:4] == b"RIFF" and header[8:12] == b"WAVE"
+
+    @staticmethod
+    def _verify_output(output_path, logs=""):
+        """Check that the worker wrote a readable WAV; returns its path."""
+        if not os.path.exists(output_path):
+            raise Exception(f"Output file not created: {output_path}")
+        # Verify file integrity: size plus the RIFF/WAVE magic, which is all a
+        # full sf.info header parse would add for a file the worker just wrote
+        try:
+            if os.path.getsize(output_path) < 100:
+                raise Exception(f"Output file too small: {os.path.getsize(output_path)} bytes")
+            if not SubprocessTTSEngine._is_wav(output_path):
+                raise Exception("Not a WAV file")
+            return output_path
+        except Exception as e:
+            # Log subprocess output for debugging
+            print(logs, file=sys.stderr)
+            raise Exception(f"Generated file corrupted: {e}\nWorker Logs:\n{logs}")
+
+    def _acquire_worker(self, python_exec, script):
+        """
+        Take an idle `--serve` worker, or start one (its logs go to our stderr).
+        Returns (proc, started): started is True for a new worker.
+        """
+        key = (python_exec, script)
+        with self._workers_lock:
+            idle = self._workers.setdefault(key, [])
+            while idle:
+                proc = idle.pop()
+                if proc.poll() is None:
+                    return proc, False
+        env = os.environ.copy()
+        env["PYTHONUNBUFFERED"] = "1"
+        print(f"Starting TTS worker: {python_exec} {script} --serve")
+        proc = subprocess.Popen(
+            [python_exec, script, "--serve"],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+            cwd=REPO_ROOT,
+            env=env
+        )
+        return proc, True
+
+    def _worker_request(self, python_exec, script, params):
+        """
+        Send one request to a persistent worker. Returns (reply, payload):
+        the completed/error/audio JSON line and, for "audio", its raw bytes.
+        """
+        proc, started = self._acquire_worker(python_exec, script)
+        timed_out = threading.Event()
+
+        def on_timeout():
+            timed_out.set()
+            proc.kill()
+
+        # A new worker loads the model before answering
+        timeout = self.CHUNK_TIMEOUT if started else self._chunk_timeout()
+        timer = threading.Timer(timeout, on_timeout)
+        t0 = time.monotonic()
+        timer.start()
+        reply = None
+        payload = b""
+        init = {k: params[k] for k in self.WORKER_INIT_KEYS if k in params}
+        request = {k: v for k, v in params.items() if k not in init}
+        try:
+            data = json.dumps(request).encode() + b"\n"
+            if self._worker_init.get(proc) != init:
+                data = json.dumps({"init": init}).encode() + b"\n" + data
+                self._worker_init[proc] = init
+            proc.stdin.write(data)
+            proc.stdin.flush()
+            for line in proc.stdout:
+                try:
+                    status = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if not isinstance(status, dict):
+                    continue
+                if status.get("status") == "audio":
+                    payload = proc.stdout.read(status["nbytes"])
+                    if len(payload) == status["nbytes"]:
+                        reply = status
+                    break
+                if status.get("status") in ("completed", "error"):
+                    reply = status
+                    break
+        except OSError:
+            pass  # worker died; reported below
+        finally:
+            timer.cancel()
+            if reply is None:
+                self._worker_init.pop(proc, None)
+                proc.kill()
+                proc.wait()
+            else:
+                with self._workers_lock:
+                    self._workers.setdefault((python_exec, script), []).append(proc)
+
+        if reply is None:
+            if timed_out.is_set():
+                raise Exception("Audio generation timed out")
+            raise Exception(f"TTS worker exited unexpectedly (code {proc.returncode})")
+        if not started and reply["status"] != "error":
+            self._record_chunk_time(time.monotonic() - t0)
+        return reply, payload
+
+    def _chunk_timeout(self):
+        """Timeout for the next chunk, from the EMA of recent chunk wall times."""
+        ema = self._chunk_time_ema
+        if ema is None:
+            return self.CHUNK_TIMEOUT
+        return max(self.MIN_CHUNK_TIMEOUT, 4 * ema)
+
+    def _record_chunk_time(self, seconds):
+        ema = self._chunk_time_ema
+        self._chunk_time_ema = seconds if ema is None else 0.5 * ema + 0.5 * seconds
+
+    def _generate_persistent(self, python_exec, script, params):
+        """Run one chunk on a persistent worker: a JSON line in, a JSON line out."""
+        reply, _ = self._worker_request(python_exec, script, params)
+        if reply["status"] == "error":
+            raise Exception(reply.get("error", "Unknown error"))
+        return self._verify_output(params["output_path"])
+
+    def close(self):
+        """Stop all idle persistent workers."""
+        with self._workers_lock:
+            procs = [p for idle in self._workers.values() for p in idle]
+            self._workers.clear()
+        for proc in procs:
+            self._worker_init.pop(proc, None)
+            try:
+                proc.stdin.close()  # EOF ends the worker's serve loop
+                proc.wait(timeout=5)
+            except Exception:
+                proc.kill()
 
     def generate_chapter(self, text, ref_audio_path=None,
-                         chunk_dir=None, progress_callback=None):
+                         chunk_dir=None, progress_callback=None,
+                         chunk_callback=None):
         """
         Generate audio for an entire chapter with fault tolerance.
 
         This is the new primary generation method that:
         - Uses TextSlicer for smart splitting
         - Saves each chunk as chunk_XXXX.wav for crash-resume
+        - Records finished chunks in chunk_dir/manifest.jsonl
         - Skips already-generated chunks (fault tolerance)
         - Runs GC/MPS cleanup periodically
 
@@ -267,6 +711,8 @@ class SubprocessTTSEngine:
             ref_audio_path: Optional reference audio for voice cloning
             chunk_dir: Directory to save chunk WAVs (created if needed)
             progress_callback: Optional callable(chunk_idx, total_chunks, chunk_text)
+            chunk_callback: Optional callable(chunk_idx, chunk_path), called in order
+                for each newly generated chunk (not for chunks skipped on resume)
 
         Returns:
             chunk_dir path containing all generated chunk_XXXX.wav files
@@ -286,6 +732,7 @@ class SubprocessTTSEngine:
         # Get reference text once (reused for all chunks)
         ref_text = None
         if ref_audio_path:
+            ref_audio_path = self.prepare_ref_audio(ref_audio_path)
             ref_text = self.transcribe_audio(ref_audio_path)
             if ref_text:
                 print(f"Obtained reference text: {ref_text}")
@@ -293,40 +740,93 @@ class SubprocessTTSEngine:
         print(f"Generating {total_chunks} chunks (model={self.model_type}, "
               f"max_chars={slicer.max_chars})")
 
-        for i, chunk in enumerate(chunks):
-            chunk = chunk.strip()
-            chunk = chunk.replace('\n', '，')  # Replace inner newlines with comma
-            if not chunk:
-                continue
+        # Resume index: chunks listed in the manifest are complete
+        done = AudioMerger.read_manifest(chunk_dir)
+
+        # Chunk files on disk (name -> size), from one directory read
+        with os.scandir(chunk_dir) as it:
+            existing = {entry.name: entry.stat().st_size for entry in it}
+        # With a manifest, a chunk file it doesn't list may be a torn write
+        # from a crash, so only manifest-less (older) chunk dirs trust files
+        has_manifest = AudioMerger.MANIFEST_NAME in existing
 
+        # Resolve skips first so the next chunk to synthesize is always known
+        jobs = []  # (index, text, chunk_path, skip_reason)
+        # TextSlicer chunks are already stripped, non-empty and newline-free
+        for i, chunk in enumerate(chunks):
             chunk_path = os.path.join(chunk_dir, f"chunk_{i:04d}.wav")
 
-            # Fault tolerance: skip if chunk already exists and is valid
-            if os.path.exists(chunk_path) and os.path.getsize(chunk_path) > 100:
-                try:
-                    sf.info(chunk_path)
-                    print(f"  Chunk {i+1}/{total_chunks}: SKIP (already exists)")
+            # Fault tolerance: skip chunks already recorded in the manifest
+            # (as long as the file is still there at the recorded size)
+            size = existing.get(os.path.basename(chunk_path))
+            entry = done.get(i)
+            if entry is not None and size is not None and size == entry.get("bytes"):
+                jobs.append((i, chunk, chunk_path, "in manifest"))
+                continue
+
+            # Chunk dirs from before the manifest: skip if chunk exists and is valid
+            if size is not None:
+                if not has_manifest and size > 100 and self._is_wav(chunk_path):
+                    AudioMerger.append_manifest(chunk_dir, i, chunk_path)
+                    jobs.append((i, chunk, chunk_path, "already exists"))
+                    continue
+                # File exists but is corrupted or unrecorded, regenerate
+                os.remove(chunk_path)
+
+            jobs.append((i, chunk, chunk_path, None))
+
+        todo = [job for job in jobs if job[3] is None]
+
+        # Up to `workers` chunks are synthesized at once; results are
+        # consumed (manifest, callbacks) strictly in chunk order
+        workers = max(1, min(self.tts_concurrency, (os.cpu_count() or 2) // 2,
+                             self.MAX_TTS_CONCURRENCY))
+        pool = ThreadPoolExecutor(max_workers=workers)
+        in_flight = deque()
+        queued = iter(todo)
+
+        def top_up():
+            while len(in_flight) < workers:
+                job = next(queued, None)
+                if job is None:
+                    return
+                i, chunk, chunk_path, _ = job
+                print(f"  Chunk {i+1}/{total_chunks}: \"{chunk[:40]}...\"")
+                in_flight.append((i, chunk_path, pool.submit(
+                    self.generate_audio_chunk, chunk, ref_audio_path, chunk_path,
+                    ref_text=ref_text, seed=self.DEFAULT_SEED)))
+
+        top_up()
+        try:
+            for i, chunk, chunk_path, skip_reason in jobs:
+                if skip_reason:
+                    print(f"  Chunk {i+1}/{total_chunks}: SKIP ({skip_reason})")
                     if progress_callback:
                         progress_callback(i, total_chunks, chunk)
                     continue
-                except Exception:
-                    # File exists but is corrupted, regenerate
-                    os.remove(chunk_path)
 
-            print(f"  Chunk {i+1}/{total_chunks}: \"{chunk[:40]}...\"")
-
-            # Generate
-            self.generate_audio_chunk(
-                chunk, ref_audio_path, chunk_path,
-                ref_text=ref_text, seed=self.DEFAULT_SEED
-            )
-
-            # Report progress
-            if progress_callback:
-                progress_callback(i, total_chunks, chunk)
-
-            # M4 optimization: periodic GC
-            self._run_gc(i)
+                # Generate
+                in_flight.popleft()[2].result()
+                top_up()
+
+                AudioMerger.append_manifest(chunk_dir, i, chunk_path)
+                if chunk_callback:
+                    chunk_callback(i, chunk_path)
+
+                # Report progress
+                if progress_callback:
+                    progress_callback(i, total_chunks, chunk)
+
+                # M4 optimization: periodic GC
+                self._run_gc(i)
+        finally:
+            # On early exit, record the chunks that already finished so a
+            # resume keeps them; chunks still being synthesized are not in
+            # the manifest and get regenerated on resume
+            pool.shutdown(wait=False, cancel_futures=True)
+            for i, chunk_path, future in in_flight:
+                if future.done() and not future.cancelled() and future.exception() is None:
+                    AudioMerger.append_manifest(chunk_dir, i, chunk_path)
 
         print(f"All {total_chunks} chunks generated in {chunk_dir}")
         return chunk_dir
@@ -345,55 +845,68 @@ class SubprocessTTSEngine:
 
         ref_text = None
         if ref_audio_path:
+            ref_audio_path = self.prepare_ref_audio(ref_audio_path)
             ref_text = self.transcribe_audio(ref_audio_path)
             if ref_text:
                 print(f"Obtained reference text: {ref_text}")
 
-        for i, chunk in enumerate(chunks):
-            chunk = chunk.strip()
-            chunk = chunk.replace('\n', '，')
-            if not chunk:
-                continue
+        # TextSlicer chunks are already stripped, non-empty and newline-free
+        todo = list(enumerate(chunks))
 
-            # M4 Optimization: Aggressive Garbage Collection
-            self._run_gc(i)
+        # One-ahead pipeline: the next chunk is synthesized while the caller
+        # consumes the current one
+        pool = ThreadPoolExecutor(max_workers=1)
 
-            try:
-                # Generate audio via subprocess
-                with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as f:
-                    temp_path = f.name
+        def submit(k):
+            return pool.submit(self.generate_audio_array, todo[k][1], ref_audio_path,
+                               ref_text=ref_text, seed=self.DEFAULT_SEED)
 
-                output_path = self.generate_audio_chunk(
-                    chunk, ref_audio_path, temp_path,
-                    ref_text=ref_text, seed=self.DEFAULT_SEED
-                )
+        future = submit(0) if todo else None
+        try:
+            for k, (i, chunk) in enumerate(todo):
+                # M4 Optimization: Aggressive Garbage Collection
+                self._run_gc(i)
 
-                # Load and yield the audio
-                if output_path and os.path.exists(output_path):
-                    audio, sr = sf.read(output_path)
-                    yield (i + 1) / total_chunks, audio
+                try:
+                    # Generate audio via subprocess
+                    audio, sr = future.result()
 
-                    # Cleanup temp file
+                except Exception as e:
+                    error_msg = f"Error generating chunk {i}: {e}"
+                    print(error_msg, file=sys.stderr)
+                    import traceback
+                    tb = traceback.format_exc()
+                    print(tb, file=sys.stderr)
+                    # Also write to error log
                     try:
-                        os.remove(output_path)
+                        with open("chunk_error.log", "a") as f:
+                            f.write(f"\n=== Chunk {i} Error ===\n{error_msg}\n{tb}\n")
                     except:
                         pass
 
-            except Exception as e:
-                error_msg = f"Error generating chunk {i}: {e}"
-                print(error_msg, file=sys.stderr)
-                import traceback
-                tb = traceback.format_exc()
-                print(tb, file=sys.stderr)
-                # Also write to error log
-                try:
-                    with open("chunk_error.log", "a") as f:
-                        f.write(f"\n=== Chunk {i} Error ===\n{error_msg}\n{tb}\n")
-                except:
-                    pass
+                    # CRITICAL: Raise to stop and notify user
+                    raise Exception(f"Chunk generation failed: {e}")
+
+                future = submit(k + 1) if k + 1 < len(todo) else None
+
+                yield (i + 1) / total_chunks, self._fade_edges(audio)
+        finally:
+            pool.shutdown(wait=False)
 
-                # CRITICAL: Raise to stop and notify user
-                raise Exception(f"Chunk generation failed: {e}")
+    def _fade_edges(self, audio):
+        """
+        Apply a short linear fade-in/out so chunk boundaries don't click.
+        Only the edge samples are touched, so int16 input stays int16.
+        """
+        n = min(self.FADE_SAMPLES, len(audio) // 2)
+        if n == 0:
+            return audio
+        ramp = np.linspace(0.0, 1.0, n)
+        if audio.ndim > 1:
+            ramp = ramp[:, None]
+        audio[:n] = audio[:n] * ramp
+        audio[-n:] = audio[-n:] * ramp[::-1]
+        return audio
 
 
 # Create global instance for backward compatibility
@@ -1,11 +1,19 @@
+import atexit
 import os
 import subprocess
 import json
+import threading
 import uuid
-import tempfile
 import sys
 
+from core._worker_json import dumps as _dumps, loads as _loads
+
+
 class VoiceDesigner:
+    # Watchdog: a request that takes longer than this kills the worker, so a
+    # hung generation can't block the caller forever (includes model load)
+    GENERATE_TIMEOUT = 600  # seconds
+
     def __init__(self, model_id="mlx-community/Qwen3-TTS-12Hz-1.7B-VoiceDesign-bf16"):
         self.model_id = model_id
         # Use venv_qwen3 if available, else fallback to sys.executable
@@ -14,14 +22,47 @@ class VoiceDesigner:
              self.python_executable = venv_python
         else:
              self.python_executable = sys.executable
-        
+        # Long-lived `--serve` worker: the model is loaded once, not per request
+        self._process = None
+        self._lock = threading.Lock()
+        atexit.register(self.close)
+
     def load(self):
-        # No-op in subprocess mode
-        pass
+        """Start the worker ahead of the first request."""
+        with self._lock:
+            self._get_worker()
+
+    def _get_worker(self):
+        """The running worker, started if needed (its logs go to our stderr)."""
+        if self._process is None or self._process.poll() is not None:
+            script_path = os.path.join(os.path.dirname(__file__), "voice_design_worker.py")
+            print(f"Starting VoiceDesign worker: {self.python_executable} {script_path} --serve")
+            env = os.environ.copy()
+            env["PYTHONUNBUFFERED"] = "1"
+            self._process = subprocess.Popen(
+                [self.python_executable, script_path, "--serve"],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                text=True,
+                env=env
+            )
+        return self._process
+
+    def close(self):
+        """Stop the worker (registered with atexit)."""
+        with self._lock:
+            process, self._process = self._process, None
+        if process is None:
+            return
+        try:
+            process.stdin.close()  # EOF ends the worker's serve loop
+            process.wait(timeout=5)
+        except Exception:
+            process.kill()
 
     def generate(self, text, instruct, language="Chinese"):
         """
-        Generates audio via subprocess.
+        Generates audio via the persistent worker subprocess.
         Returns: Tuple (output_path, voice_id)
         """
         gen_id = str(uuid.uuid4())
@@ -40,52 +81,52 @@ class VoiceDesigner:
             "model_id": self.model_id
         }
         
-        # Temp input file
-        with tempfile.NamedTemporaryFile(mode='w', suffix=".json", delete=False) as f:
-            json.dump(params, f)
-            input_file = f.name
-            
-        script_path = os.path.join(os.path.dirname(__file__), "voice_design_worker.py")
-        
-        try:
-            print(f"Running VoiceDesign subprocess: {self.python_executable} {script_path}")
-            process = subprocess.Popen(
-                [self.python_executable, script_path, input_file],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True
-            )
-            
-            # Read streaming output
-            last_status = {}
-            while True:
-                line = process.stdout.readline()
-                if not line and process.poll() is not None:
-                    break
-                
-                if line:
+        with self._lock:
+            process = self._get_worker()
+            timed_out = threading.Event()
+
+            def on_timeout():
+                timed_out.set()
+                process.kill()  # ends the stdout loop below
+
+            timer = threading.Timer(self.GENERATE_TIMEOUT, on_timeout)
+            timer.start()
+            try:
+                process.stdin.write(_dumps(params) + "\n")
+                process.stdin.flush()
+                # Status lines until this request's success/error line
+                result = None
+                for line in process.stdout:
                     try:
-                        data = json.loads(line.strip())
-                        last_status = data
-                        if data.get("status") == "error":
-                            raise RuntimeError(f"VoiceDesign Worker Error: {data.get('error')}\n{data.get('traceback', '')}")
-                        elif data.get("status") in ["loading", "generating"]:
-                            print(f"[VoiceDesign] {data.get('message')}")
+                        data = _loads(line)
                     except json.JSONDecodeError:
                         print(f"[VoiceDesign Worker Output] {line.strip()}")
-            
-            if process.returncode != 0:
-                stderr = process.stderr.read()
-                raise RuntimeError(f"VoiceDesign subprocess failed (code {process.returncode}): {stderr}")
-                
-            if os.path.exists(output_path):
-                return output_path, gen_id
-            else:
-                 raise RuntimeError("VoiceDesign worker finished but output file missing.")
-                 
-        finally:
-            if os.path.exists(input_file):
-                os.remove(input_file)
+                        continue
+                    if data.get("status") in ("success", "error"):
+                        result = data
+                        break
+                    if data.get("status") in ["loading", "generating"]:
+                        print(f"[VoiceDesign] {data.get('message')}")
+            except OSError:
+                result = None  # worker died; reported below
+            finally:
+                timer.cancel()
+
+            if result is None:
+                process.kill()
+                process.wait()
+                self._process = None
+                if timed_out.is_set():
+                    raise RuntimeError(f"VoiceDesign generation timed out after {self.GENERATE_TIMEOUT}s")
+                raise RuntimeError(f"VoiceDesign worker exited unexpectedly (code {process.returncode})")
+
+        if result["status"] == "error":
+            raise RuntimeError(f"VoiceDesign Worker Error: {result.get('error')}\n{result.get('traceback', '')}")
+
+        if os.path.exists(output_path):
+            return output_path, gen_id
+        else:
+             raise RuntimeError("VoiceDesign worker finished but output file missing.")
 
     def save_as_voice(self, generated_path, voice_name):
         """
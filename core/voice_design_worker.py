@@ -5,6 +5,8 @@ import uuid
 import soundfile as sf
 import numpy as np
 
+from _worker_json import dumps as _dumps, loads as _loads
+
 # Ensure we can import from local if needed, though usually standard imports suffice
 # But we need mlx_audio here.
 
@@ -13,77 +15,135 @@ try:
     from mlx_audio.tts.utils import load_model, base_load_model, get_model_class
     from mlx_audio.tts.generate import generate_audio
 except ImportError as e:
-    print(json.dumps({"status": "error", "error": f"ImportError: {e}"}))
+    print(_dumps({"status": "error", "error": f"ImportError: {e}"}))
     sys.exit(1)
 
+# Status lines go here; serve() points it at the real stdout and sends
+# everything else printed in the worker to stderr
+_out = sys.stdout
+
+
+def _emit(msg):
+    _out.write(_dumps(msg) + "\n")
+    _out.flush()
+
+
+_models = {}
+
+
+def get_model(model_id):
+    """Load a model once per process (reused across --serve requests)."""
+    if model_id not in _models:
+        _emit({"status": "loading", "message": f"Loading model {model_id}..."})
+        _models[model_id] = load_model(model_id)
+    return _models[model_id]
+
+
+def synthesize_voice_design(text, instruct, language, output_path, model_id):
+    """Generate one voice design clip into output_path. Raises on failure."""
+    # Load model
+    # Using mlx_audio load_model
+    model = get_model(model_id)
+
+    _emit({"status": "generating", "message": "Generating audio..."})
+
+    # Check if model supports generate_voice_design
+    if not hasattr(model, "generate_voice_design"):
+        raise NotImplementedError("Model does not support generate_voice_design method.")
+
+    results = list(model.generate_voice_design(
+        text=text,
+        language=language,
+        instruct=instruct
+    ))
+
+    if not results:
+        raise ValueError("No audio generated.")
+
+    all_audio = []
+    sr = 24000
+    for res in results:
+        if res.audio is not None:
+            if isinstance(res.audio, mx.array):
+                # View the evaluated MLX buffer through the buffer protocol
+                # instead of copying it into a new NumPy array
+                all_audio.append(np.asarray(memoryview(res.audio)))
+            elif isinstance(res.audio, np.ndarray):
+                all_audio.append(res.audio)
+            sr = res.sample_rate
+
+    if not all_audio:
+        raise ValueError("Generated results contain no audio data.")
+
+    # The single copy is the concatenation (none at all for one segment)
+    audio_data = all_audio[0] if len(all_audio) == 1 else np.concatenate(all_audio)
+
+    sf.write(output_path, audio_data, sr)
+
+
 def generate_voice_design(text, instruct, language, output_path, model_id):
-    print(json.dumps({"status": "loading", "message": f"Loading model {model_id}..."}), flush=True)
-    
     try:
-        # Load model
-        # Using mlx_audio load_model
-        model = load_model(model_id)
-        
-        print(json.dumps({"status": "generating", "message": "Generating audio..."}), flush=True)
-        
-        # Check if model supports generate_voice_design
-        if hasattr(model, "generate_voice_design"):
-            results = list(model.generate_voice_design(
-                text=text,
-                language=language,
-                instruct=instruct
-            ))
-            
-            if not results:
-                raise ValueError("No audio generated.")
-                
-            all_audio = []
-            sr = 24000
-            for res in results:
-                if res.audio is not None:
-                    if isinstance(res.audio, mx.array):
-                        all_audio.append(np.array(res.audio))
-                    elif isinstance(res.audio, np.ndarray):
-                        all_audio.append(res.audio)
-                    sr = res.sample_rate
-            
-            if not all_audio:
-                 raise ValueError("Generated results contain no audio data.")
-
-            audio_data = np.concatenate(all_audio)
-            
-            sf.write(output_path, audio_data, sr)
-            
-            print(json.dumps({"status": "success", "output_path": output_path}), flush=True)
-            
-        else:
-             raise NotImplementedError("Model does not support generate_voice_design method.")
+        synthesize_voice_design(text, instruct, language, output_path, model_id)
+        _emit({"status": "success", "output_path": output_path})
 
     except Exception as e:
         import traceback
         tb = traceback.format_exc()
-        print(json.dumps({"status": "error", "error": str(e), "traceback": tb}), flush=True)
+        _emit({"status": "error", "error": str(e), "traceback": tb})
         sys.exit(1)
 
+
+def serve():
+    """
+    Persistent mode (--serve): one JSON request per stdin line. Each request
+    gets loading/generating status lines and ends with one success/error
+    line on stdout. The model stays loaded between requests.
+    """
+    global _out
+    _out = sys.stdout
+    sys.stdout = sys.stderr
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        try:
+            data = _loads(line)
+            output_path = data.get("output_path")
+            synthesize_voice_design(
+                data.get("text"),
+                data.get("instruct"),
+                data.get("language", "Chinese"),
+                output_path,
+                data.get("model_id", "mlx-community/Qwen3-TTS-12Hz-1.7B-VoiceDesign-bf16"),
+            )
+            _emit({"status": "success", "output_path": output_path})
+        except Exception as e:
+            import traceback
+            _emit({"status": "error", "error": str(e), "traceback": traceback.format_exc()})
+
+
 if __name__ == "__main__":
     if len(sys.argv) < 2:
-        print(json.dumps({"error": "Usage: python voice_design_worker.py <input_json>"}), flush=True)
+        print(_dumps({"error": "Usage: python voice_design_worker.py <input_json> | --serve"}), flush=True)
         sys.exit(1)
-        
+
+    if sys.argv[1] == "--serve":
+        serve()
+        sys.exit(0)
+
     input_file = sys.argv[1]
-    
+
     try:
         with open(input_file, 'r') as f:
             data = json.load(f)
-            
+
         text = data.get("text")
         instruct = data.get("instruct")
         language = data.get("language", "Chinese")
         output_path = data.get("output_path")
         model_id = data.get("model_id", "mlx-community/Qwen3-TTS-12Hz-1.7B-VoiceDesign-bf16")
-        
+
         generate_voice_design(text, instruct, language, output_path, model_id)
-        
+
     except Exception as e:
-        print(json.dumps({"status": "error", "error": str(e)}), flush=True)
+        print(_dumps({"status": "error", "error": str(e)}), flush=True)
         sys.exit(1)
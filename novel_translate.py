@@ -15,7 +15,9 @@ Usage:
 """
 
 import argparse
+import itertools
 import json
+import mmap
 import os
 import re
 import sys
@@ -36,6 +38,22 @@ DEFAULT_N_GPU_LAYERS = -1  # Full GPU offload (Metal)
 MIN_CHUNK_CHARS = 50       # Merge paragraphs shorter than this
 MAX_CHUNK_CHARS = 800      # Split paragraphs longer than this
 PREV_CONTEXT_CHARS = 200   # Characters of previous translation to include
+# Paragraph breaks, and split points after sentence-ending punctuation
+PARAGRAPH_SPLIT = re.compile(r'\n\s*\n')
+SENTENCE_SPLIT = re.compile(r'(?<=[。！？.!?"\"\n])\s*')
+# Sentence boundary where the previous-translation context may start
+CONTEXT_BREAK = re.compile(r'[。！？\n]')
+READ_BLOCK_CHARS = 1 << 20  # Source text is read and split this much at a time
+OUTPUT_BUFFER = 1 << 16    # Output file buffer size (bytes)
+FLUSH_EVERY = 16           # Chunks written between output flushes
+PACK_CHARS = 1200          # Source chars per packed request (0 = one chunk per request)
+MAX_TOKENS = 2048           # Output budget cap for one chunk
+PACKED_MAX_TOKENS = 4096   # Output budget cap for a packed request
+# Output budget scales with the source: ~1 token per CJK char, plus room
+# for literary expansion and a fixed slack for short paragraphs
+TOKENS_PER_SOURCE_CHAR = 2.5
+TOKENS_SLACK = 64
+PACKED_CHUNK = re.compile(r"<P(\d+)>(.*?)</P\1>", re.DOTALL)
 
 # Generation parameters (official HY-MT1.5 recommendation)
 GEN_PARAMS = {
@@ -64,13 +82,35 @@ def download_model(repo_id: str, filename: str) -> str:
     return local_path
 
 
+def prefetch_model_file(model_path: str):
+    """
+    Ask the OS to start reading the GGUF into the page cache (MADV_WILLNEED)
+    before llama.cpp mmaps it, so its loads hit RAM instead of faulting pages
+    in from disk one by one. Returns immediately; the readahead is async.
+    """
+    if not hasattr(mmap, "MADV_WILLNEED"):
+        return
+    try:
+        with open(model_path, "rb") as f, \
+                mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            mm.madvise(mmap.MADV_WILLNEED)
+    except (OSError, ValueError):
+        pass  # Just a hint; llama.cpp reads the file either way
+
+
 def load_model(model_path: str, n_ctx: int = DEFAULT_N_CTX,
-               n_gpu_layers: int = DEFAULT_N_GPU_LAYERS):
-    """Load GGUF model with llama-cpp-python (Metal GPU offload)."""
+               n_gpu_layers: int = DEFAULT_N_GPU_LAYERS,
+               use_mlock: bool = False):
+    """
+    Load GGUF model with llama-cpp-python (Metal GPU offload).
+    use_mlock pins the weights in RAM so they are never paged out; only
+    worth it when RAM comfortably exceeds the model size.
+    """
     from llama_cpp import Llama
 
     print(f"🔧 正在載入模型 (n_ctx={n_ctx}, GPU layers={n_gpu_layers})...")
     t0 = time.time()
+    prefetch_model_file(model_path)
 
     llm = Llama(
         model_path=model_path,
@@ -79,7 +119,7 @@ def load_model(model_path: str, n_ctx: int = DEFAULT_N_CTX,
         verbose=False,
         # Apple Silicon specific
         use_mmap=True,
-        use_mlock=False,
+        use_mlock=use_mlock,
     )
 
     elapsed = time.time() - t0
@@ -90,16 +130,41 @@ def load_model(model_path: str, n_ctx: int = DEFAULT_N_CTX,
 # ──────────────────────────────────────────────
 # 2. Input Loading
 # ──────────────────────────────────────────────
-def load_source_text(filepath: str) -> str:
-    """Load source novel text file."""
+def load_source_paragraphs(filepath: str):
+    """
+    Open the source novel and return an iterator over its paragraphs
+    (split at blank lines), read READ_BLOCK_CHARS at a time so the whole
+    text is never held in memory. Feed it to smart_chunk.
+    """
     path = Path(filepath)
     if not path.exists():
         print(f"❌ 找不到原文檔案: {filepath}")
         sys.exit(1)
 
-    text = path.read_text(encoding="utf-8")
-    print(f"📖 已載入原文: {path.name} ({len(text)} 字)")
-    return text
+    print(f"📖 已開啟原文: {path.name} ({path.stat().st_size / 1e6:.1f} MB)")
+    return _read_paragraphs(path)
+
+
+def _read_paragraphs(path: Path):
+    with open(path, "r", encoding="utf-8") as f:
+        # The last piece of each block may continue in the next one. A
+        # separator is all whitespace, so only the piece's trailing
+        # whitespace can start one: rescan just that plus the new block,
+        # and collect the rest in parts (a file without blank lines would
+        # otherwise be rescanned and recopied on every block)
+        head = []
+        ws = ""
+        for block in iter(lambda: f.read(READ_BLOCK_CHARS), ""):
+            *paragraphs, tail = PARAGRAPH_SPLIT.split(ws + block)
+            if paragraphs:
+                head.append(paragraphs[0])
+                paragraphs[0] = "".join(head)
+                head = []
+                yield from paragraphs
+            body = tail.rstrip()
+            head.append(body)
+            ws = tail[len(body):]
+        yield "".join(head) + ws
 
 
 def load_glossary(filepath: str) -> dict:
@@ -119,39 +184,48 @@ def load_glossary(filepath: str) -> dict:
 # ──────────────────────────────────────────────
 # 3. Smart Chunking
 # ──────────────────────────────────────────────
-def smart_chunk(text: str, min_chars: int = MIN_CHUNK_CHARS,
+def _merge_short(paragraphs, min_chars: int):
+    """Merge short paragraphs (< min_chars) into the previous one, lazily."""
+    buffer, buf_len = "", 0  # length carried along, not re-measured
+    for para in paragraphs:
+        if buffer and buf_len < min_chars:
+            buffer += "\n" + para
+            buf_len += 1 + len(para)
+        else:
+            if buffer:
+                yield buffer
+            buffer, buf_len = para, len(para)
+    if buffer:
+        yield buffer
+
+
+def smart_chunk(text, min_chars: int = MIN_CHUNK_CHARS,
                 max_chars: int = MAX_CHUNK_CHARS) -> list[str]:
     """
     Split source text into translation-friendly chunks.
 
+    text is either the whole source as a str, or an iterable of raw
+    paragraphs (e.g. load_source_paragraphs), which is consumed lazily.
+
     Strategy:
       1. Split by double newlines (paragraphs)
       2. Merge short paragraphs (< min_chars) into previous chunk
       3. Split long paragraphs (> max_chars) at sentence boundaries
     """
     # Step 1: Split into raw paragraphs
-    raw_paragraphs = re.split(r'\n\s*\n', text.strip())
-    raw_paragraphs = [p.strip() for p in raw_paragraphs if p.strip()]
+    if isinstance(text, str):
+        text = PARAGRAPH_SPLIT.split(text.strip())
+    raw_paragraphs = (p.strip() for p in text)
+    raw_paragraphs = (p for p in raw_paragraphs if p)
 
     # If no double-newline splits, try single newlines
-    if len(raw_paragraphs) <= 1 and len(text.strip()) > max_chars:
-        raw_paragraphs = text.strip().split('\n')
-        raw_paragraphs = [p.strip() for p in raw_paragraphs if p.strip()]
+    head = list(itertools.islice(raw_paragraphs, 2))
+    if len(head) == 1 and len(head[0]) > max_chars:
+        head = [p.strip() for p in head[0].split('\n') if p.strip()]
+    raw_paragraphs = itertools.chain(head, raw_paragraphs)
 
     # Step 2: Merge short paragraphs
-    merged = []
-    buffer = ""
-    for para in raw_paragraphs:
-        if buffer and len(buffer) + len(para) < min_chars:
-            buffer += "\n" + para
-        elif buffer and len(buffer) < min_chars:
-            buffer += "\n" + para
-        else:
-            if buffer:
-                merged.append(buffer)
-            buffer = para
-    if buffer:
-        merged.append(buffer)
+    merged = _merge_short(raw_paragraphs, min_chars)
 
     # Step 3: Split long paragraphs at sentence boundaries
     chunks = []
@@ -159,19 +233,20 @@ def smart_chunk(text: str, min_chars: int = MIN_CHUNK_CHARS,
         if len(para) <= max_chars:
             chunks.append(para)
         else:
-            # Split at sentence-ending punctuation
-            sentences = re.split(r'(?<=[。！？.!?"\"\n])\s*', para)
-            current = ""
-            for sent in sentences:
+            # Split at sentence-ending punctuation. Sentences are collected
+            # in a list with a running length and joined once per chunk
+            current, cur_len = [], 0
+            for sent in SENTENCE_SPLIT.split(para):
                 if not sent.strip():
                     continue
-                if len(current) + len(sent) > max_chars and current:
-                    chunks.append(current.strip())
-                    current = sent
+                if current and cur_len + len(sent) > max_chars:
+                    chunks.append(" ".join(current).strip())
+                    current, cur_len = [sent], len(sent)
                 else:
-                    current += (" " if current else "") + sent
-            if current.strip():
-                chunks.append(current.strip())
+                    cur_len += len(sent) + (1 if current else 0)
+                    current.append(sent)
+            if current:
+                chunks.append(" ".join(current).strip())
 
     # Final cleanup: remove empty chunks
     chunks = [c for c in chunks if c.strip()]
@@ -192,15 +267,13 @@ def build_glossary_string(glossary: dict) -> str:
     if not glossary:
         return ""
 
-    lines = []
-    for src, tgt in glossary.items():
-        lines.append(f"{src} 翻译成 {tgt}")
-
-    return "参考下面的翻译：\n" + "\n".join(lines) + "\n"
+    lines = "\n".join([f"{src} 翻译成 {tgt}" for src, tgt in glossary.items()])
+    return "参考下面的翻译：\n" + lines + "\n"
 
 
-def build_prompt(source_chunk: str, glossary: dict,
-                 prev_translation: str = "", target_language: str = "繁體中文") -> str:
+def build_prompt(source_chunk: str, glossary_str: str,
+                 prev_translation: str = "", target_language: str = "繁體中文",
+                 keep_tags: bool = False, trim_context: bool = True) -> str:
     """
     Construct the translation prompt combining:
       1. Terminology Intervention (official HY-MT1.5 format)
@@ -212,38 +285,47 @@ def build_prompt(source_chunk: str, glossary: dict,
       參考上面的信息，把下面的文本翻譯成{target_language}，
       注意不需要翻譯上文，也不要額外解釋：
       {source_text}
+
+    With keep_tags=True the source is several paragraphs wrapped in numbered
+    <P1>...</P1> tags, and the model is told to keep the tags in its output.
+
+    prev_translation is cut to its last PREV_CONTEXT_CHARS characters, from
+    the first sentence boundary on. Pass trim_context=False when the caller
+    has already bounded it (the MLX worker keeps a token-level tail).
+
+    glossary_str is build_glossary_string(glossary), built once per run.
+    It comes first and is identical for every chunk, so llama.cpp reuses its
+    KV cache from the previous call and only prefills the rest.
     """
     parts = []
 
     # Part 1: Terminology injection
-    glossary_str = build_glossary_string(glossary)
     if glossary_str:
         parts.append(glossary_str)
 
     # Part 2: Previous translation context (sliding window)
     if prev_translation:
-        # Take last N chars of previous translation
-        context_text = prev_translation[-PREV_CONTEXT_CHARS:]
-        # Don't cut mid-sentence: find the first sentence boundary
-        first_break = 0
-        for i, ch in enumerate(context_text):
-            if ch in "。！？\n":
-                first_break = i + 1
-                break
-        if first_break > 0:
-            context_text = context_text[first_break:]
+        context_text = prev_translation
+        if trim_context:
+            # Take last N chars of previous translation
+            context_text = context_text[-PREV_CONTEXT_CHARS:]
+            # Don't cut mid-sentence: start after the first sentence boundary
+            m = CONTEXT_BREAK.search(context_text)
+            if m:
+                context_text = context_text[m.end():]
         if context_text.strip():
             parts.append(context_text.strip())
 
     # Part 3: Translation instruction + source text
     context_block = "\n".join(parts)
+    tag_note = "保留<P1></P1>等段落标签，逐段翻译，" if keep_tags else ""
 
     if context_block.strip():
         # Use contextual translation template
         # Official SC Template
         prompt = (
             f"{context_block}\n"
-            f"参考上面的信息，把下面的文本翻译成{target_language}，"
+            f"参考上面的信息，把下面的文本翻译成{target_language}，{tag_note}"
             f"注意不需要翻译上文，也不要额外解释：\n"
             f"{source_chunk}"
         )
@@ -251,7 +333,7 @@ def build_prompt(source_chunk: str, glossary: dict,
         # No context available (first chunk, no glossary)
         # Official SC Template
         prompt = (
-            f"将以下文本翻译为{target_language}，注意只需要输出翻译后的结果，不要额外解释：\n"
+            f"将以下文本翻译为{target_language}，{tag_note}注意只需要输出翻译后的结果，不要额外解释：\n"
             f"{source_chunk}"
         )
 
@@ -269,57 +351,167 @@ def format_for_chat(prompt: str) -> list[dict]:
 # ──────────────────────────────────────────────
 # 5. Translation Engine
 # ──────────────────────────────────────────────
-def translate_chunk(llm, source_chunk: str, glossary: dict,
-                    prev_translation: str = "") -> str:
-    """Translate a single chunk using the model."""
-    prompt = build_prompt(source_chunk, glossary, prev_translation)
+def translate_chunk(llm, source_chunk: str, glossary_str: str,
+                    prev_translation: str = "", keep_tags: bool = False,
+                    max_tokens: int = MAX_TOKENS, on_text=None) -> str:
+    """
+    Translate a single chunk using the model.
+    The output budget is sized to the source (see TOKENS_PER_SOURCE_CHAR),
+    capped at max_tokens.
+    With on_text, the response is streamed and each piece of text is passed
+    to on_text as it is generated.
+    """
+    prompt = build_prompt(source_chunk, glossary_str, prev_translation,
+                          keep_tags=keep_tags)
     messages = format_for_chat(prompt)
 
     response = llm.create_chat_completion(
         messages=messages,
-        max_tokens=2048,
+        max_tokens=min(max_tokens, int(len(source_chunk) * TOKENS_PER_SOURCE_CHAR) + TOKENS_SLACK),
+        stream=on_text is not None,
         **GEN_PARAMS,
     )
 
+    if on_text is not None:
+        pieces = []
+        for part in response:
+            piece = part["choices"][0]["delta"].get("content")
+            if piece:
+                pieces.append(piece)
+                on_text(piece)
+        return "".join(pieces).strip()
+
     # Extract the assistant's response
     result = response["choices"][0]["message"]["content"]
     return result.strip()
 
 
+def live_writer(f_out):
+    """
+    on_text callback for translate_chunk that writes streamed text to f_out
+    as it arrives. Leading and trailing whitespace is held back, so the file
+    gets exactly the stripped translation.
+    """
+    held = ""
+    started = False
+
+    def write(piece: str):
+        nonlocal held, started
+        if not started:
+            piece = piece.lstrip()
+            if not piece:
+                return
+            started = True
+        text = held + piece
+        body = text.rstrip()
+        held = text[len(body):]
+        if body:
+            f_out.write(body)  # buffered; translate_novel decides when to flush
+
+    return write
+
+
+def pack_chunks(chunks: list[str], budget: int = PACK_CHARS) -> list[list[int]]:
+    """
+    Group consecutive chunks (as index lists) so each group's source stays
+    within budget chars. A chunk over budget gets its own group.
+    """
+    groups, current, used = [], [], 0
+    for idx, chunk in enumerate(chunks):
+        if current and used + len(chunk) > budget:
+            groups.append(current)
+            current, used = [], 0
+        current.append(idx)
+        used += len(chunk)
+    if current:
+        groups.append(current)
+    return groups
+
+
+def translate_packed(llm, chunks: list[str], glossary_str: str,
+                     prev_translation: str = ""):
+    """
+    Translate several chunks in one request, wrapped in numbered <P#> tags.
+    Returns one translation per chunk, or None if the output doesn't carry
+    every tag back in order (caller falls back to one chunk per request).
+    """
+    source = "\n".join(f"<P{k}>{chunk}</P{k}>" for k, chunk in enumerate(chunks, 1))
+    response = translate_chunk(llm, source, glossary_str, prev_translation,
+                               keep_tags=True, max_tokens=PACKED_MAX_TOKENS)
+    found = PACKED_CHUNK.findall(response)
+    if [int(k) for k, _ in found] != list(range(1, len(chunks) + 1)):
+        return None
+    return [text.strip() for _, text in found]
+
+
 def translate_novel(llm, chunks: list[str], glossary: dict,
-                    output_path: str) -> str:
+                    output_path: str, pack_chars: int = PACK_CHARS) -> int:
     """
     Translate all chunks with sliding window context.
-    Writes results to output file in real-time.
+    Writes results to output file in real-time: chunks translated on their
+    own are streamed into it token by token. The file is the only copy of
+    the translation; returns its length in characters.
+
+    Consecutive chunks are packed into one request of up to pack_chars
+    source chars. Each chunk's context is the previous chunk's translation,
+    so chunks can't be decoded as independent parallel sequences; packing
+    instead saves the per-request prompt prefill and generation start-up.
     """
-    all_translations = []
+    total_chars = 0
     prev_translation = ""
+    glossary_str = build_glossary_string(glossary)
 
-    # Open output file for real-time writing
+    # Open output file for real-time writing. Text (streamed or packed) goes
+    # through a 64 KiB buffer that is flushed every FLUSH_EVERY chunks, and
+    # the file is synced to disk when the loop ends (or is interrupted).
     out_path = Path(output_path)
-    with open(out_path, "w", encoding="utf-8") as f_out:
-        pbar = tqdm(chunks, desc="📝 翻譯中", unit="段",
+    with open(out_path, "w", encoding="utf-8", buffering=OUTPUT_BUFFER) as f_out:
+        pbar = tqdm(total=len(chunks), desc="📝 翻譯中", unit="段",
                     bar_format="{l_bar}{bar}| {n_fmt}/{total_fmt} [{elapsed}<{remaining}]")
 
-        for i, chunk in enumerate(pbar):
-            # Update progress bar description
-            preview = chunk[:30].replace('\n', ' ')
-            pbar.set_postfix_str(f"「{preview}...」")
-
-            # Translate with context injection
-            translated = translate_chunk(llm, chunk, glossary, prev_translation)
-
-            # Write to file immediately
-            f_out.write(translated)
-            f_out.write("\n\n")
+        groups = pack_chunks(chunks, pack_chars) if pack_chars > 0 else [[i] for i in range(len(chunks))]
+        unflushed = 0
+        try:
+            for group in groups:
+                group_chunks = [chunks[i] for i in group]
+
+                # Update progress bar description
+                preview = group_chunks[0][:30].replace('\n', ' ')
+                pbar.set_postfix_str(f"「{preview}...」")
+
+                # Translate with context injection
+                translations = None
+                if len(group_chunks) > 1:
+                    translations = translate_packed(llm, group_chunks, glossary_str, prev_translation)
+                if translations is not None:
+                    for translated in translations:
+                        f_out.write(translated)
+                        f_out.write("\n\n")
+                else:
+                    translations = []
+                    for chunk in group_chunks:
+                        # Streamed into the file while it is generated
+                        translated = translate_chunk(llm, chunk, glossary_str, prev_translation,
+                                                     on_text=live_writer(f_out))
+                        f_out.write("\n\n")
+                        translations.append(translated)
+                        prev_translation = translated
+
+                unflushed += len(translations)
+                if unflushed >= FLUSH_EVERY:
+                    f_out.flush()
+                    unflushed = 0
+
+                # Update sliding window
+                total_chars += sum(map(len, translations))
+                prev_translation = translations[-1]
+                pbar.update(len(group_chunks))
+        finally:
+            pbar.close()
             f_out.flush()
+            os.fsync(f_out.fileno())
 
-            # Update sliding window
-            all_translations.append(translated)
-            prev_translation = translated
-
-    full_translation = "\n\n".join(all_translations)
-    return full_translation
+    return total_chars
 
 
 # ──────────────────────────────────────────────
@@ -354,8 +546,12 @@ def main():
                         help=f"上下文視窗大小 (預設: {DEFAULT_N_CTX})")
     parser.add_argument("--n-gpu-layers", type=int, default=DEFAULT_N_GPU_LAYERS,
                         help="GPU offload 層數 (-1=全部, 預設: -1)")
+    parser.add_argument("--mlock", action="store_true",
+                        help="將模型鎖定在記憶體中 (RAM 足夠時可避免換頁)")
     parser.add_argument("--max-chunk-chars", type=int, default=MAX_CHUNK_CHARS,
                         help=f"每段最大字數 (預設: {MAX_CHUNK_CHARS})")
+    parser.add_argument("--pack-chars", type=int, default=PACK_CHARS,
+                        help=f"合併多段一次翻譯的字數上限 (0=逐段, 預設: {PACK_CHARS})")
 
     args = parser.parse_args()
 
@@ -378,15 +574,15 @@ def main():
 
     # Step 2: Load model
     llm = load_model(model_path, n_ctx=args.n_ctx,
-                     n_gpu_layers=args.n_gpu_layers)
+                     n_gpu_layers=args.n_gpu_layers, use_mlock=args.mlock)
 
     # Step 3: Load inputs
-    source_text = load_source_text(args.input)
+    source_paragraphs = load_source_paragraphs(args.input)
     glossary = load_glossary(args.glossary)
 
     # Step 4: Smart chunking
     print(f"\n✂️  正在進行智慧分段 (max_chars={args.max_chunk_chars})...")
-    chunks = smart_chunk(source_text, max_chars=args.max_chunk_chars)
+    chunks = smart_chunk(source_paragraphs, max_chars=args.max_chunk_chars)
     print(f"   分為 {len(chunks)} 段")
 
     # Show chunk preview
@@ -403,7 +599,8 @@ def main():
     print()
 
     t_start = time.time()
-    full_translation = translate_novel(llm, chunks, glossary, args.output)
+    total_chars = translate_novel(llm, chunks, glossary, args.output,
+                                  pack_chars=args.pack_chars)
     t_total = time.time() - t_start
 
     # Summary
@@ -411,9 +608,9 @@ def main():
     print("=" * 60)
     print(f"  ✅ 翻譯完成！")
     print(f"  📄 輸出檔案: {args.output}")
-    print(f"  📊 共 {len(chunks)} 段 / {len(full_translation)} 字")
+    print(f"  📊 共 {len(chunks)} 段 / {total_chars} 字")
     print(f"  ⏱️  總耗時: {t_total:.1f}s ({t_total/60:.1f} 分鐘)")
-    print(f"  📈 平均速度: {len(full_translation)/t_total:.0f} 字/秒")
+    print(f"  📈 平均速度: {total_chars/t_total:.0f} 字/秒")
     print("=" * 60)
 
 
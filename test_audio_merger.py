@@ -3,100 +3,225 @@
 Test suite for AudioMerger — requires ffmpeg installed.
 Generates short WAV files and tests merge functionality.
 """
+import atexit
 import sys
 import os
 import tempfile
+import threading
+import wave
 import shutil
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 import struct
 
-sys.path.insert(0, '.')
 from core.audio_merger import AudioMerger
 
 
+# RIFF/WAVE header for 16-bit mono PCM, packed in one call
+_WAV_HDR = struct.Struct('<4sI4s4sIHHIIHH4sI')
+
+# One sine period at half scale; test tones index it with a fixed-point
+# phase accumulator instead of evaluating sin() per sample
+_LUT_SIZE = 1024
+_LUT = (np.sin(np.linspace(0, 2 * np.pi, _LUT_SIZE, endpoint=False)) * 0.5 * 32767).astype('<i2')
+_PHASE_FRAC_BITS = 16
+
+
 def create_test_wav(path, duration_s=0.5, sample_rate=24000, frequency=440):
     """Create a simple sine wave WAV file for testing."""
     num_samples = int(sample_rate * duration_s)
-    t = np.linspace(0, duration_s, num_samples, endpoint=False)
-    audio = (np.sin(2 * np.pi * frequency * t) * 0.5 * 32767).astype(np.int16)
+    # LUT steps per sample in 16.16 fixed point (keeps fractional pitch).
+    # uint32 products wrap at 2**32, a multiple of the 2**26 phase period.
+    step = round(frequency * _LUT_SIZE * (1 << _PHASE_FRAC_BITS) / sample_rate)
+    phase = np.arange(num_samples, dtype=np.uint32) * np.uint32(step)
+    audio = _LUT[(phase >> _PHASE_FRAC_BITS) & (_LUT_SIZE - 1)]
     
     # Write WAV file manually (no external deps needed)
+    data_size = num_samples * 2  # 16-bit = 2 bytes per sample
     with open(path, 'wb') as f:
-        # RIFF header
-        data_size = num_samples * 2  # 16-bit = 2 bytes per sample
-        f.write(b'RIFF')
-        f.write(struct.pack('<I', 36 + data_size))
-        f.write(b'WAVE')
-        # fmt chunk
-        f.write(b'fmt ')
-        f.write(struct.pack('<I', 16))      # chunk size
-        f.write(struct.pack('<H', 1))       # PCM
-        f.write(struct.pack('<H', 1))       # mono
-        f.write(struct.pack('<I', sample_rate))
-        f.write(struct.pack('<I', sample_rate * 2))  # byte rate
-        f.write(struct.pack('<H', 2))       # block align
-        f.write(struct.pack('<H', 16))      # bits per sample
-        # data chunk
-        f.write(b'data')
-        f.write(struct.pack('<I', data_size))
-        f.write(audio.tobytes())
+        f.write(_WAV_HDR.pack(
+            b'RIFF', 36 + data_size, b'WAVE',
+            b'fmt ', 16, 1, 1,                 # chunk size, PCM, mono
+            sample_rate, sample_rate * 2,      # sample rate, byte rate
+            2, 16,                             # block align, bits per sample
+            b'data', data_size,
+        ))
+        audio.tofile(f)
+
+
+def read_wav(path):
+    """Return (int16 samples, sample_rate) of a 16-bit PCM WAV."""
+    with wave.open(path, 'rb') as w:
+        assert w.getsampwidth() == 2, f"{path}: expected 16-bit PCM"
+        return np.frombuffer(w.readframes(w.getnframes()), dtype='<i2'), w.getframerate()
+
+
+# Chunk length for smoke merges: long enough for ffmpeg to see real audio
+_DURATION_SMOKE = 0.05
+
+# All test dirs live under one root, removed once at exit
+_ROOT = tempfile.mkdtemp(prefix="audio_merger_tests_")
+atexit.register(shutil.rmtree, _ROOT, True)
+
+# Rendered WAVs, keyed by (duration_s, sample_rate, frequency). Each is
+# written once into a shared cache dir and hard-linked into the test dirs.
+_WAV_CACHE = {}
+_WAV_CACHE_DIR = os.path.join(_ROOT, "wav_cache")
+os.makedirs(_WAV_CACHE_DIR)
+
+
+def _ensure_cached(duration_s=0.5, sample_rate=24000, frequency=440):
+    """Return the path of the cached WAV for these parameters, rendering it once."""
+    key = (duration_s, sample_rate, frequency)
+    path = _WAV_CACHE.get(key)
+    if path is None:
+        # Rendered without a lock so concurrent callers overlap; the atomic
+        # rename means a racing render of the same key just replaces an
+        # identical file
+        path = os.path.join(_WAV_CACHE_DIR, f"{duration_s}_{sample_rate}_{frequency}.wav")
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        create_test_wav(tmp_path, duration_s, sample_rate, frequency)
+        os.replace(tmp_path, path)
+        _WAV_CACHE[key] = path
+    return path
+
+
+def _materialize_wav(path, duration_s=0.5, sample_rate=24000, frequency=440):
+    """Place a test WAV at path: a hard link to the cached copy, or a copy where links fail."""
+    src = _ensure_cached(duration_s, sample_rate, frequency)
+    try:
+        os.link(src, path)
+    except OSError:
+        shutil.copyfile(src, path)
 
 
 def test_merge_basic():
-    """Test merging 3 WAV chunks into 1 MP3."""
-    chunk_dir = tempfile.mkdtemp(prefix="test_merger_")
+    """Test merging 3 WAV chunks into 1 WAV (PCM output, no encode cost)."""
+    chunk_dir = tempfile.mkdtemp(prefix="test_merger_", dir=_ROOT)
+    output_path = os.path.join(chunk_dir, "output.wav")
+    
+    # Create 3 test chunks (rendered side by side; writes release the GIL)
+    with ThreadPoolExecutor(max_workers=3) as ex:
+        list(ex.map(lambda i: _materialize_wav(
+            os.path.join(chunk_dir, f"chunk_{i:04d}.wav"),
+            duration_s=_DURATION_SMOKE,
+            frequency=440 + i * 100
+        ), range(3)))
+    
+    # Merge
+    result = AudioMerger.merge_chunks(
+        chunk_dir=chunk_dir,
+        output_path=output_path,
+        silence_ms=300,
+        encoder="wav"
+    )
+    
+    assert os.path.exists(result), f"Output file not created: {result}"
+    samples, rate = read_wav(result)
+    # 3 chunks + 2 pauses of 300 ms
+    expected = 3 * int(24000 * _DURATION_SMOKE) + 2 * int(24000 * 0.3)
+    assert rate == 24000, f"Expected 24000 Hz, got {rate}"
+    assert len(samples) == expected, f"Expected {expected} samples, got {len(samples)}"
+    print(f"✅ test_merge_basic passed (output: {os.path.getsize(result)} bytes)")
+
+
+def test_merge_mixed_rates():
+    """Test that chunks at differing sample rates are re-encoded through the filter graph."""
+    chunk_dir = tempfile.mkdtemp(prefix="test_mixed_", dir=_ROOT)
+    output_path = os.path.join(chunk_dir, "output.wav")
+    
+    rates = [24000, 16000, 24000, 16000]
+    for i, rate in enumerate(rates):
+        _materialize_wav(os.path.join(chunk_dir, f"chunk_{i:04d}.wav"),
+                         duration_s=_DURATION_SMOKE, sample_rate=rate)
+    
+    result = AudioMerger.merge_chunks(
+        chunk_dir=chunk_dir,
+        output_path=output_path,
+        silence_ms=100,
+        encoder="wav"
+    )
+    
+    samples, rate = read_wav(result)
+    # Every chunk is resampled to 24 kHz; 3 pauses of 100 ms between them
+    expected = len(rates) * int(24000 * _DURATION_SMOKE) + 3 * int(24000 * 0.1)
+    assert rate == 24000, f"Expected 24000 Hz, got {rate}"
+    assert abs(len(samples) - expected) <= len(rates), f"Expected ~{expected} samples, got {len(samples)}"
+    print(f"✅ test_merge_mixed_rates passed ({len(samples)} samples)")
+
+
+def test_merge_tree_reduction():
+    """Test merging more than MAX_INPUTS mixed-rate chunks (grouped encodes, then concat)."""
+    chunk_dir = tempfile.mkdtemp(prefix="test_tree_", dir=_ROOT)
+    output_path = os.path.join(chunk_dir, "output.wav")
+    
+    n = AudioMerger.MAX_INPUTS + 2
+    duration_s = 0.01
+    for i in range(n):
+        _materialize_wav(os.path.join(chunk_dir, f"chunk_{i:04d}.wav"),
+                         duration_s=duration_s, sample_rate=16000 if i % 2 else 24000)
+    
+    result = AudioMerger.merge_chunks(
+        chunk_dir=chunk_dir,
+        output_path=output_path,
+        silence_ms=10,
+        encoder="wav"
+    )
+    
+    samples, rate = read_wav(result)
+    # Pauses sit between chunks only, including across group boundaries
+    expected = n * int(24000 * duration_s) + (n - 1) * int(24000 * 0.01)
+    assert rate == 24000, f"Expected 24000 Hz, got {rate}"
+    assert abs(len(samples) - expected) <= n, f"Expected ~{expected} samples, got {len(samples)}"
+    leftovers = [f for f in os.listdir(chunk_dir) if f.startswith("_")]
+    assert not leftovers, f"Intermediate files left behind: {leftovers}"
+    print(f"✅ test_merge_tree_reduction passed ({n} chunks, {len(samples)} samples)")
+
+
+def test_merge_failure_leaves_no_output():
+    """Test that a failed merge leaves neither the output nor its .part file."""
+    chunk_dir = tempfile.mkdtemp(prefix="test_merge_fail_", dir=_ROOT)
     output_path = os.path.join(chunk_dir, "output.mp3")
     
+    for i in range(2):
+        _materialize_wav(os.path.join(chunk_dir, f"chunk_{i:04d}.wav"),
+                         duration_s=_DURATION_SMOKE)
+    
     try:
-        # Create 3 test chunks
-        for i in range(3):
-            create_test_wav(
-                os.path.join(chunk_dir, f"chunk_{i:04d}.wav"),
-                duration_s=0.3,
-                frequency=440 + i * 100
-            )
-        
-        # Merge
-        result = AudioMerger.merge_chunks(
-            chunk_dir=chunk_dir,
-            output_path=output_path,
-            silence_ms=300,
-            bitrate="192k"
-        )
-        
-        assert os.path.exists(result), f"Output file not created: {result}"
-        assert os.path.getsize(result) > 100, f"Output file too small: {os.path.getsize(result)}"
-        print(f"✅ test_merge_basic passed (output: {os.path.getsize(result)} bytes)")
-        
-    finally:
-        shutil.rmtree(chunk_dir, ignore_errors=True)
+        # An invalid bitrate makes the final encode fail
+        AudioMerger.merge_chunks(chunk_dir, output_path, bitrate="bogus")
+        assert False, "Should have raised CalledProcessError"
+    except subprocess.CalledProcessError:
+        pass
+    
+    leftovers = [f for f in os.listdir(chunk_dir) if not f.startswith("chunk_")]
+    assert not leftovers, f"Partial output left behind: {leftovers}"
+    print("✅ test_merge_failure_leaves_no_output passed")
 
 
 def test_merge_with_tags():
     """Test merging with MP3 metadata tags."""
-    chunk_dir = tempfile.mkdtemp(prefix="test_merger_tags_")
+    chunk_dir = tempfile.mkdtemp(prefix="test_merger_tags_", dir=_ROOT)
     output_path = os.path.join(chunk_dir, "output.mp3")
     
-    try:
-        create_test_wav(os.path.join(chunk_dir, "chunk_0000.wav"), duration_s=0.5)
-        
-        result = AudioMerger.merge_chunks(
-            chunk_dir=chunk_dir,
-            output_path=output_path,
-            tags={"title": "Test Chapter", "artist": "CosyVoice AI", "album": "Test Book"}
-        )
-        
-        assert os.path.exists(result), "Output file not created"
-        print(f"✅ test_merge_with_tags passed (output: {os.path.getsize(result)} bytes)")
-        
-    finally:
-        shutil.rmtree(chunk_dir, ignore_errors=True)
+    # Keeps the MP3 path covered; a short clip keeps the encode cheap
+    _materialize_wav(os.path.join(chunk_dir, "chunk_0000.wav"), duration_s=0.1)
+    
+    result = AudioMerger.merge_chunks(
+        chunk_dir=chunk_dir,
+        output_path=output_path,
+        tags={"title": "Test Chapter", "artist": "CosyVoice AI", "album": "Test Book"}
+    )
+    
+    assert os.path.exists(result), "Output file not created"
+    print(f"✅ test_merge_with_tags passed (output: {os.path.getsize(result)} bytes)")
 
 
 def test_cleanup():
     """Test that cleanup removes the chunk directory."""
-    chunk_dir = tempfile.mkdtemp(prefix="test_cleanup_")
-    create_test_wav(os.path.join(chunk_dir, "chunk_0000.wav"))
+    chunk_dir = tempfile.mkdtemp(prefix="test_cleanup_", dir=_ROOT)
+    _materialize_wav(os.path.join(chunk_dir, "chunk_0000.wav"))
     
     assert os.path.isdir(chunk_dir)
     AudioMerger.cleanup(chunk_dir)
@@ -106,7 +231,7 @@ def test_cleanup():
 
 def test_empty_dir():
     """Test that merging an empty directory raises FileNotFoundError."""
-    chunk_dir = tempfile.mkdtemp(prefix="test_empty_")
+    chunk_dir = tempfile.mkdtemp(prefix="test_empty_", dir=_ROOT)
     
     try:
         AudioMerger.merge_chunks(
@@ -116,55 +241,161 @@ def test_empty_dir():
         assert False, "Should have raised FileNotFoundError"
     except FileNotFoundError:
         print("✅ test_empty_dir passed (correctly raised FileNotFoundError)")
-    finally:
-        shutil.rmtree(chunk_dir, ignore_errors=True)
 
 
 def test_sorted_order():
     """Test that chunks are merged in correct sorted order."""
-    chunk_dir = tempfile.mkdtemp(prefix="test_order_")
-    output_path = os.path.join(chunk_dir, "output.mp3")
+    chunk_dir = tempfile.mkdtemp(prefix="test_order_", dir=_ROOT)
+    output_path = os.path.join(chunk_dir, "output.wav")
     
+    # Create chunks out of order
+    for i in [2, 0, 1]:
+        _materialize_wav(
+            os.path.join(chunk_dir, f"chunk_{i:04d}.wav"),
+            duration_s=0.2,
+            frequency=440 + i * 200
+        )
+    
+    sorted_chunks = AudioMerger._get_sorted_chunks(chunk_dir)
+    assert [os.path.basename(c) for c in sorted_chunks] == \
+           ["chunk_0000.wav", "chunk_0001.wav", "chunk_0002.wav"], \
+           f"Chunks not sorted correctly: {sorted_chunks}"
+    
+    result = AudioMerger.merge_chunks(chunk_dir, output_path, encoder="wav")
+    assert os.path.exists(result)
+    print("✅ test_sorted_order passed")
+
+
+def test_manifest_order():
+    """Test that manifest.jsonl, when present, defines the merged chunks."""
+    chunk_dir = tempfile.mkdtemp(prefix="test_manifest_", dir=_ROOT)
+    
+    for i in range(3):
+        _materialize_wav(os.path.join(chunk_dir, f"chunk_{i:04d}.wav"), duration_s=0.2)
+    # chunk_0001 was never recorded (e.g. crash before it finished)
+    for i in [2, 0]:
+        AudioMerger.append_manifest(chunk_dir, i, os.path.join(chunk_dir, f"chunk_{i:04d}.wav"))
+    # Recorded chunks whose file later vanished or changed size are dropped
+    # (files are replaced, not edited: they are links to the WAV cache)
+    for i in [3, 4]:
+        path = os.path.join(chunk_dir, f"chunk_{i:04d}.wav")
+        _materialize_wav(path, duration_s=0.2)
+        AudioMerger.append_manifest(chunk_dir, i, path)
+    os.remove(os.path.join(chunk_dir, "chunk_0003.wav"))
+    os.remove(os.path.join(chunk_dir, "chunk_0004.wav"))
+    create_test_wav(os.path.join(chunk_dir, "chunk_0004.wav"), duration_s=0.1)
+    # Valid JSON that isn't a manifest record is skipped, then a truncated last line
+    with open(os.path.join(chunk_dir, AudioMerger.MANIFEST_NAME), 'a') as f:
+        f.write('[1, 2]\n"chunk_0001.wav"\nnull\n{"idx": 1}\n'
+                '{"idx": "1", "path": "chunk_0001.wav", "bytes": 9644}\n'
+                '{"idx": 1, "path": "../chunk_0001.wav", "bytes": 9644}\n')
+        f.write('{"idx": 1, "pa')
+    
+    sorted_chunks = AudioMerger._get_sorted_chunks(chunk_dir)
+    assert [os.path.basename(c) for c in sorted_chunks] == \
+           ["chunk_0000.wav", "chunk_0002.wav"], \
+           f"Manifest not used correctly: {sorted_chunks}"
+    assert all(os.path.isabs(c) for c in sorted_chunks)
+    print("✅ test_manifest_order passed")
+
+
+def test_merge_arrays():
+    """Test encoding in-memory float and int16 arrays via ffmpeg stdin."""
+    out_dir = tempfile.mkdtemp(prefix="test_arrays_", dir=_ROOT)
+    output_path = os.path.join(out_dir, "output.wav")
+    
+    t = np.linspace(0, 0.3, 7200, endpoint=False)
+    tone = np.sin(2 * np.pi * 440 * t) * 0.5
+    arrays = [tone, (tone * 32767).astype(np.int16), tone.astype(np.float32)]
+    
+    result = AudioMerger.merge_arrays(
+        (a for a in arrays),
+        output_path=output_path,
+        tags={"title": "Test Chapter"},
+        encoder="wav"
+    )
+    
+    assert result == output_path
+    assert os.path.getsize(result) > 100, f"Output file too small: {os.path.getsize(result)}"
+    print(f"✅ test_merge_arrays passed (output: {os.path.getsize(result)} bytes)")
+
+
+def test_stream_sample_conversion():
+    """Test that int16/float input (incl. stereo) is converted to the right PCM values."""
+    out_dir = tempfile.mkdtemp(prefix="test_convert_", dir=_ROOT)
+    output_path = os.path.join(out_dir, "output.wav")
+    
+    stereo_i16 = np.tile(np.array([[1000, 3000]], dtype=np.int16), (2400, 1))
+    stereo_f32 = np.tile(np.array([[0.25, -0.75]], dtype=np.float32), (2400, 1))
+    stream = AudioMerger.merge_stream(output_path, silence_ms=0, encoder="wav")
+    other = AudioMerger.merge_stream(os.path.join(out_dir, "other.wav"), encoder="wav")
+    for audio in (stereo_i16, stereo_f32):
+        stream.feed(audio)
+    # Scratch buffers are per stream, so concurrent chapters can't clobber each other
+    assert other._scratch_i16 is None, "Streams should not share scratch buffers"
+    other.abort()
     try:
-        # Create chunks out of order
-        for i in [2, 0, 1]:
-            create_test_wav(
-                os.path.join(chunk_dir, f"chunk_{i:04d}.wav"),
-                duration_s=0.2,
-                frequency=440 + i * 200
-            )
-        
-        sorted_chunks = AudioMerger._get_sorted_chunks(chunk_dir)
-        assert [os.path.basename(c) for c in sorted_chunks] == \
-               ["chunk_0000.wav", "chunk_0001.wav", "chunk_0002.wav"], \
-               f"Chunks not sorted correctly: {sorted_chunks}"
-        
-        result = AudioMerger.merge_chunks(chunk_dir, output_path)
-        assert os.path.exists(result)
-        print("✅ test_sorted_order passed")
-        
-    finally:
-        shutil.rmtree(chunk_dir, ignore_errors=True)
+        stream.feed(np.zeros(10, dtype=np.int32))
+        assert False, "Should have raised ValueError for int32 samples"
+    except ValueError:
+        pass
+    result = stream.close()
+    
+    samples, _ = read_wav(result)
+    assert len(samples) == 4800, f"Expected 4800 samples, got {len(samples)}"
+    assert (samples[:2400] == 2000).all(), f"int16 stereo downmix wrong: {samples[:4]}"
+    assert (samples[2400:] == round(-0.25 * 32767)).all(), f"float stereo downmix wrong: {samples[2400:2404]}"
+    print("✅ test_stream_sample_conversion passed")
+
+
+def test_stream_feed_wav():
+    """Test streaming WAV chunks (mapped, not read into memory) into one encode."""
+    chunk_dir = tempfile.mkdtemp(prefix="test_feed_wav_", dir=_ROOT)
+    output_path = os.path.join(chunk_dir, "output.wav")
+    
+    paths = []
+    for i in range(3):
+        path = os.path.join(chunk_dir, f"chunk_{i:04d}.wav")
+        _materialize_wav(path, duration_s=0.3, frequency=440 + i * 110)
+        paths.append(path)
+    
+    stream = AudioMerger.merge_stream(output_path, encoder="wav")
+    for path in paths:
+        stream.feed_wav(path)
+    result = stream.close()
+    
+    assert result == output_path
+    assert stream.count == 3
+    assert os.path.getsize(result) > 100, f"Output file too small: {os.path.getsize(result)}"
+    print(f"✅ test_stream_feed_wav passed (output: {os.path.getsize(result)} bytes)")
 
 
 if __name__ == "__main__":
     print("=== AudioMerger Tests ===\n")
     
-    # Check ffmpeg availability first
-    import subprocess
-    try:
-        result = subprocess.run(['ffmpeg', '-version'], capture_output=True, text=True)
-        if result.returncode != 0:
-            print("❌ ffmpeg not found. Install with: brew install ffmpeg")
-            sys.exit(1)
-        print("ffmpeg found ✓\n")
-    except FileNotFoundError:
+    # Check ffmpeg availability first (a PATH lookup, no subprocess)
+    if shutil.which('ffmpeg') is None:
         print("❌ ffmpeg not found. Install with: brew install ffmpeg")
         sys.exit(1)
+    print("ffmpeg found ✓\n")
     
-    test_merge_basic()
-    test_merge_with_tags()
-    test_cleanup()
-    test_empty_dir()
-    test_sorted_order()
+    # Each test uses its own temp dir and the heavy lifting happens in the
+    # ffmpeg subprocesses, so threads are enough to run them side by side.
+    # list() re-raises the first failing test's exception.
+    TESTS = [
+        test_merge_basic,
+        test_merge_mixed_rates,
+        test_merge_tree_reduction,
+        test_merge_failure_leaves_no_output,
+        test_merge_with_tags,
+        test_cleanup,
+        test_empty_dir,
+        test_sorted_order,
+        test_manifest_order,
+        test_merge_arrays,
+        test_stream_sample_conversion,
+        test_stream_feed_wav,
+    ]
+    with ThreadPoolExecutor(max_workers=min(len(TESTS), os.cpu_count() or 1)) as ex:
+        list(ex.map(lambda test: test(), TESTS))
     print("\n🎉 All tests passed!")
@@ -2,14 +2,18 @@
 """
 Test suite for TextSlicer — can run without TTS models.
 """
-import sys
-sys.path.insert(0, '.')
 from core.text_slicer import TextSlicer
 
+# TextSlicer keeps no per-call state (its regexes are class attributes),
+# so the tests share one instance per model limit
+_COSY = TextSlicer(max_chars=300)
+_QWEN = TextSlicer(max_chars=500)
+_LONG_TEXT = "這是一段很長的文字。" * 40  # 400 chars
+
 
 def test_basic_split():
     """Test basic paragraph splitting."""
-    slicer = TextSlicer(max_chars=300)
+    slicer = _COSY
     text = "第一段落的長文字內容要超過十個字。\n第二段落的長文字內容要超過十個字。\n第三段落的長文字內容也要超過十個字。"
     chunks = slicer.slice(text)
     assert len(chunks) == 3, f"Expected 3 chunks, got {len(chunks)}: {chunks}"
@@ -18,7 +22,7 @@ def test_basic_split():
 
 def test_short_merge():
     """Short lines (< 10 chars) should merge into previous."""
-    slicer = TextSlicer(max_chars=300)
+    slicer = _COSY
     text = "這是一段正常長度的文字內容，超過十個字。\n短\n另一段正常長度的文字內容也超過十個字。"
     chunks = slicer.slice(text)
     # "短" (1 char) should merge into previous
@@ -40,7 +44,7 @@ def test_long_split():
 
 def test_noise_cleaning():
     """Markdown noise characters should be removed."""
-    slicer = TextSlicer(max_chars=300)
+    slicer = _COSY
     text = "# 標題\n\n正常文字內容。\n\n---\n\n**加粗文字**\n\n> 引用文字"
     chunks = slicer.slice(text)
     for chunk in chunks:
@@ -52,7 +56,7 @@ def test_noise_cleaning():
 
 def test_empty_input():
     """Empty or whitespace-only input should return empty list."""
-    slicer = TextSlicer(max_chars=300)
+    slicer = _COSY
     assert slicer.slice("") == [], "Empty string should return []"
     assert slicer.slice("   ") == [], "Whitespace-only should return []"
     assert slicer.slice("\n\n\n") == [], "Newlines-only should return []"
@@ -61,7 +65,7 @@ def test_empty_input():
 
 def test_mixed_language():
     """Mixed Chinese + English text should work."""
-    slicer = TextSlicer(max_chars=300)
+    slicer = _COSY
     text = "Hello World，你好世界！\nThis is a test.\n這是測試。"
     chunks = slicer.slice(text)
     assert len(chunks) >= 2, f"Expected >= 2 chunks, got {len(chunks)}: {chunks}"
@@ -70,14 +74,8 @@ def test_mixed_language():
 
 def test_model_specific_defaults():
     """Test CosyVoice (300) vs Qwen3 (500) defaults."""
-    cosy_slicer = TextSlicer(max_chars=300)
-    qwen_slicer = TextSlicer(max_chars=500)
-    
-    # Create a 400-char text
-    text = "這是一段很長的文字。" * 40  # ~200 chars
-    
-    cosy_chunks = cosy_slicer.slice(text)
-    qwen_chunks = qwen_slicer.slice(text)
+    cosy_chunks = _COSY.slice(_LONG_TEXT)
+    qwen_chunks = _QWEN.slice(_LONG_TEXT)
     
     # Qwen should produce fewer chunks since it allows longer ones
     assert len(cosy_chunks) >= len(qwen_chunks), \
@@ -87,7 +85,7 @@ def test_model_specific_defaults():
 
 def test_all_short_lines():
     """Multiple short lines should all merge into one."""
-    slicer = TextSlicer(max_chars=300)
+    slicer = _COSY
     text = "一\n二\n三\n四\n五"
     chunks = slicer.slice(text)
     assert len(chunks) == 1, f"Expected 1 merged chunk, got {len(chunks)}: {chunks}"
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Test suite for the translator's chapter title fast path (core.chapter_titles).
+Pure regex, so no MLX or model is needed.
+"""
+from core.chapter_titles import fast_translate_title, roman_to_int
+
+
+def test_keyword_titles():
+    """Chapter/Part headings are rewritten without the model, numerals as integers."""
+    cases = {
+        "Chapter 3": "第3章",
+        "chapter 12": "第12章",
+        "Ch. 7": "第7章",
+        "Part IV": "第4部",
+        "part XLII": "第42部",
+        "Chapter 007": "第7章",
+        "第 5 章": "第5章",
+    }
+    for title, expected in cases.items():
+        got = fast_translate_title(title, "zh")
+        assert got == expected, f"{title!r}: expected {expected!r}, got {got!r}"
+    assert fast_translate_title("Part IV", "en") == "Part 4"
+    print("✅ test_keyword_titles passed")
+
+
+def test_roman_to_int():
+    """Subtractive pairs are handled."""
+    cases = {"I": 1, "IV": 4, "IX": 9, "XIV": 14, "XLII": 42, "XC": 90, "CM": 900, "MMXXIV": 2024}
+    for numeral, expected in cases.items():
+        got = roman_to_int(numeral)
+        assert got == expected, f"{numeral!r}: expected {expected}, got {got}"
+    print("✅ test_roman_to_int passed")
+
+
+def test_keyword_needs_space():
+    """A keyword glued to letters is a real word, not a heading."""
+    for title in ["Chapterx", "Chi", "Parti", "Chapter3x"]:
+        got = fast_translate_title(title, "zh")
+        assert got is None, f"{title!r} should need the model, got {got!r}"
+    print("✅ test_keyword_needs_space passed")
+
+
+def test_bare_numbers():
+    """Bare arabic numbers are kept as-is."""
+    for title in ["12", " 3 "]:
+        got = fast_translate_title(title, "zh")
+        assert got == title.strip(), f"{title!r} should pass through, got {got!r}"
+    print("✅ test_bare_numbers passed")
+
+
+def test_words_are_not_numerals():
+    """Words that spell a roman numeral (any case) go to the model."""
+    for title in ["Mix", "Liv", "Mi", "Di", "mix", "civil", "MIX", "DIV", "IV", "Part mix", "Chapter Liv"]:
+        got = fast_translate_title(title, "zh")
+        assert got is None, f"{title!r} should need the model, got {got!r}"
+    print("✅ test_words_are_not_numerals passed")
+
+
+if __name__ == "__main__":
+    print("=== Title Fast Path Tests ===\n")
+    test_keyword_titles()
+    test_roman_to_int()
+    test_keyword_needs_space()
+    test_bare_numbers()
+    test_words_are_not_numerals()
+    print("\n🎉 All tests passed!")
@@ -1,6 +1,6 @@
-from bs4 import BeautifulSoup
+from lxml import etree
 
-TRANSLATABLE_TAGS = ['p', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'a']
+TRANSLATABLE_TAGS = frozenset(['p', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'a'])
 
 html = """
 <html>
@@ -13,20 +13,30 @@ html = """
 </html>
 """
 
-soup = BeautifulSoup(html, 'html.parser')
+
+# Compiled once; each evaluation runs entirely in lxml's C code.
+# Results come back in document order.
+_IS_TRANSLATABLE = " or ".join(f"self::{name}" for name in sorted(TRANSLATABLE_TAGS))
+TRANSLATABLE = etree.XPath(f"//*[{_IS_TRANSLATABLE}]")
+# Logic from epub_processor.py: blocks containing links are skipped
+LINK_PARENTS = etree.XPath(f"//*[{_IS_TRANSLATABLE}][not(self::a)][.//a]")
+
+tree = etree.HTML(html)
 
 print("=== EXTRACTION ===")
+# One query selects the tags; the same (element, text) records drive application
+skipped = set(LINK_PARENTS(tree))
+records = []
 extracted = []
-for tag in soup.find_all(TRANSLATABLE_TAGS):
-    # Logic from epub_processor.py
-    if tag.name != 'a' and tag.find('a'):
-        print(f"Skipping parent block: <{tag.name}> containing links")
+for el in TRANSLATABLE(tree):
+    if el in skipped:
+        print(f"Skipping parent block: <{el.tag}> containing links")
         continue
-
-    text = tag.get_text().strip()
+    text = "".join(el.itertext()).strip()
+    records.append((el, text))
     if text:
         extracted.append(text)
-        print(f"Extracted ({tag.name}): {text}")
+        print(f"Extracted ({el.tag}): {text}")
 
 print("\n=== APPLICATION ===")
 # Mock translations
@@ -37,22 +47,20 @@ translations = {
     "Reference": "參考資料"
 }
 
-# Logic from _apply_to_html
-text_map = {}
-for orig, trans in translations.items():
-    if orig not in text_map: text_map[orig] = []
-    text_map[orig].append(trans)
+# Logic from _apply_to_html. It keeps a FIFO queue per text because its
+# paragraph lists can repeat a text; keys of a dict can't, so each text maps
+# to a single translation that is used up on its first match.
+text_map = dict(translations)
 
-for tag in soup.find_all(TRANSLATABLE_TAGS):
-    if tag.name != 'a' and tag.find('a'):
-        continue
-    
-    tag_text = tag.get_text().strip()
-    if tag_text in text_map and text_map[tag_text]:
-        trans = text_map[tag_text].pop(0)
-        tag.clear() # This clears content of the TAG being processed
-        tag.string = trans
-        print(f"Replaced <{tag.name}>: {trans}")
+for el, el_text in records:
+    trans = text_map.pop(el_text, None)
+    if trans:
+        # Same as BeautifulSoup's tag.clear(); tag.string = trans. Removing a
+        # child drops its tail text with it; the element's own tail is kept.
+        for child in list(el):
+            el.remove(child)
+        el.text = trans
+        print(f"Replaced <{el.tag}>: {trans}")
 
 print("\n=== RESULT HTML ===")
-print(str(soup))
+print(etree.tostring(tree, encoding="unicode", method="html"))